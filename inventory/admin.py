@@ -2,7 +2,7 @@
 from django.contrib import admin
 from django.urls import path
 from django.template.response import TemplateResponse
-from .models import Stock, StockMovement, StockAdjustment
+from .models import Stock, StockMovement, StockAdjustment, StockSnapshot, ProductStockSummary, WarehouseStockSummary, StockRollup
 
 # Branding
 admin.site.site_header = "Inventory"
@@ -26,3 +26,24 @@ class StockMovementAdmin(admin.ModelAdmin):
 class StockAdjustmentAdmin(admin.ModelAdmin):
     list_display = ("id", "stock", "adjustment_type", "quantity", "reason", "approved_by", "timestamp")
     search_fields = ("stock__product__name", "reason", "approved_by__name")
+
+@admin.register(StockSnapshot)
+class StockSnapshotAdmin(admin.ModelAdmin):
+    list_display = ("id", "stock", "taken_at", "quantity")
+    search_fields = ("stock__product__name",)
+
+@admin.register(ProductStockSummary)
+class ProductStockSummaryAdmin(admin.ModelAdmin):
+    list_display = ("product", "on_hand", "reserved", "available", "updated_at")
+    search_fields = ("product__name", "product__sku")
+
+@admin.register(WarehouseStockSummary)
+class WarehouseStockSummaryAdmin(admin.ModelAdmin):
+    list_display = ("product", "warehouse", "on_hand", "reserved", "available", "updated_at")
+    search_fields = ("product__name", "warehouse__name")
+
+@admin.register(StockRollup)
+class StockRollupAdmin(admin.ModelAdmin):
+    list_display = ("bucket", "period_start", "product", "warehouse", "sold", "received", "adjusted", "closing_on_hand")
+    list_filter = ("bucket",)
+    search_fields = ("product__name", "warehouse__name")
@@ -0,0 +1,171 @@
+"""
+Stock allocation engine.
+
+Reserves and deducts stock for a set of order lines in one transaction.
+Candidate Stock rows are read once with SELECT ... FOR UPDATE (a no-op on
+SQLite, which serializes writers anyway), ``inventory.optimizer`` chooses
+the warehouses and bins to take from, and the deductions are applied as
+one ``CASE`` UPDATE per chunk of rows, each row guarded by
+``quantity >= deduct``. Two concurrent orders can therefore never consume
+the same units, and no per-row ``full_clean()`` or ``save()`` is involved.
+
+Every deduction is appended to the StockMovement ledger as an ``OUT`` row.
+Deductions made for a sales order are also recorded as StockReservation
+rows until the order leaves the ``open`` status: shipping consumes them,
+cancelling or deleting the order returns them to Stock, and reopening it
+allocates its lines again. Every step reports its
+changes to the stock summary tables in the same transaction.
+"""
+import logging
+import operator
+from collections import OrderedDict, defaultdict
+from functools import reduce
+
+from django.db import transaction
+from django.db.models import F, Q
+
+from inventory_api.exceptions import BusinessRuleError, InsufficientStockError
+from . import summary
+from .models import ProductStockSummary, Stock, StockMovement, StockReservation
+from .optimizer import StockMatrix
+from .posting import post_movements
+
+logger = logging.getLogger('inventory')
+
+MAX_ATTEMPTS = 3
+# Stock rows deducted per UPDATE; bounds the size of the CASE and guard
+DEDUCT_CHUNK_SIZE = 500
+
+
+class AllocationConflict(Exception):
+    """A locked row changed underneath us; the whole allocation is retried."""
+
+
+def merge_lines(items):
+    """Collapse order lines into ``{product_id: quantity}``.
+
+    Lines for the same product are summed so each product is checked and
+    deducted once. Raises ``ValueError``/``TypeError`` on malformed lines.
+    """
+    lines = OrderedDict()
+    for item in items:
+        product_id = int(item.get('product'))
+        quantity = int(item.get('quantity', 0))
+        if quantity <= 0:
+            continue
+        lines[product_id] = lines.get(product_id, 0) + quantity
+    return lines
+
+
+def check_availability(lines):
+    """Reject ``lines`` early from the summary table, without touching Stock.
+
+    One indexed lookup on ProductStockSummary; the authoritative check still
+    happens under lock in ``allocate``.
+    """
+    available = dict(
+        ProductStockSummary.objects.filter(product_id__in=list(lines)).values_list('product_id', 'available')
+    )
+    shortages = OrderedDict(
+        (product_id, (requested, available.get(product_id, 0)))
+        for product_id, requested in lines.items()
+        if requested > available.get(product_id, 0)
+    )
+    if shortages:
+        raise InsufficientStockError(shortages)
+
+
+def _allocate_once(lines):
+    plan = StockMatrix.load(lines, lock=True).plan(lines)
+    _deduct(plan)
+    return plan
+
+
+def _deduct(plan):
+    """Apply ``plan`` with one guarded UPDATE per chunk.
+
+    Raises ``AllocationConflict`` if any row no longer holds its deduction;
+    the caller's transaction undoes the rows that were updated.
+    """
+    match = lambda stock_ids: Q(pk__in=stock_ids)
+    for start in range(0, len(plan), DEDUCT_CHUNK_SIZE):
+        chunk = {d.stock_id: d.quantity for d in plan[start:start + DEDUCT_CHUNK_SIZE]}
+        groups = defaultdict(list)
+        for stock_id, quantity in chunk.items():
+            groups[quantity].append(stock_id)
+        guard = reduce(operator.or_, (Q(pk__in=ids, quantity__gte=quantity) for quantity, ids in groups.items()))
+        updated = Stock.objects.filter(guard).update(quantity=F('quantity') - summary.delta_case(chunk, match))
+        if updated != len(chunk):
+            raise AllocationConflict(sorted(chunk))
+
+
+def _deltas(plan, sign):
+    deltas = defaultdict(int)
+    for deduction in plan:
+        deltas[(deduction.product_id, deduction.location_id)] += sign * deduction.quantity
+    return deltas
+
+
+def allocate(lines, sales_order=None, attempts=MAX_ATTEMPTS):
+    """Deduct ``lines`` ({product_id: quantity}) from stock atomically.
+
+    Returns the list of ``Deduction`` rows applied. Raises
+    ``InsufficientStockError`` if any product cannot be fully covered, in
+    which case nothing is deducted. When ``sales_order`` is given the
+    deductions are held as reservations against it. When called inside an
+    outer ``transaction.atomic()`` block everything commits or rolls back
+    with it.
+    """
+    if not lines:
+        return []
+    for attempt in range(1, attempts + 1):
+        try:
+            with transaction.atomic():
+                plan = _allocate_once(lines)
+                reference = f'SO-{sales_order.pk}' if sales_order is not None else None
+                StockMovement.objects.bulk_create(
+                    StockMovement(stock_id=d.stock_id, movement_type='OUT', quantity=d.quantity, reference=reference)
+                    for d in plan
+                )
+                if sales_order is None:
+                    summary.apply_stock_deltas(_deltas(plan, -1))
+                else:
+                    StockReservation.objects.bulk_create(
+                        StockReservation(sales_order=sales_order, stock_id=d.stock_id, quantity=d.quantity)
+                        for d in plan
+                    )
+                    summary.apply_reservation_deltas(_deltas(plan, -1), _deltas(plan, 1))
+                return plan
+        except AllocationConflict as e:
+            logger.warning('Allocation conflict on stock %s (attempt %s/%s)', e, attempt, attempts)
+    raise BusinessRuleError('Stock changed while allocating; please retry the order.')
+
+
+def release(sales_order, restock=None):
+    """Release the reservations held by ``sales_order``.
+
+    Called when an order leaves the ``open`` status or is deleted. A shipped
+    order consumes its reserved units: they leave ``on_hand`` along with it.
+    Otherwise (a cancelled or deleted order) they go back to the Stock rows
+    they came from, posted as ``IN`` movements with the order's reference.
+    ``restock`` overrides the choice made from ``sales_order.status``.
+    """
+    if restock is None:
+        restock = sales_order.status != 'shipped'
+    reservations = list(
+        StockReservation.objects.select_for_update(of=('self',))
+        .filter(sales_order=sales_order)
+        .values_list('pk', 'stock_id', 'stock__product_id', 'stock__location_id', 'quantity')
+    )
+    if not reservations:
+        return
+    deltas = defaultdict(int)
+    for _, _, product_id, location_id, quantity in reservations:
+        deltas[(product_id, location_id)] -= quantity
+    summary.apply_reservation_deltas({}, deltas)
+    StockReservation.objects.filter(pk__in=[r[0] for r in reservations]).delete()
+    if restock:
+        post_movements(
+            StockMovement(stock_id=stock_id, movement_type='IN', quantity=quantity, reference=f'SO-{sales_order.pk}')
+            for _, stock_id, _, _, quantity in reservations
+        )
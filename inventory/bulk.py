@@ -0,0 +1,121 @@
+"""
+Bulk stock upsert.
+
+Validates a whole batch of ``{product, location, quantity}`` rows with one
+lookup per referenced table, then writes them with chunked
+``bulk_create(update_conflicts=True)`` on the ``(product, location)``
+unique key. Rows that fail validation are reported by index and skipped;
+the valid rows are written in a single transaction, together with a
+snapshot of every row written and a rebuild of the stock summaries of every
+product touched.
+"""
+from collections import OrderedDict
+
+from django.db import transaction
+
+from products.models import Product
+from warehouses.models import Location
+from . import summary
+from .ledger import record_snapshots
+from .models import Stock
+
+BULK_CHUNK_SIZE = 1000
+
+
+def _to_int(value):
+    if isinstance(value, bool):
+        raise ValueError(value)
+    return int(value)
+
+
+def _parse_row(row):
+    if not isinstance(row, dict):
+        return None, {'non_field_errors': ['Expected an object.']}
+    errors = {}
+    parsed = {}
+    for field in ('product', 'location', 'quantity'):
+        value = row.get(field)
+        if value is None or value == '':
+            errors[field] = ['This field is required.']
+            continue
+        try:
+            parsed[field] = _to_int(value)
+        except (TypeError, ValueError):
+            errors[field] = ['A valid integer is required.']
+    if 'quantity' in parsed and parsed['quantity'] < 0:
+        errors['quantity'] = ['Quantity cannot be negative.']
+    return parsed, errors
+
+
+def validate_stock_rows(rows):
+    """Split ``rows`` into ``(valid, errors)``.
+
+    ``valid`` maps ``(product_id, location_id)`` to quantity; a key that
+    appears more than once keeps its last value. ``errors`` is a list of
+    ``{'index': i, 'errors': {...}}`` entries.
+    """
+    errors = []
+    candidates = []
+    for index, row in enumerate(rows):
+        parsed, row_errors = _parse_row(row)
+        if row_errors:
+            errors.append({'index': index, 'errors': row_errors})
+        else:
+            candidates.append((index, parsed))
+
+    product_ids = {parsed['product'] for _, parsed in candidates}
+    location_ids = {parsed['location'] for _, parsed in candidates}
+    known_products = set(Product.objects.filter(pk__in=product_ids).values_list('pk', flat=True))
+    known_locations = set(Location.objects.filter(pk__in=location_ids).values_list('pk', flat=True))
+
+    valid = OrderedDict()
+    for index, parsed in candidates:
+        row_errors = {}
+        if parsed['product'] not in known_products:
+            row_errors['product'] = [f"Invalid pk \"{parsed['product']}\" - object does not exist."]
+        if parsed['location'] not in known_locations:
+            row_errors['location'] = [f"Invalid pk \"{parsed['location']}\" - object does not exist."]
+        if row_errors:
+            errors.append({'index': index, 'errors': row_errors})
+            continue
+        key = (parsed['product'], parsed['location'])
+        valid.pop(key, None)
+        valid[key] = parsed['quantity']
+    errors.sort(key=lambda error: error['index'])
+    return valid, errors
+
+
+def _snapshot_chunk(chunk):
+    quantities = {(obj.product_id, obj.location_id): obj.quantity for obj in chunk}
+    rows = Stock.objects.filter(
+        product_id__in={key[0] for key in quantities},
+        location_id__in={key[1] for key in quantities},
+    ).values_list('pk', 'product_id', 'location_id')
+    record_snapshots({
+        pk: quantities[(product_id, location_id)]
+        for pk, product_id, location_id in rows
+        if (product_id, location_id) in quantities
+    })
+
+
+def bulk_upsert_stock(rows, chunk_size=BULK_CHUNK_SIZE):
+    """Validate and upsert ``rows``; returns ``(upserted, errors)``."""
+    valid, errors = validate_stock_rows(rows)
+    objs = [
+        Stock(product_id=product_id, location_id=location_id, quantity=quantity)
+        for (product_id, location_id), quantity in valid.items()
+    ]
+    with transaction.atomic():
+        for start in range(0, len(objs), chunk_size):
+            chunk = objs[start:start + chunk_size]
+            Stock.objects.bulk_create(
+                chunk,
+                update_conflicts=True,
+                unique_fields=['product', 'location'],
+                update_fields=['quantity'],
+            )
+            _snapshot_chunk(chunk)
+        product_ids = sorted({obj.product_id for obj in objs})
+        for start in range(0, len(product_ids), chunk_size):
+            summary.rebuild(product_ids[start:start + chunk_size])
+    return len(objs), errors
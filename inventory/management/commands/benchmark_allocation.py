@@ -0,0 +1,112 @@
+import queue
+import threading
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, transaction
+from django.db.models import Sum
+
+from inventory.allocation import allocate
+from inventory.models import Stock
+from inventory_api.exceptions import BusinessRuleError, InsufficientStockError
+from products.models import Product
+from warehouses.models import Location, Warehouse
+
+BUSY_ATTEMPTS = 50
+
+
+class Command(BaseCommand):
+    help = (
+        'Fire concurrent allocations at a single product and verify that no '
+        'units are oversold. Creates its own fixture rows and removes them afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--orders', type=int, default=500)
+        parser.add_argument('--quantity', type=int, default=3, help='Units requested per order')
+        parser.add_argument('--stock', type=int, default=1000, help='Units on hand before the run')
+        parser.add_argument('--locations', type=int, default=4)
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        warehouse = Warehouse.objects.create(name=f'bench-{tag}', capacity=options['stock'])
+        product = Product.objects.create(name=f'bench-{tag}', sku=f'BENCH-{tag}', barcode=f'BENCH-{tag}')
+        try:
+            self._seed(warehouse, product, options)
+            self._run(product, options)
+        finally:
+            product.delete()
+            warehouse.delete()
+
+    def _seed(self, warehouse, product, options):
+        per_location, remainder = divmod(options['stock'], options['locations'])
+        for i in range(options['locations']):
+            location = Location.objects.create(warehouse=warehouse, name=f'bench-{i}', type='Bin')
+            quantity = per_location + (remainder if i == 0 else 0)
+            Stock.objects.create(product=product, location=location, quantity=quantity)
+
+    def _place(self, lines, counts, lock):
+        # SQLite refuses to upgrade a read lock while another writer is
+        # active; like a real client we back off and replay the transaction.
+        for attempt in range(BUSY_ATTEMPTS):
+            try:
+                with transaction.atomic():
+                    allocate(lines)
+                return 'allocated'
+            except InsufficientStockError:
+                return 'rejected'
+            except BusinessRuleError:
+                return 'conflicts'
+            except OperationalError:
+                with lock:
+                    counts['busy_retries'] += 1
+                time.sleep(0.001 * (attempt + 1))
+        return 'errors'
+
+    def _run(self, product, options):
+        jobs = queue.Queue()
+        for _ in range(options['orders']):
+            jobs.put({product.id: options['quantity']})
+        counts = {'allocated': 0, 'rejected': 0, 'conflicts': 0, 'errors': 0, 'busy_retries': 0}
+        lock = threading.Lock()
+
+        def worker():
+            try:
+                while True:
+                    try:
+                        lines = jobs.get_nowait()
+                    except queue.Empty:
+                        return
+                    outcome = self._place(lines, counts, lock)
+                    with lock:
+                        counts[outcome] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        remaining = Stock.objects.filter(product=product).aggregate(total=Sum('quantity'))['total'] or 0
+        negative = Stock.objects.filter(product=product, quantity__lt=0).count()
+        sold = counts['allocated'] * options['quantity']
+        oversold = max(0, sold - options['stock'])
+
+        self.stdout.write(
+            f"orders={options['orders']} threads={options['threads']} elapsed={elapsed:.3f}s "
+            f"orders/sec={options['orders'] / elapsed:.1f}"
+        )
+        self.stdout.write(
+            'allocated={allocated} rejected={rejected} conflicts={conflicts} '
+            'errors={errors} busy_retries={busy_retries}'.format(**counts)
+        )
+        self.stdout.write(f"units sold={sold} remaining={remaining} oversold={oversold}")
+        if oversold or negative or sold + remaining != options['stock']:
+            raise CommandError('Stock ledger does not balance: allocation oversold or lost units.')
+        self.stdout.write(self.style.SUCCESS('Zero oversell.'))
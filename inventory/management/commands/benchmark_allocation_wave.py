@@ -0,0 +1,56 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from inventory.optimizer import StockMatrix, plan_wave
+
+
+class Command(BaseCommand):
+    help = (
+        'Plan a wave of random orders against a random multi-warehouse stock matrix '
+        'and report orders/sec, warehouses per order and bins per line. Runs in memory; '
+        'the database is not touched.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=5000)
+        parser.add_argument('--lines', type=int, default=5, help='Lines per order')
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--warehouses', type=int, default=8)
+        parser.add_argument('--bins', type=int, default=3, help='Locations per product per warehouse')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        rows = []
+        for product in range(1, options['products'] + 1):
+            for warehouse in range(1, options['warehouses'] + 1):
+                for slot in range(options['bins']):
+                    location = (warehouse * options['bins'] + slot) * 100000 + product
+                    rows.append((len(rows) + 1, product, location, warehouse, int(rng.integers(0, 20))))
+        priorities = {warehouse: int(rng.integers(0, 3)) for warehouse in range(1, options['warehouses'] + 1)}
+        orders = {
+            index: {
+                int(product): int(rng.integers(1, 6))
+                for product in rng.choice(options['products'], options['lines'], replace=False) + 1
+            }
+            for index in range(options['orders'])
+        }
+
+        started = time.perf_counter()
+        matrix = StockMatrix(rows, priorities)
+        loaded = time.perf_counter()
+        plans, shortages = plan_wave(orders, matrix)
+        elapsed = time.perf_counter() - loaded
+
+        warehouses_per_order = [len({location // 100000 // options['bins'] for _, _, location, _ in plan}) for plan in plans.values()]
+        bins_per_line = [len(plan) / len({d.product_id for d in plan}) for plan in plans.values()]
+        self.stdout.write(
+            f"stock rows={len(rows)} matrix build={loaded - started:.3f}s "
+            f"orders={options['orders']} planned={len(plans)} short={len(shortages)}"
+        )
+        self.stdout.write(
+            f"elapsed={elapsed:.3f}s orders/sec={options['orders'] / elapsed:.0f} "
+            f"warehouses/order={np.mean(warehouses_per_order):.2f} bins/line={np.mean(bins_per_line):.2f}"
+        )
@@ -0,0 +1,90 @@
+import time
+import uuid
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from inventory import summary
+from inventory.availability import page_key
+from inventory.models import Stock
+from inventory.views import AvailabilityView
+from orders.models import PurchaseOrder, PurchaseOrderItem
+from products.models import Product
+from users.models import Employee
+from warehouses.models import Location, Warehouse
+
+
+class Command(BaseCommand):
+    help = (
+        'Time GET /api/availability/ for a page of products, cold (its cache entries '
+        'deleted before each request) and warm, and report p50/p99. Creates its own fixture rows and '
+        'removes them afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=500, help='Products per request')
+        parser.add_argument('--orders', type=int, default=200, help='Open purchase orders inbound')
+        parser.add_argument('--requests', type=int, default=200)
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        warehouse = Warehouse.objects.create(name=f'bench-{tag}', capacity=1)
+        location = Location.objects.create(warehouse=warehouse, name=f'bench-{tag}', type='Bin')
+        products = Product.objects.bulk_create(
+            Product(name=f'bench-{tag}-{i}', sku=f'BENCH-{tag}-{i}', barcode=f'BENCH-{tag}-{i}')
+            for i in range(options['products'])
+        )
+        product_ids = [p.pk for p in products]
+        user = User.objects.create_user(username=f'bench-{tag}')
+        Employee.objects.create(user=user, name=user.username, role='employee')
+        orders = []
+        try:
+            Stock.objects.bulk_create(Stock(product=product, location=location, quantity=10) for product in products)
+            summary.rebuild(product_ids)
+            now = timezone.now()
+            orders = PurchaseOrder.objects.bulk_create(
+                PurchaseOrder(status='open', expected_date=now + timedelta(days=i % 30)) for i in range(options['orders'])
+            )
+            PurchaseOrderItem.objects.bulk_create(
+                PurchaseOrderItem(purchase_order=order, product_id=product_ids[(i * 7 + j) % len(product_ids)], quantity=5)
+                for i, order in enumerate(orders)
+                for j in range(10)
+            )
+            query = ','.join(str(pk) for pk in product_ids)
+            keys = [page_key(product_ids)]
+            self._run('cold', user, query, options['requests'], keys)
+            self._run('warm', user, query, options['requests'], None)
+        finally:
+            PurchaseOrder.objects.filter(pk__in=[order.pk for order in orders]).delete()
+            Product.objects.filter(pk__in=product_ids).delete()
+            warehouse.delete()
+            user.delete()
+            # Only our own entries: the cache is shared with the running site
+            cache.delete(page_key(product_ids))
+
+    def _run(self, label, user, query, count, evict):
+        factory = APIRequestFactory()
+        view = AvailabilityView.as_view()
+        timings = []
+        for _ in range(count):
+            if evict:
+                cache.delete_many(evict)
+            request = factory.get('/api/availability/', {'product': query})
+            force_authenticate(request, user=user)
+            started = time.perf_counter()
+            response = view(request)
+            # Errors are DRF responses; a page is already encoded
+            if hasattr(response, 'render'):
+                response.render()
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        p50 = timings[len(timings) // 2] * 1000
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1000
+        self.stdout.write(
+            f'{label}: requests={count} status={response.status_code} bytes={len(response.content)} '
+            f'p50={p50:.1f}ms p99={p99:.1f}ms'
+        )
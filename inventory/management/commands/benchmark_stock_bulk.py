@@ -0,0 +1,60 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from inventory.bulk import BULK_CHUNK_SIZE, bulk_upsert_stock
+from inventory.models import Stock
+from products.models import Product
+from warehouses.models import Location, Warehouse
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure bulk stock upsert throughput: one insert pass and one update '
+        'pass over the same (product, location) keys. Creates its own fixture '
+        'rows and removes them afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=20000)
+        parser.add_argument('--locations', type=int, default=4)
+        parser.add_argument('--chunk-size', type=int, default=BULK_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        location_count = options['locations']
+        product_count = -(-options['rows'] // location_count)
+        warehouse = Warehouse.objects.create(name=f'bench-{tag}', capacity=options['rows'])
+        locations = Location.objects.bulk_create(
+            Location(warehouse=warehouse, name=f'bench-{i}', type='Bin') for i in range(location_count)
+        )
+        products = Product.objects.bulk_create(
+            Product(name=f'bench-{tag}-{i}', sku=f'BENCH-{tag}-{i}', barcode=f'BENCH-{tag}-{i}')
+            for i in range(product_count)
+        )
+        product_ids = [p.pk for p in products]
+        try:
+            rows = [
+                {'product': product_id, 'location': location.pk, 'quantity': 10}
+                for product_id in product_ids
+                for location in locations
+            ][:options['rows']]
+            self._pass('insert', rows, options['chunk_size'])
+            for row in rows:
+                row['quantity'] += 5
+            self._pass('update', rows, options['chunk_size'])
+            written = Stock.objects.filter(product_id__in=product_ids, quantity=15).count()
+            self.stdout.write(f'verified rows={written}/{len(rows)}')
+        finally:
+            Product.objects.filter(pk__in=product_ids).delete()
+            warehouse.delete()
+
+    def _pass(self, label, rows, chunk_size):
+        started = time.perf_counter()
+        upserted, errors = bulk_upsert_stock(rows, chunk_size=chunk_size)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{label}: rows={upserted} errors={len(errors)} elapsed={elapsed:.3f}s '
+            f'rows/sec={upserted / elapsed:.0f}'
+        )
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from inventory import summary
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-product and per-warehouse stock summaries in chunks, or verify them with --verify.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--verify', action='store_true', help='Report mismatches without writing')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        ids = Product.objects.order_by('pk').values_list('pk', flat=True)
+        last_pk = 0
+        processed = 0
+        mismatches = 0
+        while True:
+            chunk = list(ids.filter(pk__gt=last_pk)[:chunk_size])
+            if not chunk:
+                break
+            last_pk = chunk[-1]
+            if options['verify']:
+                for key, stored, expected in summary.verify(chunk):
+                    mismatches += 1
+                    self.stdout.write(f'mismatch {key}: stored={stored} expected={expected}')
+            else:
+                with transaction.atomic():
+                    summary.rebuild(chunk)
+            processed += len(chunk)
+
+        if options['verify']:
+            if mismatches:
+                raise CommandError(f'{mismatches} summary rows out of date across {processed} products.')
+            self.stdout.write(self.style.SUCCESS(f'Verified {processed} products.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt summaries for {processed} products.'))
@@ -0,0 +1,78 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_summaries(apps, schema_editor):
+    Stock = apps.get_model('inventory', 'Stock')
+    ProductStockSummary = apps.get_model('inventory', 'ProductStockSummary')
+    WarehouseStockSummary = apps.get_model('inventory', 'WarehouseStockSummary')
+    products = {}
+    warehouses = []
+    rows = (
+        Stock.objects.exclude(product_id=None)
+        .values_list('product_id', 'location__warehouse_id')
+        .annotate(total=models.Sum('quantity'))
+    )
+    for product_id, warehouse_id, total in rows:
+        total = total or 0
+        products[product_id] = products.get(product_id, 0) + total
+        if warehouse_id is not None:
+            warehouses.append(WarehouseStockSummary(
+                product_id=product_id, warehouse_id=warehouse_id, on_hand=total, available=total,
+            ))
+    ProductStockSummary.objects.bulk_create(
+        [ProductStockSummary(product_id=pk, on_hand=total, available=total) for pk, total in products.items()],
+        batch_size=1000,
+    )
+    WarehouseStockSummary.objects.bulk_create(warehouses, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warehouses', '0002_alter_location_name_alter_location_type_and_more'),
+        ('products', '0002_alter_product_barcode_alter_product_category_and_more'),
+        ('orders', '0002_alter_purchaseorder_created_by_and_more'),
+        ('inventory', '0003_alter_stock_location_alter_stock_product_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductStockSummary',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stock_summary', serialize=False, to='products.product')),
+                ('on_hand', models.IntegerField(default=0)),
+                ('reserved', models.IntegerField(default=0)),
+                ('available', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sales_order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='orders.salesorder')),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='inventory.stock')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='WarehouseStockSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('on_hand', models.IntegerField(default=0)),
+                ('reserved', models.IntegerField(default=0)),
+                ('available', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='warehouse_stock_summaries', to='products.product')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_summaries', to='warehouses.warehouse')),
+            ],
+            options={
+                'unique_together': {('product', 'warehouse')},
+            },
+        ),
+        migrations.RunPython(populate_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_stock_summary'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='movement_type',
+            field=models.CharField(blank=True, choices=[('IN', 'In'), ('OUT', 'Out')], max_length=50, null=True),
+        ),
+    ]
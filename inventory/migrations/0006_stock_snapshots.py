@@ -0,0 +1,51 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def seed_snapshots(apps, schema_editor):
+    # History before this migration is unknown; start every row from today
+    Stock = apps.get_model('inventory', 'Stock')
+    StockSnapshot = apps.get_model('inventory', 'StockSnapshot')
+    now = django.utils.timezone.now()
+    StockSnapshot.objects.bulk_create(
+        [
+            StockSnapshot(stock_id=pk, taken_at=now, quantity=quantity or 0)
+            for pk, quantity in Stock.objects.values_list('pk', 'quantity').iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_stockmovement_types'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('quantity', models.IntegerField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['stock', 'timestamp'], name='stockmovement_stock_ts_idx'),
+        ),
+        migrations.AddField(
+            model_name='stocksnapshot',
+            name='stock',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='inventory.stock'),
+        ),
+        migrations.AddIndex(
+            model_name='stocksnapshot',
+            index=models.Index(fields=['stock', 'taken_at'], name='stocksnapshot_stock_ts_idx'),
+        ),
+        migrations.RunPython(seed_snapshots, migrations.RunPython.noop),
+    ]
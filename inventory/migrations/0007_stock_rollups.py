@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_category_closure'),
+        ('warehouses', '0004_warehouse_allocation_priority'),
+        ('inventory', '0006_stock_snapshots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StockRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('period_start', models.DateTimeField()),
+                ('sold', models.IntegerField(default=0)),
+                ('received', models.IntegerField(default=0)),
+                ('adjusted', models.IntegerField(default=0)),
+                ('closing_on_hand', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_rollups', to='products.product')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_rollups', to='warehouses.warehouse')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['bucket', 'period_start'], name='stockrollup_bucket_period_idx')],
+                'unique_together': {('bucket', 'product', 'warehouse', 'period_start')},
+            },
+        ),
+    ]
@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 
 # Create your models here.
 
@@ -17,15 +18,34 @@ class Stock(models.Model):
 
     def save(self, *args, **kwargs):
         self.full_clean()
-        super().save(*args, **kwargs)
+        # Stock summaries are updated by signals; keep them in this transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
 
 class StockMovement(models.Model):
+    MOVEMENT_TYPES = (
+        ('IN', 'In'),
+        ('OUT', 'Out'),
+    )
+    # Sign applied to ``quantity`` when a movement is posted to Stock
+    MOVEMENT_SIGNS = {'IN': 1, 'OUT': -1}
     stock = models.ForeignKey(Stock, on_delete=models.CASCADE, null=True, blank=True)
-    movement_type = models.CharField(max_length=50, null=True, blank=True)
+    movement_type = models.CharField(max_length=50, choices=MOVEMENT_TYPES, null=True, blank=True)
     quantity = models.IntegerField(null=True, blank=True)
     timestamp = models.DateTimeField(auto_now_add=True, null=True, blank=True)
     reference = models.CharField(max_length=100, null=True, blank=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['stock', 'timestamp'], name='stockmovement_stock_ts_idx')]
+
+    @property
+    def delta(self):
+        return self.MOVEMENT_SIGNS[self.movement_type] * self.quantity
+
 class StockAdjustment(models.Model):
     stock = models.ForeignKey(Stock, on_delete=models.CASCADE, null=True, blank=True)
     ADJUSTMENT_TYPES = (
@@ -38,3 +58,86 @@ class StockAdjustment(models.Model):
     reason = models.TextField(null=True, blank=True)
     approved_by = models.ForeignKey('users.Employee', on_delete=models.SET_NULL, null=True, blank=True)
     timestamp = models.DateTimeField(auto_now_add=True, null=True, blank=True)
+
+class StockSnapshot(models.Model):
+    """
+    Absolute Stock.quantity at a point in time.
+
+    Written whenever a quantity is set directly (API save, bulk upsert) and
+    periodically by ``manage.py snapshot_stock``; together with the
+    StockMovement ledger it answers point-in-time queries.
+    """
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='snapshots')
+    taken_at = models.DateTimeField(default=timezone.now)
+    quantity = models.IntegerField()
+
+    class Meta:
+        indexes = [models.Index(fields=['stock', 'taken_at'], name='stocksnapshot_stock_ts_idx')]
+
+class StockReservation(models.Model):
+    """Units allocated to a sales order that is still open."""
+    sales_order = models.ForeignKey('orders.SalesOrder', on_delete=models.CASCADE, related_name='reservations')
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+class ProductStockSummary(models.Model):
+    """
+    Denormalized per-product totals, maintained in the same transaction as
+    every Stock write (see inventory.summary).
+
+    ``available`` is the sum of Stock.quantity, ``reserved`` is what open
+    sales orders have already taken out of Stock, and ``on_hand`` is what is
+    physically in the building: ``available + reserved``.
+    """
+    product = models.OneToOneField('products.Product', on_delete=models.CASCADE, primary_key=True, related_name='stock_summary')
+    on_hand = models.IntegerField(default=0)
+    reserved = models.IntegerField(default=0)
+    available = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+class WarehouseStockSummary(models.Model):
+    """Same totals as ProductStockSummary, split by warehouse."""
+    product = models.ForeignKey('products.Product', on_delete=models.CASCADE, related_name='warehouse_stock_summaries')
+    warehouse = models.ForeignKey('warehouses.Warehouse', on_delete=models.CASCADE, related_name='stock_summaries')
+    on_hand = models.IntegerField(default=0)
+    reserved = models.IntegerField(default=0)
+    available = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('product', 'warehouse')
+
+class StockRollup(models.Model):
+    """
+    Ledger activity per product and warehouse over one hour or one day,
+    maintained by ``manage.py rollup_stock`` (see inventory.rollups).
+
+    ``sold`` counts ``OUT`` movements for sales orders, ``received`` counts
+    ``IN`` movements for purchase orders and ``adjusted`` is the signed net of
+    every other movement. ``closing_on_hand`` is the warehouse's
+    Stock.quantity total at the end of the period. Periods without movements
+    have no row; their closing quantity is that of the row before.
+    """
+    BUCKETS = (
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    )
+    bucket = models.CharField(max_length=4, choices=BUCKETS)
+    period_start = models.DateTimeField()
+    product = models.ForeignKey('products.Product', on_delete=models.CASCADE, related_name='stock_rollups')
+    warehouse = models.ForeignKey('warehouses.Warehouse', on_delete=models.CASCADE, related_name='stock_rollups')
+    sold = models.IntegerField(default=0)
+    received = models.IntegerField(default=0)
+    adjusted = models.IntegerField(default=0)
+    closing_on_hand = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('bucket', 'product', 'warehouse', 'period_start')
+        indexes = [models.Index(fields=['bucket', 'period_start'], name='stockrollup_bucket_period_idx')]
+
+class RollupWatermark(models.Model):
+    """Id of the last StockMovement folded into StockRollup."""
+    name = models.CharField(max_length=50, primary_key=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
@@ -0,0 +1,145 @@
+"""
+Source selection for order allocation.
+
+``StockMatrix`` holds the stock on hand for a set of products as NumPy
+arrays: one entry per Stock row (a product × location cell) and a dense
+product × warehouse total. ``StockMatrix.plan`` chooses where each line of an
+order ships from:
+
+1. the fewest warehouses. Warehouses are taken greedily, each time the one
+   covering the most of the remaining units, so a warehouse that can fill
+   the whole order always wins. Ties go to the lowest
+   ``Warehouse.allocation_priority``, then the lowest id;
+2. within a warehouse, the fewest locations: each line takes its largest
+   bins first.
+
+The plan is deducted from the matrix, so ``plan_wave`` can plan thousands of
+orders from one stock read. Each order costs a few array operations over the
+warehouse axis, plus one per line and chosen warehouse to split the line
+across bins.
+"""
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from inventory_api.exceptions import InsufficientStockError
+from .models import Stock
+
+# Stands in for a missing location or warehouse id in the integer arrays
+MISSING = -1
+
+Deduction = namedtuple('Deduction', ['stock_id', 'product_id', 'location_id', 'quantity'])
+
+
+class StockMatrix:
+    @classmethod
+    def load(cls, product_ids, lock=False):
+        """Read the stock of ``product_ids``; ``lock`` takes the Stock rows FOR UPDATE."""
+        queryset = Stock.objects.filter(product_id__in=list(product_ids), quantity__gt=0)
+        if lock:
+            queryset = queryset.select_for_update(of=('self',))
+        rows = list(queryset.order_by('id').values_list(
+            'id', 'product_id', 'location_id', 'location__warehouse_id', 'quantity',
+            'location__warehouse__allocation_priority',
+        ))
+        return cls([row[:5] for row in rows], {row[3]: row[5] for row in rows if row[3] is not None})
+
+    def __init__(self, rows, priorities=None):
+        """``rows`` are ``(stock_id, product_id, location_id, warehouse_id, quantity)``.
+
+        ``priorities`` maps warehouse id to its allocation priority (lower
+        first); missing warehouses count as 0.
+        """
+        rows = [row for row in rows if row[4] and row[4] > 0]
+        priorities = priorities or {}
+        columns = list(zip(*rows)) if rows else [[], [], [], [], []]
+        self.stock_ids = np.array(columns[0], dtype=np.int64)
+        product_ids = np.array(columns[1], dtype=np.int64)
+        self.location_ids = np.array([MISSING if pk is None else pk for pk in columns[2]], dtype=np.int64)
+        warehouse_ids = np.array([MISSING if pk is None else pk for pk in columns[3]], dtype=np.int64)
+        self.quantity = np.array(columns[4], dtype=np.int64)
+
+        self.product_ids, self.cell_product = np.unique(product_ids, return_inverse=True)
+        self.warehouse_ids, self.cell_warehouse = np.unique(warehouse_ids, return_inverse=True)
+        self.product_index = {int(pk): i for i, pk in enumerate(self.product_ids)}
+        self.priorities = np.array([priorities.get(int(pk), 0) for pk in self.warehouse_ids], dtype=np.int64)
+        self.by_warehouse = np.zeros((len(self.product_ids), len(self.warehouse_ids)), dtype=np.int64)
+        np.add.at(self.by_warehouse, (self.cell_product, self.cell_warehouse), self.quantity)
+
+        # Cells grouped by (product, warehouse), each group in stock id order
+        order = np.lexsort((self.stock_ids, self.cell_warehouse, self.cell_product))
+        keys = self.cell_product[order] * len(self.warehouse_ids) + self.cell_warehouse[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.array([], dtype=np.int64)
+        ends = np.r_[starts[1:], len(keys)]
+        self.cells = {int(keys[s]): order[s:e] for s, e in zip(starts, ends)}
+
+    def available(self, lines):
+        return {
+            product_id: int(self.by_warehouse[self.product_index[product_id]].sum())
+            if product_id in self.product_index else 0
+            for product_id in lines
+        }
+
+    def plan(self, lines):
+        """Choose sources for ``lines`` ({product_id: quantity}) and deduct them.
+
+        Returns a list of ``Deduction``. Raises ``InsufficientStockError`` if
+        any line cannot be covered, in which case nothing is deducted.
+        """
+        lines = OrderedDict((product_id, quantity) for product_id, quantity in lines.items() if quantity > 0)
+        if not lines:
+            return []
+        available = self.available(lines)
+        shortages = OrderedDict(
+            (product_id, (requested, available[product_id]))
+            for product_id, requested in lines.items()
+            if requested > available[product_id]
+        )
+        if shortages:
+            raise InsufficientStockError(shortages)
+
+        rows = np.array([self.product_index[product_id] for product_id in lines], dtype=np.int64)
+        remaining = np.array(list(lines.values()), dtype=np.int64)
+        held = self.by_warehouse[rows]
+        plan = []
+        while remaining.any():
+            cover = np.minimum(held, remaining[:, None]).sum(axis=0)
+            best = np.lexsort((self.warehouse_ids, self.priorities, -cover))[0]
+            take = np.minimum(held[:, best], remaining)
+            held[:, best] = 0
+            remaining -= take
+            for line in np.flatnonzero(take):
+                plan += self._split(rows[line], best, int(take[line]))
+        return plan
+
+    def _split(self, product, warehouse, wanted):
+        """Take ``wanted`` units of ``product`` from ``warehouse``'s largest bins."""
+        cells = self.cells[int(product) * len(self.warehouse_ids) + int(warehouse)]
+        cells = cells[np.argsort(-self.quantity[cells], kind='stable')]
+        quantity = self.quantity[cells]
+        before = np.cumsum(quantity) - quantity
+        deduct = np.clip(wanted - before, 0, quantity)
+        used = deduct > 0
+        cells, deduct = cells[used], deduct[used]
+        self.quantity[cells] -= deduct
+        self.by_warehouse[product, warehouse] -= wanted
+        return [
+            Deduction(int(stock_id), int(self.product_ids[product]), None if location_id == MISSING else int(location_id), int(quantity))
+            for stock_id, location_id, quantity in zip(self.stock_ids[cells], self.location_ids[cells], deduct)
+        ]
+
+
+def plan_wave(orders, matrix):
+    """Plan ``orders`` ({key: lines}) in turn against ``matrix``.
+
+    Returns ``{key: plan}`` for the orders that could be covered and
+    ``{key: shortages}`` for those that could not; a short order leaves the
+    matrix untouched for the ones after it.
+    """
+    plans, shortages = OrderedDict(), OrderedDict()
+    for key, lines in orders.items():
+        try:
+            plans[key] = matrix.plan(lines)
+        except InsufficientStockError as e:
+            shortages[key] = e.shortages
+    return plans, shortages
@@ -0,0 +1,108 @@
+"""
+StockMovement posting engine.
+
+Posting a batch of movements applies them to Stock and appends them to the
+ledger in one transaction. Movements are coalesced per Stock row first, so a
+scanner feed that reports the same bin a thousand times costs one
+conditional UPDATE for that bin, one ``bulk_create`` for the ledger rows and
+one pass over the stock summaries. Increments cannot fail, so all of them
+share a single ``CASE`` UPDATE; only decrements need a guarded UPDATE per
+row.
+"""
+from collections import OrderedDict, defaultdict
+
+from django.db import transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce
+
+from inventory_api.exceptions import InsufficientStockError
+from . import summary
+from .ledger import record_snapshots
+from .models import Stock, StockMovement
+
+INCREMENT_CHUNK_SIZE = 500
+
+
+def coalesce(movements):
+    """Net ``movements`` into ``{stock_id: delta}``, in first-seen order."""
+    deltas = OrderedDict()
+    for movement in movements:
+        deltas[movement.stock_id] = deltas.get(movement.stock_id, 0) + movement.delta
+    return deltas
+
+
+def post_movements(movements):
+    """Apply unsaved ``movements`` to Stock and save them; returns the saved rows.
+
+    Raises ``InsufficientStockError`` (keyed by stock id) if any Stock row
+    would go negative, in which case nothing is written.
+    """
+    movements = list(movements)
+    if not movements:
+        return []
+    deltas = coalesce(movements)
+    with transaction.atomic():
+        rows = {
+            pk: (product_id, location_id, quantity)
+            for pk, product_id, location_id, quantity in Stock.objects.select_for_update()
+            .filter(pk__in=list(deltas))
+            .values_list('id', 'product_id', 'location_id', 'quantity')
+        }
+        shortages = OrderedDict(
+            (stock_id, (-delta, rows[stock_id][2] or 0))
+            for stock_id, delta in deltas.items()
+            if (rows[stock_id][2] or 0) + delta < 0
+        )
+        if shortages:
+            raise InsufficientStockError(shortages, label='stock')
+
+        increments = sorted(pk for pk, delta in deltas.items() if delta > 0)
+        for start in range(0, len(increments), INCREMENT_CHUNK_SIZE):
+            chunk = increments[start:start + INCREMENT_CHUNK_SIZE]
+            Stock.objects.filter(pk__in=chunk).update(quantity=Coalesce(F('quantity'), Value(0)) + summary.delta_case(
+                {pk: deltas[pk] for pk in chunk}, lambda keys: Q(pk__in=keys),
+            ))
+        for stock_id in sorted(pk for pk, delta in deltas.items() if delta < 0):
+            delta = deltas[stock_id]
+            queryset = Stock.objects.filter(pk=stock_id, quantity__gte=-delta)
+            if not queryset.update(quantity=Coalesce(F('quantity'), Value(0)) + delta):
+                current = Stock.objects.filter(pk=stock_id).values_list('quantity', flat=True).first()
+                raise InsufficientStockError({stock_id: (-delta, current or 0)}, label='stock')
+
+        created = StockMovement.objects.bulk_create(movements)
+        summary_deltas = defaultdict(int)
+        for stock_id, delta in deltas.items():
+            product_id, location_id, _ = rows[stock_id]
+            summary_deltas[(product_id, location_id)] += delta
+        summary.apply_stock_deltas(summary_deltas)
+    return created
+
+
+def ensure_stock(keys):
+    """Return ``{(product_id, location_id): stock_id}``, creating missing rows at zero.
+
+    New rows get a zero snapshot, so point-in-time queries see every movement
+    posted to them afterwards.
+    """
+    keys = set(keys)
+    if not keys:
+        return {}
+
+    def lookup():
+        rows = Stock.objects.filter(
+            product_id__in={product_id for product_id, _ in keys},
+            location_id__in={location_id for _, location_id in keys},
+        ).values_list('product_id', 'location_id', 'pk')
+        return {(product_id, location_id): pk for product_id, location_id, pk in rows if (product_id, location_id) in keys}
+
+    found = lookup()
+    missing = keys - set(found)
+    if not missing:
+        return found
+    Stock.objects.bulk_create(
+        [Stock(product_id=product_id, location_id=location_id, quantity=0) for product_id, location_id in missing],
+        ignore_conflicts=True,
+    )
+    found = lookup()
+    record_snapshots({found[key]: 0 for key in missing})
+    return found
@@ -0,0 +1,287 @@
+"""
+Hourly and daily stock rollups.
+
+``roll_up`` folds new ledger rows into StockRollup, one row per bucket
+(hour, day), period, product and warehouse. Progress is kept as two
+watermarks, the ids of the last StockMovement and StockSnapshot folded in,
+so each run reads only the rows written since the previous one. The rows of
+a chunk, the rollups they touch and the advanced watermarks commit in one
+transaction, so a run that fails part way is picked up where it stopped and
+nothing is counted twice. Schedule ``manage.py rollup_stock`` (e.g. every
+few minutes).
+
+Movements are classified by reference: movements of sales orders
+(``SO-<id>``) are sold, ``OUT`` net of units returned by cancelling the
+order; ``IN`` rows of purchase orders (``PO-<id>``) are received and
+everything else is an adjustment. Stock rows without a product or a
+location are not rolled up.
+
+Closing quantities follow the same rules as ``annotate_as_of``: the latest
+snapshot plus the movements after it. A chunk replays the ledger of the
+Stock rows it touches once, from the earliest period it touches, and
+recomputes the closing of every period it touched and of every later row of
+the same product and warehouse, so a movement that arrives late corrects
+the periods after it too. A snapshot that changes the quantity (a quantity
+set directly, not through a movement) gets a row for its period even
+without movements, so the change shows in ``closing_on_hand``; it is not
+counted as an adjustment. Either way a chunk costs the same handful of
+queries however many periods it spans.
+
+Ids are handed out before transactions commit, so a row whose transaction
+commits late could land behind a watermark. Only rows older than
+``ROLLUP_SETTLE_SECONDS`` (60 by default) are folded in, which leaves
+writers that long to commit.
+"""
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .ledger import annotate_as_of
+from .models import RollupWatermark, Stock, StockMovement, StockRollup, StockSnapshot
+
+ROLLUP_CHUNK_SIZE = 5000
+ROLLUP_SETTLE_SECONDS = getattr(settings, 'ROLLUP_SETTLE_SECONDS', 60)
+MOVEMENTS = 'stock_movements'
+SNAPSHOTS = 'stock_snapshots'
+BUCKETS = [bucket for bucket, _ in StockRollup.BUCKETS]
+COUNTERS = ('sold', 'received', 'adjusted')
+
+
+def period_start(bucket, at):
+    """Start of the ``bucket`` period holding ``at``, in the current time zone."""
+    at = timezone.localtime(at)
+    if bucket == 'hour':
+        return at.replace(minute=0, second=0, microsecond=0)
+    return timezone.make_aware(datetime.combine(at.date(), time.min))
+
+
+def next_period(bucket, start):
+    if bucket == 'hour':
+        return start + timedelta(hours=1)
+    return timezone.make_aware(datetime.combine(timezone.localtime(start).date() + timedelta(days=1), time.min))
+
+
+def classify(movement_type, quantity, reference):
+    """Counter a movement adds to and by how much."""
+    reference = reference or ''
+    signed = StockMovement.MOVEMENT_SIGNS.get(movement_type, 0) * quantity
+    if reference.startswith('SO-'):
+        return 'sold', -signed
+    if movement_type == 'IN' and reference.startswith('PO-'):
+        return 'received', quantity
+    return 'adjusted', signed
+
+
+class History:
+    """Quantity over time of the Stock rows of some (product, warehouse) pairs.
+
+    Replays snapshots and movements from ``since`` to ``until`` on top of
+    the quantities at ``since``, in four queries.
+    """
+
+    def __init__(self, pairs, since, until, watched=()):
+        self.stocks = defaultdict(list)
+        for pk, product_id, warehouse_id in Stock.objects.filter(
+            product_id__in={p for p, _ in pairs}, location__warehouse_id__in={w for _, w in pairs},
+        ).values_list('pk', 'product_id', 'location__warehouse_id'):
+            if (product_id, warehouse_id) in pairs:
+                self.stocks[(product_id, warehouse_id)].append(pk)
+        stock_ids = [pk for pks in self.stocks.values() for pk in pks]
+        current = dict(
+            annotate_as_of(Stock.objects.filter(pk__in=stock_ids), since).values_list('pk', 'quantity_as_of')
+        )
+        # Movements sort before a snapshot taken at the same moment, which includes them
+        events = [
+            (at, 0, pk, stock_id, StockMovement.MOVEMENT_SIGNS.get(movement_type, 0) * (quantity or 0))
+            for pk, stock_id, at, movement_type, quantity in StockMovement.objects.filter(
+                stock_id__in=stock_ids, timestamp__gt=since, timestamp__lte=until,
+            ).values_list('pk', 'stock_id', 'timestamp', 'movement_type', 'quantity')
+        ] + [
+            (at, 1, pk, stock_id, quantity)
+            for pk, stock_id, at, quantity in StockSnapshot.objects.filter(
+                stock_id__in=stock_ids, taken_at__gt=since, taken_at__lte=until,
+            ).values_list('pk', 'stock_id', 'taken_at', 'quantity')
+        ]
+        events.sort()
+        self.times = {pk: [since] for pk in stock_ids}
+        self.quantities = {pk: [current.get(pk) or 0] for pk in stock_ids}
+        # Ids of ``watched`` snapshots that changed the quantity
+        self.changed = set()
+        for at, kind, pk, stock_id, value in events:
+            before = current.get(stock_id)
+            if kind == 1:
+                if pk in watched and (before or 0) != value:
+                    self.changed.add(pk)
+                current[stock_id] = value
+            elif before is not None:
+                # Movements before a row's first snapshot are not counted, as in annotate_as_of
+                current[stock_id] = before + value
+            else:
+                continue
+            self.times[stock_id].append(at)
+            self.quantities[stock_id].append(current[stock_id])
+
+    def quantity(self, pair, at):
+        total = 0
+        for pk in self.stocks.get(pair, ()):
+            total += self.quantities[pk][bisect_right(self.times[pk], at) - 1]
+        return total
+
+
+def _fold(movements, snapshots, now):
+    """Add ``movements`` to their rollup rows and refresh closing quantities."""
+    deltas = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    # Earliest change per (product, warehouse)
+    dirty = {}
+    for _, movement_type, quantity, reference, at, product_id, warehouse_id in movements:
+        if product_id is None or warehouse_id is None or at is None:
+            continue
+        counter, amount = classify(movement_type, quantity or 0, reference)
+        for bucket in BUCKETS:
+            deltas[(bucket, period_start(bucket, at), product_id, warehouse_id)][counter] += amount
+        dirty[(product_id, warehouse_id)] = min(dirty.get((product_id, warehouse_id), at), at)
+    watched = {}
+    for pk, at, product_id, warehouse_id in snapshots:
+        if product_id is None or warehouse_id is None:
+            continue
+        watched[pk] = (at, (product_id, warehouse_id))
+        dirty[(product_id, warehouse_id)] = min(dirty.get((product_id, warehouse_id), at), at)
+    if not dirty:
+        return
+
+    since = min(period_start('day', at) for at in dirty.values())
+    existing = {
+        (row.bucket, row.period_start, row.product_id, row.warehouse_id): row
+        for row in StockRollup.objects.filter(
+            product_id__in={p for p, _ in dirty}, warehouse_id__in={w for _, w in dirty}, period_start__gte=since,
+        )
+        if (row.product_id, row.warehouse_id) in dirty
+    }
+    # Later rows of a changed pair have stale closing quantities
+    targets = set(deltas) | {key for key in existing if key[1] >= period_start(key[0], dirty[key[2:]])}
+    ends = [next_period(bucket, start) for bucket, start, _, _ in targets]
+    ends += [next_period('day', period_start('day', at)) for at, _ in watched.values()]
+    # Replayed from just before ``since`` so a change at that very moment is seen
+    history = History(set(dirty), since - timedelta(microseconds=1), min(max(ends), now), watched)
+    for pk in history.changed:
+        at, pair = watched[pk]
+        targets.update((bucket, period_start(bucket, at)) + pair for bucket in BUCKETS)
+
+    created, updated = [], []
+    for key in targets:
+        bucket, start, product_id, warehouse_id = key
+        row = existing.get(key)
+        if row is None:
+            row = StockRollup(bucket=bucket, period_start=start, product_id=product_id, warehouse_id=warehouse_id)
+            created.append(row)
+        else:
+            updated.append(row)
+        for counter, amount in deltas.get(key, {}).items():
+            setattr(row, counter, getattr(row, counter) + amount)
+        at = min(next_period(bucket, start) - timedelta(microseconds=1), now)
+        row.closing_on_hand = history.quantity((product_id, warehouse_id), at)
+    StockRollup.objects.bulk_create(created, batch_size=ROLLUP_CHUNK_SIZE)
+    StockRollup.objects.bulk_update(updated, list(COUNTERS) + ['closing_on_hand'], batch_size=ROLLUP_CHUNK_SIZE)
+
+
+def roll_up(chunk_size=ROLLUP_CHUNK_SIZE, settle_seconds=ROLLUP_SETTLE_SECONDS):
+    """Fold every settled movement and snapshot past the watermarks; returns how many were read."""
+    for name in (MOVEMENTS, SNAPSHOTS):
+        RollupWatermark.objects.get_or_create(name=name)
+    processed = 0
+    while True:
+        now = timezone.now()
+        settled = now - timedelta(seconds=settle_seconds)
+        with transaction.atomic():
+            # Locks out a concurrent run until this chunk commits
+            marks = RollupWatermark.objects.select_for_update().in_bulk([MOVEMENTS, SNAPSHOTS])
+            movements = list(
+                StockMovement.objects.filter(pk__gt=marks[MOVEMENTS].last_id, timestamp__lte=settled)
+                .order_by('pk')
+                .values_list(
+                    'pk', 'movement_type', 'quantity', 'reference', 'timestamp',
+                    'stock__product_id', 'stock__location__warehouse_id',
+                )[:chunk_size]
+            )
+            snapshots = list(
+                StockSnapshot.objects.filter(pk__gt=marks[SNAPSHOTS].last_id, taken_at__lte=settled)
+                .order_by('pk')
+                .values_list('pk', 'taken_at', 'stock__product_id', 'stock__location__warehouse_id')[:chunk_size]
+            )
+            if not movements and not snapshots:
+                return processed
+            _fold(movements, snapshots, now)
+            for name, rows in ((MOVEMENTS, movements), (SNAPSHOTS, snapshots)):
+                if rows:
+                    marks[name].last_id = rows[-1][0]
+                    marks[name].save(update_fields=['last_id', 'updated_at'])
+        processed += len(movements) + len(snapshots)
+
+
+def periods(bucket, first_day, last_day, now=None):
+    """Starts of the ``bucket`` periods from ``first_day`` to ``last_day``, up to ``now``."""
+    now = now or timezone.now()
+    start = timezone.make_aware(datetime.combine(first_day, time.min))
+    end = timezone.make_aware(datetime.combine(last_day + timedelta(days=1), time.min))
+    starts = []
+    while start < end and start <= now:
+        starts.append(start)
+        start = next_period(bucket, start)
+    return starts
+
+
+def timeseries(bucket, starts, products=None, warehouses=None):
+    """Totals per period starting at ``starts``, over the selected products and warehouses.
+
+    A product and warehouse without a row in a period keeps the closing
+    quantity of its previous row, so ``closing_on_hand`` is a continuous
+    series. Costs three queries.
+    """
+    if not starts:
+        return []
+    selection = Q(bucket=bucket)
+    if products is not None:
+        selection &= Q(product_id__in=products)
+    if warehouses is not None:
+        selection &= Q(warehouse_id__in=warehouses)
+
+    # Opening quantity: each pair's last row before the first period
+    before = StockRollup.objects.filter(selection, period_start__lt=starts[0])
+    latest = dict(
+        ((product_id, warehouse_id), last)
+        for product_id, warehouse_id, last in before.order_by()
+        .values_list('product_id', 'warehouse_id')
+        .annotate(last=Max('period_start'))
+    )
+    closing = {}
+    for product_id, warehouse_id, start, quantity in before.filter(period_start__in=set(latest.values())).values_list(
+        'product_id', 'warehouse_id', 'period_start', 'closing_on_hand',
+    ):
+        if latest[(product_id, warehouse_id)] == start:
+            closing[(product_id, warehouse_id)] = quantity
+    on_hand = sum(closing.values())
+
+    end = next_period(bucket, starts[-1])
+    rows = defaultdict(list)
+    for row in StockRollup.objects.filter(selection, period_start__gte=starts[0], period_start__lt=end).values_list(
+        'period_start', 'product_id', 'warehouse_id', 'sold', 'received', 'adjusted', 'closing_on_hand',
+    ):
+        rows[row[0]].append(row[1:])
+
+    series = []
+    for start in starts:
+        entry = {'period': timezone.localtime(start).isoformat(), 'sold': 0, 'received': 0, 'adjusted': 0}
+        for product_id, warehouse_id, sold, received, adjusted, quantity in rows.get(start, ()):
+            entry['sold'] += sold
+            entry['received'] += received
+            entry['adjusted'] += adjusted
+            on_hand += quantity - closing.get((product_id, warehouse_id), 0)
+            closing[(product_id, warehouse_id)] = quantity
+        entry['closing_on_hand'] = on_hand
+        series.append(entry)
+    return series
@@ -1,10 +1,15 @@
 from rest_framework import serializers
-from .models import Stock, StockMovement, StockAdjustment
+from inventory_api.fieldsets import SparseFieldsetMixin
+from .models import Stock, StockMovement, StockAdjustment, ProductStockSummary, WarehouseStockSummary
 
-class StockSerializer(serializers.ModelSerializer):
+class StockSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Stock
         fields = '__all__'
+        expandable_fields = {
+            'product': 'products.serializers.ProductSerializer',
+            'location': 'warehouses.serializers.LocationSerializer',
+        }
 
     def validate_quantity(self, value):
         if value < 0:
@@ -19,10 +24,13 @@ class StockSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError('Stock for this product/location already exists.')
         return data
 
-class StockMovementSerializer(serializers.ModelSerializer):
+class StockMovementSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = StockMovement
         fields = '__all__'
+        expandable_fields = {
+            'stock': 'inventory.serializers.StockSerializer',
+        }
 
     def validate_quantity(self, value):
         if value <= 0:
@@ -35,10 +43,21 @@ class StockMovementSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('Invalid movement type.')
         return value
 
-class StockAdjustmentSerializer(serializers.ModelSerializer):
+    def validate(self, data):
+        # Posting needs all three; the model columns are nullable for history
+        for field in ('stock', 'movement_type', 'quantity'):
+            if data.get(field) is None:
+                raise serializers.ValidationError({field: 'This field is required.'})
+        return data
+
+class StockAdjustmentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = StockAdjustment
         fields = '__all__'
+        expandable_fields = {
+            'stock': 'inventory.serializers.StockSerializer',
+            'approved_by': 'users.serializers.EmployeeSerializer',
+        }
 
     def validate_quantity(self, value):
         if value <= 0:
@@ -58,3 +77,19 @@ class StockAdjustmentSerializer(serializers.ModelSerializer):
             if approved_by.role not in ['admin', 'manager']:
                 raise serializers.ValidationError('Only admin or manager can approve stock adjustments.')
         return data
+
+class WarehouseStockSummarySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    class Meta:
+        model = WarehouseStockSummary
+        fields = ['warehouse', 'on_hand', 'reserved', 'available', 'updated_at']
+        expandable_fields = {
+            'warehouse': 'warehouses.serializers.WarehouseSerializer',
+        }
+
+class ProductStockSummarySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    class Meta:
+        model = ProductStockSummary
+        fields = ['product', 'on_hand', 'reserved', 'available', 'updated_at']
+        expandable_fields = {
+            'product': 'products.serializers.ProductSerializer',
+        }
@@ -0,0 +1,63 @@
+from django.db.models import Sum
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .ledger import record_snapshots
+from .models import Stock, StockReservation
+from .summary import apply_reservation_deltas, apply_stock_deltas
+
+
+@receiver(pre_save, sender=Stock)
+def capture_previous_stock(sender, instance, raw=False, **kwargs):
+    instance._previous_stock = None
+    if raw or instance.pk is None:
+        return
+    instance._previous_stock = (
+        Stock.objects.select_for_update()
+        .filter(pk=instance.pk)
+        .values_list('product_id', 'location_id', 'quantity')
+        .first()
+    )
+
+
+@receiver(post_save, sender=Stock)
+def summarize_stock_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    deltas = {}
+    previous = getattr(instance, '_previous_stock', None)
+    if previous:
+        product_id, location_id, quantity = previous
+        deltas[(product_id, location_id)] = -(quantity or 0)
+    key = (instance.product_id, instance.location_id)
+    deltas[key] = deltas.get(key, 0) + (instance.quantity or 0)
+    apply_stock_deltas(deltas)
+
+
+@receiver(post_save, sender=Stock)
+def snapshot_stock_save(sender, instance, raw=False, **kwargs):
+    # Direct quantity writes bypass the movement ledger; checkpoint them
+    if raw:
+        return
+    previous = getattr(instance, '_previous_stock', None)
+    if previous is None or previous[2] != instance.quantity:
+        record_snapshots({instance.pk: instance.quantity})
+
+
+@receiver(pre_delete, sender=Stock)
+def capture_stock_reservations(sender, instance, **kwargs):
+    # The row's reservations go with it by cascade, so count them while they exist
+    instance._reserved = (
+        StockReservation.objects.filter(stock=instance, sales_order__status='open')
+        .aggregate(total=Sum('quantity'))['total'] or 0
+    )
+
+
+@receiver(post_delete, sender=Stock)
+def summarize_stock_delete(sender, instance, **kwargs):
+    key = (instance.product_id, instance.location_id)
+    reserved = getattr(instance, '_reserved', 0)
+    if reserved:
+        apply_reservation_deltas({key: -(instance.quantity or 0)}, {key: -reserved})
+    else:
+        apply_stock_deltas({key: -(instance.quantity or 0)})
@@ -0,0 +1,222 @@
+"""
+Maintenance of the ProductStockSummary / WarehouseStockSummary tables.
+
+Every code path that writes Stock reports what it changed here, inside the
+same transaction:
+
+* single-row saves and deletes go through the signals in inventory.signals;
+* set-based writes (allocation, bulk upsert) call ``apply_stock_deltas`` or
+  ``rebuild`` directly, because ``update()`` and ``bulk_create()`` do not
+  send signals.
+
+Incremental changes are applied with F() expressions so concurrent writers
+never overwrite each other's totals, with one ``CASE`` UPDATE per table for
+a whole batch of products.
+"""
+import operator
+from collections import defaultdict
+from functools import reduce
+
+from django.db.models import Case, F, IntegerField, Q, Sum, Value, When
+from django.utils import timezone
+
+from warehouses.models import Location
+from .models import ProductStockSummary, Stock, StockReservation, WarehouseStockSummary
+
+SUMMARY_CHUNK_SIZE = 500
+
+
+def _warehouses_for(location_ids):
+    location_ids = {pk for pk in location_ids if pk is not None}
+    if not location_ids:
+        return {}
+    return dict(Location.objects.filter(pk__in=location_ids).values_list('pk', 'warehouse_id'))
+
+
+def _ensure_rows(product_ids, warehouse_keys):
+    if product_ids:
+        ProductStockSummary.objects.bulk_create(
+            [ProductStockSummary(product_id=pk) for pk in sorted(product_ids)],
+            ignore_conflicts=True,
+        )
+    if warehouse_keys:
+        WarehouseStockSummary.objects.bulk_create(
+            [WarehouseStockSummary(product_id=p, warehouse_id=w) for p, w in sorted(warehouse_keys)],
+            ignore_conflicts=True,
+        )
+
+
+def _apply(available_deltas, reserved_deltas):
+    """Apply ``{(product_id, location_id): delta}`` maps to both tables."""
+    warehouses = _warehouses_for(
+        location_id for _, location_id in list(available_deltas) + list(reserved_deltas)
+    )
+    by_product = defaultdict(lambda: [0, 0])
+    by_warehouse = defaultdict(lambda: [0, 0])
+    for slot, deltas in ((0, available_deltas), (1, reserved_deltas)):
+        for (product_id, location_id), delta in deltas.items():
+            if product_id is None or not delta:
+                continue
+            by_product[product_id][slot] += delta
+            warehouse_id = warehouses.get(location_id)
+            if warehouse_id is not None:
+                by_warehouse[(product_id, warehouse_id)][slot] += delta
+
+    # Only rows gaining stock can be missing; a negative delta on a missing
+    # row means the product is being deleted along with its summary.
+    _ensure_rows(
+        {pk for pk, (a, r) in by_product.items() if a > 0 or r > 0},
+        {key for key, (a, r) in by_warehouse.items() if a > 0 or r > 0},
+    )
+    now = timezone.now()
+    _update(
+        ProductStockSummary,
+        [(pk, by_product[pk]) for pk in sorted(by_product) if any(by_product[pk])],
+        lambda product_ids: Q(product_id__in=product_ids),
+        now,
+    )
+    _update(
+        WarehouseStockSummary,
+        [(key, by_warehouse[key]) for key in sorted(by_warehouse) if any(by_warehouse[key])],
+        _match_warehouse_keys,
+        now,
+    )
+
+
+def _match_warehouse_keys(keys):
+    products = defaultdict(list)
+    for product_id, warehouse_id in keys:
+        products[warehouse_id].append(product_id)
+    return reduce(operator.or_, (Q(warehouse_id=w, product_id__in=p) for w, p in products.items()))
+
+
+def delta_case(deltas, match):
+    """A ``CASE`` giving each row its delta from ``{key: delta}``.
+
+    Keys are grouped by delta and ``match(keys)`` builds the condition for a
+    group, so the statement grows with the number of distinct deltas rather
+    than the number of rows.
+    """
+    groups = defaultdict(list)
+    for key, delta in deltas.items():
+        if delta:
+            groups[delta].append(key)
+    return Case(
+        *[When(match(keys), then=Value(delta)) for delta, keys in groups.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def _update(model, rows, match, now):
+    """Add ``[(key, (available, reserved))]`` to ``model`` rows, one UPDATE per chunk."""
+    for start in range(0, len(rows), SUMMARY_CHUNK_SIZE):
+        chunk = dict(rows[start:start + SUMMARY_CHUNK_SIZE])
+        available = {key: a for key, (a, r) in chunk.items()}
+        reserved = {key: r for key, (a, r) in chunk.items()}
+        on_hand = {key: a + r for key, (a, r) in chunk.items()}
+        model.objects.filter(match(list(chunk))).update(
+            available=F('available') + delta_case(available, match),
+            reserved=F('reserved') + delta_case(reserved, match),
+            on_hand=F('on_hand') + delta_case(on_hand, match),
+            updated_at=now,
+        )
+
+
+def apply_stock_deltas(deltas):
+    """Record Stock.quantity changes, ``{(product_id, location_id): delta}``."""
+    _apply(deltas, {})
+
+
+def apply_reservation_deltas(stock_deltas, reserved_deltas):
+    """Record an allocation or release in one pass over the summary rows."""
+    _apply(stock_deltas, reserved_deltas)
+
+
+def compute(product_ids):
+    """Recompute totals for ``product_ids`` from Stock and open reservations.
+
+    Returns ``(products, warehouses)`` mapping ``product_id`` and
+    ``(product_id, warehouse_id)`` to ``(on_hand, reserved, available)``.
+    """
+    available = defaultdict(int)
+    reserved = defaultdict(int)
+    stock_rows = (
+        Stock.objects.filter(product_id__in=product_ids)
+        .values_list('product_id', 'location__warehouse_id')
+        .annotate(total=Sum('quantity'))
+    )
+    for product_id, warehouse_id, total in stock_rows:
+        available[(product_id, warehouse_id)] += total or 0
+    reservation_rows = (
+        StockReservation.objects.filter(stock__product_id__in=product_ids, sales_order__status='open')
+        .values_list('stock__product_id', 'stock__location__warehouse_id')
+        .annotate(total=Sum('quantity'))
+    )
+    for product_id, warehouse_id, total in reservation_rows:
+        reserved[(product_id, warehouse_id)] += total or 0
+
+    products = {pk: [0, 0, 0] for pk in product_ids}
+    warehouses = {}
+    for key in set(available) | set(reserved):
+        product_id, warehouse_id = key
+        totals = (available[key] + reserved[key], reserved[key], available[key])
+        products[product_id] = [a + b for a, b in zip(products[product_id], totals)]
+        if warehouse_id is not None:
+            warehouses[key] = totals
+    return {pk: tuple(v) for pk, v in products.items()}, warehouses
+
+
+def rebuild(product_ids):
+    """Overwrite the summary rows of ``product_ids`` with recomputed totals."""
+    product_ids = [pk for pk in product_ids if pk is not None]
+    if not product_ids:
+        return
+    products, warehouses = compute(product_ids)
+    now = timezone.now()
+    ProductStockSummary.objects.bulk_create(
+        [
+            ProductStockSummary(product_id=pk, on_hand=o, reserved=r, available=a, updated_at=now)
+            for pk, (o, r, a) in products.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['product'],
+        update_fields=['on_hand', 'reserved', 'available', 'updated_at'],
+    )
+    stale = [
+        pk for pk, p, w in WarehouseStockSummary.objects.filter(product_id__in=product_ids)
+        .values_list('pk', 'product_id', 'warehouse_id') if (p, w) not in warehouses
+    ]
+    if stale:
+        WarehouseStockSummary.objects.filter(pk__in=stale).delete()
+    WarehouseStockSummary.objects.bulk_create(
+        [
+            WarehouseStockSummary(product_id=p, warehouse_id=w, on_hand=o, reserved=r, available=a, updated_at=now)
+            for (p, w), (o, r, a) in warehouses.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['product', 'warehouse'],
+        update_fields=['on_hand', 'reserved', 'available', 'updated_at'],
+    )
+
+
+def verify(product_ids):
+    """Return a list of ``(key, stored, expected)`` mismatches for ``product_ids``."""
+    products, warehouses = compute(product_ids)
+    mismatches = []
+    stored = {
+        pk: (o, r, a) for pk, o, r, a in ProductStockSummary.objects.filter(product_id__in=product_ids)
+        .values_list('product_id', 'on_hand', 'reserved', 'available')
+    }
+    for pk, expected in products.items():
+        if stored.get(pk, (0, 0, 0)) != expected:
+            mismatches.append((pk, stored.get(pk), expected))
+    stored = {
+        (p, w): (o, r, a) for p, w, o, r, a in WarehouseStockSummary.objects.filter(product_id__in=product_ids)
+        .values_list('product_id', 'warehouse_id', 'on_hand', 'reserved', 'available')
+    }
+    for key in set(stored) | set(warehouses):
+        expected = warehouses.get(key, (0, 0, 0))
+        if stored.get(key, (0, 0, 0)) != expected:
+            mismatches.append((key, stored.get(key), expected))
+    return mismatches
@@ -1,4 +1,4 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from rest_framework.test import APITestCase
 from django.urls import reverse
 from .models import Stock, StockMovement, StockAdjustment
@@ -6,6 +6,8 @@ from products.models import Product, Category
 from warehouses.models import Location, Warehouse
 from users.models import Employee
 from django.contrib.auth.models import User
+from inventory_api.testing import QueryBudgetMixin
+from inventory_api.metrics import registry
 
 class InventoryModelTest(TestCase):
     def setUp(self):
@@ -152,6 +154,34 @@ class StockAPITest(APITestCase):
         self.assertEqual(response.status_code, 400)
         self.assertIn('quantity', response.data)
 
+    def test_bulk_upsert_stock(self):
+        existing = Stock.objects.create(product=self.prod, location=self.loc, quantity=10)
+        loc2 = Location.objects.create(warehouse=self.wh, name="A2")
+        rows = [
+            {"product": self.prod.id, "location": self.loc.id, "quantity": 25},
+            {"product": self.prod.id, "location": loc2.id, "quantity": 4},
+            {"product": 9999, "location": loc2.id, "quantity": 1},
+            {"product": self.prod.id, "location": loc2.id, "quantity": -1},
+        ]
+        response = self.client.post(reverse('stock-bulk'), rows, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['upserted'], 2)
+        self.assertEqual([e['index'] for e in response.data['errors']], [2, 3])
+        self.assertIn('product', response.data['errors'][0]['errors'])
+        existing.refresh_from_db()
+        self.assertEqual(existing.quantity, 25)
+        self.assertEqual(Stock.objects.get(product=self.prod, location=loc2).quantity, 4)
+
+    def test_bulk_upsert_stock_ndjson(self):
+        body = '{"product": %d, "location": %d, "quantity": 7}\n\n' % (self.prod.id, self.loc.id)
+        response = self.client.post(reverse('stock-bulk'), body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Stock.objects.get(product=self.prod, location=self.loc).quantity, 7)
+
+    def test_bulk_upsert_stock_rejects_non_list(self):
+        response = self.client.post(reverse('stock-bulk'), {"product": self.prod.id}, format='json')
+        self.assertEqual(response.status_code, 400)
+
 class StockAdjustmentApprovalTest(APITestCase):
     def setUp(self):
         self.cat = Category.objects.create(name="Electronics")
@@ -264,3 +294,745 @@ class StockAdjustmentApprovalTest(APITestCase):
         response = self.client.post(self.url, data, format='json')
         self.assertEqual(response.status_code, 400)
         self.assertIn('adjustment_type', response.data)
+
+class StockAllocationTest(TestCase):
+    def setUp(self):
+        self.prod = Product.objects.create(name="Phone", sku="SKU1", barcode="BAR1", unit_price=100)
+        self.prod2 = Product.objects.create(name="Tablet", sku="SKU2", barcode="BAR2", unit_price=200)
+        self.wh = Warehouse.objects.create(name="Main", capacity=1000)
+        self.loc1 = Location.objects.create(warehouse=self.wh, name="A1")
+        self.loc2 = Location.objects.create(warehouse=self.wh, name="A2")
+        self.stock1 = Stock.objects.create(product=self.prod, location=self.loc1, quantity=3)
+        self.stock2 = Stock.objects.create(product=self.prod, location=self.loc2, quantity=5)
+        self.stock3 = Stock.objects.create(product=self.prod2, location=self.loc1, quantity=1)
+
+    def test_merge_lines_sums_duplicate_products(self):
+        from .allocation import merge_lines
+        lines = merge_lines([{"product": str(self.prod.id), "quantity": "2"}, {"product": self.prod.id, "quantity": 4}])
+        self.assertEqual(dict(lines), {self.prod.id: 6})
+
+    def test_allocate_takes_largest_bins_first(self):
+        from .allocation import allocate
+        plan = allocate({self.prod.id: 6})
+        self.assertEqual([(d.stock_id, d.quantity) for d in plan], [(self.stock2.id, 5), (self.stock1.id, 1)])
+        self.stock1.refresh_from_db()
+        self.stock2.refresh_from_db()
+        self.assertEqual((self.stock1.quantity, self.stock2.quantity), (2, 0))
+        self.assertEqual([(d.stock_id, d.quantity) for d in allocate({self.prod.id: 2})], [(self.stock1.id, 2)])
+
+    def test_allocate_prefers_one_warehouse_for_the_whole_order(self):
+        from .allocation import allocate
+        other = Warehouse.objects.create(name="Overflow", capacity=1000)
+        loc = Location.objects.create(warehouse=other, name="B1")
+        full = [Stock.objects.create(product=prod, location=loc, quantity=10) for prod in (self.prod, self.prod2)]
+        plan = allocate({self.prod.id: 2, self.prod2.id: 2})
+        self.assertEqual({d.stock_id for d in plan}, {stock.id for stock in full})
+        # Where either warehouse can fill the order, priority decides
+        other.allocation_priority = 1
+        other.save()
+        plan = allocate({self.prod.id: 2})
+        self.assertEqual([d.location_id for d in plan], [self.loc2.id])
+
+    def test_wave_plans_orders_in_turn_and_splits_only_when_needed(self):
+        from .optimizer import StockMatrix, plan_wave
+        other = Warehouse.objects.create(name="Overflow", capacity=1000)
+        Stock.objects.create(product=self.prod2, location=Location.objects.create(warehouse=other, name="B1"), quantity=4)
+        matrix = StockMatrix.load([self.prod.id, self.prod2.id])
+        plans, shortages = plan_wave({
+            'a': {self.prod.id: 8, self.prod2.id: 1},
+            'b': {self.prod2.id: 4},
+            'c': {self.prod.id: 1},
+            'd': {self.prod2.id: 1},
+        }, matrix)
+        self.assertEqual({d.location_id for d in plans['a']}, {self.loc1.id, self.loc2.id})
+        self.assertEqual([(d.location_id, d.quantity) for d in plans['b']], [(Location.objects.get(name="B1").id, 4)])
+        self.assertEqual(shortages, {'c': {self.prod.id: (1, 0)}, 'd': {self.prod2.id: (1, 0)}})
+        # Planning touches only the matrix
+        self.assertEqual(Stock.objects.get(pk=self.stock2.pk).quantity, 5)
+
+    def test_allocate_shortage_deducts_nothing(self):
+        from .allocation import allocate
+        from inventory_api.exceptions import InsufficientStockError
+        with self.assertRaises(InsufficientStockError) as ctx:
+            allocate({self.prod.id: 2, self.prod2.id: 5})
+        self.assertEqual(ctx.exception.shortages, {self.prod2.id: (5, 1)})
+        self.stock1.refresh_from_db()
+        self.assertEqual(self.stock1.quantity, 3)
+
+class StockSummaryTest(APITestCase):
+    def setUp(self):
+        from orders.models import SalesOrder
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        Employee.objects.create(user=self.user, name='Test User', role='manager')
+        self.client.force_authenticate(user=self.user)
+        self.prod = Product.objects.create(name="Phone", sku="SKU1", barcode="BAR1", unit_price=100)
+        self.wh1 = Warehouse.objects.create(name="Main", capacity=1000)
+        self.wh2 = Warehouse.objects.create(name="Overflow", capacity=1000)
+        self.loc1 = Location.objects.create(warehouse=self.wh1, name="A1")
+        self.loc2 = Location.objects.create(warehouse=self.wh2, name="B1")
+        self.stock1 = Stock.objects.create(product=self.prod, location=self.loc1, quantity=4)
+        self.stock2 = Stock.objects.create(product=self.prod, location=self.loc2, quantity=6)
+        from users.models import Customer
+        self.cust = Customer.objects.create(user=User.objects.create(username="cust1"), name="Cust1")
+        self.order = SalesOrder.objects.create(customer=self.cust, status='open')
+
+    def totals(self, warehouse=None):
+        from .models import ProductStockSummary, WarehouseStockSummary
+        if warehouse is None:
+            row = ProductStockSummary.objects.get(product=self.prod)
+        else:
+            row = WarehouseStockSummary.objects.get(product=self.prod, warehouse=warehouse)
+        return (row.on_hand, row.reserved, row.available)
+
+    def test_summary_follows_stock_writes(self):
+        self.assertEqual(self.totals(), (10, 0, 10))
+        self.stock1.quantity = 1
+        self.stock1.save()
+        self.assertEqual(self.totals(), (7, 0, 7))
+        self.assertEqual(self.totals(self.wh1), (1, 0, 1))
+        self.stock2.delete()
+        self.assertEqual(self.totals(), (1, 0, 1))
+        self.assertEqual(self.totals(self.wh2), (0, 0, 0))
+
+    def test_allocation_reserves_and_release(self):
+        from .allocation import allocate, release
+        from .summary import verify
+        allocate({self.prod.id: 5}, sales_order=self.order)
+        self.assertEqual(self.totals(), (10, 5, 5))
+        # Shipped whole from the warehouse that can fill it
+        self.assertEqual(self.totals(self.wh1), (4, 0, 4))
+        self.assertEqual(self.totals(self.wh2), (6, 5, 1))
+        self.assertEqual(verify([self.prod.id]), [])
+        self.order.status = 'shipped'
+        self.order.save()
+        release(self.order)
+        self.assertEqual(self.totals(), (5, 0, 5))
+        self.assertEqual(verify([self.prod.id]), [])
+
+    def test_shipping_order_via_api_releases_reservation(self):
+        from .allocation import allocate
+        allocate({self.prod.id: 3}, sales_order=self.order)
+        url = reverse('salesorder-detail', args=[self.order.id])
+        response = self.client.patch(url, {"customer": self.cust.id, "status": "shipped"}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.totals(), (7, 0, 7))
+
+    def test_cancelling_or_deleting_order_restocks(self):
+        from orders.models import SalesOrder
+        from .summary import verify
+        from .allocation import allocate
+        allocate({self.prod.id: 4}, sales_order=self.order)
+        self.assertEqual(self.totals(), (10, 4, 6))
+        url = reverse('salesorder-detail', args=[self.order.id])
+        response = self.client.patch(url, {"customer": self.cust.id, "status": "cancelled"}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.totals(), (10, 0, 10))
+        self.assertEqual(sum(Stock.objects.filter(product=self.prod).values_list('quantity', flat=True)), 10)
+        self.assertEqual(
+            list(StockMovement.objects.filter(reference=f'SO-{self.order.id}').values_list('movement_type', 'quantity')),
+            [('OUT', 4), ('IN', 4)],
+        )
+        other = SalesOrder.objects.create(customer=self.cust, status='open')
+        allocate({self.prod.id: 7}, sales_order=other)
+        self.assertEqual(self.client.delete(reverse('salesorder-detail', args=[other.id])).status_code, 204)
+        self.assertEqual(self.totals(), (10, 0, 10))
+        self.assertEqual(verify([self.prod.id]), [])
+
+    def test_reopened_order_reserves_again_before_shipping(self):
+        response = self.client.post(reverse('salesorder-list'), {
+            "customer": self.cust.id, "status": "open", "items": [{"product": self.prod.id, "quantity": 2}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        url = reverse('salesorder-detail', args=[response.data['id']])
+        self.assertEqual(self.totals(), (10, 2, 8))
+        self.client.patch(url, {"customer": self.cust.id, "status": "cancelled"}, format='json')
+        self.assertEqual(self.totals(), (10, 0, 10))
+        self.assertEqual(self.client.patch(url, {"customer": self.cust.id, "status": "open"}, format='json').status_code, 200)
+        self.assertEqual(self.totals(), (10, 2, 8))
+        self.assertEqual(sum(Stock.objects.filter(product=self.prod).values_list('quantity', flat=True)), 8)
+        self.client.patch(url, {"customer": self.cust.id, "status": "shipped"}, format='json')
+        self.assertEqual(self.totals(), (8, 0, 8))
+        self.assertEqual(sum(Stock.objects.filter(product=self.prod).values_list('quantity', flat=True)), 8)
+        self.assertEqual(self.client.patch(url, {"customer": self.cust.id, "status": "open"}, format='json').status_code, 409)
+
+    def test_reopening_without_stock_is_rejected(self):
+        from .allocation import allocate
+        response = self.client.post(reverse('salesorder-list'), {
+            "customer": self.cust.id, "status": "open", "items": [{"product": self.prod.id, "quantity": 6}],
+        }, format='json')
+        url = reverse('salesorder-detail', args=[response.data['id']])
+        self.client.patch(url, {"customer": self.cust.id, "status": "cancelled"}, format='json')
+        allocate({self.prod.id: 5}, sales_order=self.order)
+        response = self.client.patch(url, {"customer": self.cust.id, "status": "open"}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(url).data['status'], 'cancelled')
+        self.assertEqual(self.totals(), (10, 5, 5))
+
+    def test_deleting_stock_drops_its_reservations_from_summary(self):
+        from .allocation import allocate
+        from .models import StockReservation
+        from .summary import verify
+        allocate({self.prod.id: 5}, sales_order=self.order)
+        self.assertEqual(self.totals(), (10, 5, 5))
+        reservation = StockReservation.objects.get()
+        self.assertEqual(reservation.quantity, 5)
+        reservation.stock.delete()
+        self.assertEqual(self.totals(), (4, 0, 4))
+        self.assertEqual(verify([self.prod.id]), [])
+
+    def test_bulk_upsert_rebuilds_summary(self):
+        from .bulk import bulk_upsert_stock
+        bulk_upsert_stock([{"product": self.prod.id, "location": self.loc1.id, "quantity": 20}])
+        self.assertEqual(self.totals(), (26, 0, 26))
+        self.assertEqual(self.totals(self.wh1), (20, 0, 20))
+
+    def test_summary_endpoint(self):
+        response = self.client.get(reverse('stocksummary-detail', args=[self.prod.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['available'], 10)
+        self.assertEqual([w['available'] for w in response.data['warehouses']], [4, 6])
+        response = self.client.get(reverse('stocksummary-list'), {'product': str(self.prod.id)})
+        self.assertEqual(len(response.data['results']), 1)
+
+class StockMovementPostingTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        Employee.objects.create(user=self.user, name='Test User', role='manager')
+        self.client.force_authenticate(user=self.user)
+        self.prod = Product.objects.create(name="Phone", sku="SKU1", barcode="BAR1", unit_price=100)
+        self.wh = Warehouse.objects.create(name="Main", capacity=1000)
+        self.loc1 = Location.objects.create(warehouse=self.wh, name="A1")
+        self.loc2 = Location.objects.create(warehouse=self.wh, name="A2")
+        self.stock1 = Stock.objects.create(product=self.prod, location=self.loc1, quantity=10)
+        self.stock2 = Stock.objects.create(product=self.prod, location=self.loc2, quantity=0)
+        self.url = reverse('stockmovement-list')
+
+    def test_movement_updates_stock(self):
+        response = self.client.post(self.url, {"stock": self.stock1.id, "movement_type": "OUT", "quantity": 4}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.stock1.refresh_from_db()
+        self.assertEqual(self.stock1.quantity, 6)
+        self.assertEqual(StockMovement.objects.count(), 1)
+
+    def test_batch_is_coalesced_per_stock(self):
+        from .posting import post_movements
+        movements = [StockMovement(stock=self.stock1, movement_type="IN", quantity=1) for _ in range(50)]
+        movements += [StockMovement(stock=self.stock2, movement_type="IN", quantity=3),
+                      StockMovement(stock=self.stock1, movement_type="OUT", quantity=5)]
+        # savepoint, lock read, one UPDATE for both increments, one ledger
+        # insert, summary upkeep (location lookup, two inserts, two updates), release
+        with self.assertNumQueries(10):
+            post_movements(movements)
+        self.stock1.refresh_from_db()
+        self.stock2.refresh_from_db()
+        self.assertEqual((self.stock1.quantity, self.stock2.quantity), (55, 3))
+        self.assertEqual(StockMovement.objects.count(), 52)
+
+    def test_batch_api_rejects_overdraw_atomically(self):
+        rows = [
+            {"stock": self.stock1.id, "movement_type": "IN", "quantity": 2},
+            {"stock": self.stock2.id, "movement_type": "OUT", "quantity": 1},
+        ]
+        response = self.client.post(self.url, rows, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("stock %d" % self.stock2.id, response.data['errors'][0])
+        self.stock1.refresh_from_db()
+        self.assertEqual(self.stock1.quantity, 10)
+        self.assertFalse(StockMovement.objects.exists())
+
+    def test_invalid_movement_type(self):
+        response = self.client.post(self.url, {"stock": self.stock1.id, "movement_type": "LOST", "quantity": 1}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('movement_type', response.data)
+
+    def test_movements_cannot_be_edited(self):
+        response = self.client.post(self.url, {"stock": self.stock1.id, "movement_type": "IN", "quantity": 1}, format='json')
+        url = reverse('stockmovement-detail', args=[response.data['id']])
+        self.assertEqual(self.client.delete(url).status_code, 405)
+
+class StockAsOfTest(APITestCase):
+    def setUp(self):
+        from datetime import datetime, timezone as dt_timezone
+        from .models import StockSnapshot
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        Employee.objects.create(user=self.user, name='Test User', role='employee')
+        self.client.force_authenticate(user=self.user)
+        self.prod = Product.objects.create(name="Phone", sku="SKU1", barcode="BAR1", unit_price=100)
+        self.wh = Warehouse.objects.create(name="Main", capacity=1000)
+        self.loc = Location.objects.create(warehouse=self.wh, name="A1")
+        self.stock = Stock.objects.create(product=self.prod, location=self.loc, quantity=10)
+
+        def day(d):
+            return datetime(2025, 1, d, 12, tzinfo=dt_timezone.utc)
+        StockSnapshot.objects.filter(stock=self.stock).update(taken_at=day(1))
+        StockMovement.objects.create(stock=self.stock, movement_type="IN", quantity=5)
+        StockMovement.objects.filter(movement_type="IN").update(timestamp=day(2))
+        StockSnapshot.objects.create(stock=self.stock, taken_at=day(3), quantity=15)
+        StockMovement.objects.create(stock=self.stock, movement_type="OUT", quantity=2)
+        StockMovement.objects.filter(movement_type="OUT").update(timestamp=day(4))
+        self.url = reverse('stock-as-of')
+
+    def quantity_at(self, at, **params):
+        response = self.client.get(self.url, {'at': at, **params})
+        self.assertEqual(response.status_code, 200)
+        return [row['quantity'] for row in response.data['results']]
+
+    def test_as_of_combines_snapshot_and_movements(self):
+        self.assertEqual(self.quantity_at('2024-12-31'), [])
+        self.assertEqual(self.quantity_at('2025-01-01'), [10])
+        self.assertEqual(self.quantity_at('2025-01-02'), [15])
+        self.assertEqual(self.quantity_at('2025-01-03T13:00:00Z'), [15])
+        self.assertEqual(self.quantity_at('2025-01-05'), [13])
+
+    def test_as_of_filters(self):
+        self.assertEqual(self.quantity_at('2025-01-05', warehouse=str(self.wh.id)), [13])
+        self.assertEqual(self.quantity_at('2025-01-05', product='9999'), [])
+
+    def test_as_of_requires_valid_at(self):
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'at': 'yesterday'}).status_code, 400)
+
+    def test_take_snapshots_builds_from_ledger(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .ledger import take_snapshots
+        from .models import StockSnapshot
+        # Stock.quantity still says 10; a movement landing mid-run must not count twice
+        self.assertEqual(take_snapshots(settle_seconds=60), 1)
+        snapshot = StockSnapshot.objects.filter(stock=self.stock).latest('taken_at')
+        self.assertEqual(snapshot.quantity, 13)
+        self.assertLess(snapshot.taken_at, timezone.now() - timedelta(seconds=59))
+        StockMovement.objects.create(stock=self.stock, movement_type="IN", quantity=4)
+        self.assertEqual(self.quantity_at(timezone.now().isoformat()), [17])
+
+    def test_direct_quantity_write_records_snapshot(self):
+        from .models import StockSnapshot
+        self.stock.quantity = 40
+        self.stock.save()
+        self.assertEqual(StockSnapshot.objects.filter(stock=self.stock).latest('taken_at').quantity, 40)
+
+class KeysetPaginationTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        Employee.objects.create(user=self.user, name='Test User', role='employee')
+        self.client.force_authenticate(user=self.user)
+        prod = Product.objects.create(name="Phone", sku="SKU1", barcode="BAR1", unit_price=100)
+        wh = Warehouse.objects.create(name="Main", capacity=1000)
+        loc = Location.objects.create(warehouse=wh, name="A1")
+        stock = Stock.objects.create(product=prod, location=loc, quantity=0)
+        StockMovement.objects.bulk_create(StockMovement(stock=stock, movement_type="IN", quantity=1) for _ in range(25))
+        self.url = reverse('stockmovement-list')
+
+    def test_walks_all_rows_by_cursor_without_count(self):
+        seen = []
+        url = self.url + '?pagination=keyset&page_size=10'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            seen += [row['id'] for row in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, sorted(StockMovement.objects.values_list('id', flat=True)))
+
+    def test_estimated_count(self):
+        response = self.client.get(self.url, {'pagination': 'keyset', 'count': 'estimate'})
+        self.assertEqual(response.data['estimated_count'], 25)
+
+    def test_page_size_is_capped(self):
+        from inventory_api.pagination import KeysetPagination
+        KeysetPagination.max_page_size, original = 5, KeysetPagination.max_page_size
+        try:
+            response = self.client.get(self.url, {'pagination': 'keyset', 'page_size': 100})
+        finally:
+            KeysetPagination.max_page_size = original
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_keys_on_primary_key_not_named_id(self):
+        from .models import ProductStockSummary
+        location = Location.objects.get()
+        for n in range(2, 5):
+            Stock.objects.create(product=Product.objects.create(name=f"P{n}", sku=f"SKU{n}", unit_price=1),
+                                 location=location, quantity=n)
+        seen = []
+        url = reverse('stocksummary-list') + '?pagination=keyset&page_size=1'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [row['product'] for row in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(len(seen), 3)
+        self.assertEqual(seen, sorted(ProductStockSummary.objects.values_list('product_id', flat=True)))
+
+    def test_page_numbers_remain_default(self):
+        response = self.client.get(self.url, {'page': 3})
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_page_number_mode_is_not_capped(self):
+        from inventory_api.pagination import KeysetPagination
+        stock = Stock.objects.get()
+        StockMovement.objects.bulk_create(
+            StockMovement(stock=stock, movement_type="IN", quantity=1) for _ in range(KeysetPagination.max_page_size)
+        )
+        response = self.client.get(self.url, {'page_size': KeysetPagination.max_page_size + 25})
+        self.assertEqual(len(response.data['results']), KeysetPagination.max_page_size + 25)
+
+class DashboardSummaryTest(APITestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from orders.models import PurchaseOrder
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        Employee.objects.create(user=self.user, name='Test User', role='employee')
+        self.client.force_authenticate(user=self.user)
+        wh = Warehouse.objects.create(name="Main", capacity=1000)
+        loc = Location.objects.create(warehouse=wh, name="A1")
+        self.phone = Product.objects.create(name="Phone", sku="SKU1", barcode="BAR1", unit_price=100)
+        self.tablet = Product.objects.create(name="Tablet", sku="SKU2", barcode="BAR2", unit_price=300)
+        Stock.objects.create(product=self.phone, location=loc, quantity=7)
+        Stock.objects.create(product=self.tablet, location=loc, quantity=2)
+        PurchaseOrder.objects.create(status='open')
+        PurchaseOrder.objects.create(status='open')
+        PurchaseOrder.objects.create(status='received')
+        self.url = reverse('dashboard-summary')
+
+    def test_summary(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['counts']['products'], 2)
+        self.assertEqual(response.data['counts']['stock'], 2)
+        self.assertEqual([row['name'] for row in response.data['top_products_by_price']], ['Tablet', 'Phone'])
+        self.assertEqual(
+            [(row['product'], row['available']) for row in response.data['stock_by_product']],
+            [(self.phone.id, 7), (self.tablet.id, 2)],
+        )
+
+    def test_counts_follow_list_permissions(self):
+        response = self.client.get(self.url)
+        self.assertEqual(set(response.data['counts']), {'products', 'stock', 'sales_orders'})
+        self.assertNotIn('purchase_orders_by_status', response.data)
+        Employee.objects.filter(user=self.user).update(role='manager')
+        self.client.force_authenticate(user=User.objects.get(pk=self.user.pk))
+        response = self.client.get(self.url)
+        self.assertNotIn('employees', response.data['counts'])
+        self.assertEqual(response.data['counts']['warehouses'], 1)
+        self.assertEqual(response.data['purchase_orders_by_status'], {'open': 2, 'received': 1})
+        Employee.objects.filter(user=self.user).update(role='admin')
+        self.client.force_authenticate(user=User.objects.get(pk=self.user.pk))
+        self.assertEqual(self.client.get(self.url).data['counts']['employees'], 1)
+
+    def test_summary_is_cached(self):
+        self.client.get(self.url)
+        Product.objects.create(name="Watch", sku="SKU3", barcode="BAR3", unit_price=50)
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['counts']['products'], 2)
+
+    def test_requires_role(self):
+        self.client.force_authenticate(user=User.objects.create_user(username='norole', password='x'))
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 403)
+
+class InventoryQueryBudgetTest(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        Employee.objects.create(user=self.user, name='Test User', role='employee')
+        self.client.force_authenticate(user=self.user)
+        wh = Warehouse.objects.create(name="Main", capacity=1000)
+        loc = Location.objects.create(warehouse=wh, name="A1")
+        for i in range(25):
+            prod = Product.objects.create(name=f"P{i}", sku=f"SKU{i}", barcode=f"BAR{i}", unit_price=10)
+            stock = Stock.objects.create(product=prod, location=loc, quantity=5)
+            StockMovement.objects.create(stock=stock, movement_type="IN", quantity=5)
+
+    def test_list_stock(self):
+        self.assertListQueryBudget(reverse('stock-list'), 2)
+
+    def test_list_stock_movements(self):
+        self.assertListQueryBudget(reverse('stockmovement-list'), 2)
+
+    def test_list_stock_summaries(self):
+        self.assertListQueryBudget(reverse('stocksummary-list'), 2)
+
+
+class BatchRequestTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.employee = Employee.objects.create(user=self.user, name='Test User', role='manager')
+        token = self.client.post(reverse('token_obtain_pair'), {'username': 'testuser', 'password': 'testpass'}).data['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.url = reverse('batch')
+        wh = Warehouse.objects.create(name="Main", capacity=1000)
+        self.loc = Location.objects.create(warehouse=wh, name="A1")
+        self.phone = Product.objects.create(name="Phone", sku="SKU1", barcode="BAR1", unit_price=100)
+
+    def batch(self, requests, **options):
+        return self.client.post(self.url, {'requests': requests, **options}, format='json')
+
+    def test_dispatches_in_order(self):
+        response = self.batch([
+            {'method': 'GET', 'path': f'/api/products/{self.phone.id}/?fields=id,sku'},
+            {'method': 'POST', 'path': '/api/stock/', 'body': {'product': self.phone.id, 'location': self.loc.id, 'quantity': 5}},
+            {'method': 'GET', 'path': f'/api/stock-summary/{self.phone.id}/'},
+            {'method': 'GET', 'path': '/api/nowhere/'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        statuses = [sub['status'] for sub in response.data['responses']]
+        self.assertEqual(statuses, [200, 201, 200, 404])
+        self.assertEqual(response.data['responses'][0]['body'], {'id': self.phone.id, 'sku': 'SKU1'})
+        self.assertEqual(response.data['responses'][2]['body']['available'], 5)
+
+    def test_sub_requests_keep_their_permissions(self):
+        self.employee.role = 'employee'
+        self.employee.save()
+        self.client.force_authenticate(user=User.objects.get(pk=self.user.pk))
+        response = self.batch([
+            {'method': 'GET', 'path': '/api/products/'},
+            {'method': 'DELETE', 'path': f'/api/products/{self.phone.id}/'},
+        ])
+        self.assertEqual([sub['status'] for sub in response.data['responses']], [200, 403])
+        self.assertTrue(Product.objects.filter(pk=self.phone.id).exists())
+
+    def test_atomic_rolls_back_on_failure(self):
+        response = self.batch([
+            {'method': 'POST', 'path': '/api/stock/', 'body': {'product': self.phone.id, 'location': self.loc.id, 'quantity': 5}},
+            {'method': 'POST', 'path': '/api/stock/', 'body': {'product': self.phone.id, 'location': self.loc.id, 'quantity': 5}},
+            {'method': 'GET', 'path': '/api/products/'},
+        ], atomic=True)
+        self.assertFalse(response.data['committed'])
+        self.assertEqual([sub['status'] for sub in response.data['responses']], [201, 400])
+        self.assertFalse(Stock.objects.exists())
+
+    def test_one_authentication_per_batch(self):
+        requests = [{'method': 'GET', 'path': f'/api/products/{self.phone.id}/'} for _ in range(10)]
+        self.batch(requests)
+        # Cached reads after the first: the batch costs no queries at all
+        with self.assertNumQueries(0):
+            response = self.batch(requests)
+        self.assertEqual({sub['status'] for sub in response.data['responses']}, {200})
+
+    def test_refuses_streaming_routes(self):
+        response = self.batch([
+            {'method': 'GET', 'path': '/api/products/export/?format=ndjson', 'headers': {'Accept': '*/*'}},
+            {'method': 'GET', 'path': '/api/products/'},
+        ])
+        self.assertEqual([sub['status'] for sub in response.data['responses']], [400, 200])
+        self.assertIn('Streaming', response.data['responses'][0]['body']['detail'])
+
+    def test_sub_requests_are_recorded_in_metrics(self):
+        registry.reset()
+        self.batch([
+            {'method': 'GET', 'path': f'/api/products/{self.phone.id}/'},
+            {'method': 'GET', 'path': f'/api/products/{self.phone.id}/'},
+            {'method': 'GET', 'path': '/api/nowhere/'},
+        ])
+        body = registry.render()
+        self.assertIn('http_requests_total{route="batch",method="POST",status="200"} 1', body)
+        self.assertIn('http_requests_total{route="product-detail",method="GET",status="200"} 2', body)
+        self.assertIn('http_requests_total{route="unmatched",method="GET",status="404"} 1', body)
+        self.assertIn('http_response_size_bytes_count{route="product-detail",method="GET"} 2', body)
+
+    def test_rejects_malformed_batches(self):
+        self.assertEqual(self.batch([]).status_code, 400)
+        self.assertEqual(self.batch([{'method': 'GET', 'path': '/admin/'}]).status_code, 400)
+        self.assertEqual(self.batch([{'method': 'TRACE', 'path': '/api/products/'}]).status_code, 400)
+        self.assertEqual(self.batch([{'path': '/api/products/'}] * 51).status_code, 400)
+        nested = self.batch([{'method': 'POST', 'path': '/api/batch/', 'body': []}])
+        self.assertEqual(nested.data['responses'][0]['status'], 400)
+
+
+class RequestMetricsTest(APITestCase):
+    def setUp(self):
+        registry.reset()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        Employee.objects.create(user=self.user, name='Test User', role='manager')
+        token = self.client.post(reverse('token_obtain_pair'), {'username': 'testuser', 'password': 'testpass'}).data['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def scrape(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return response.content.decode()
+
+    def test_records_route_method_and_status(self):
+        self.client.get(reverse('stock-list'))
+        self.client.get(reverse('stock-list'))
+        self.client.get('/api/nowhere/')
+        body = self.scrape()
+        self.assertIn('http_requests_total{route="token_obtain_pair",method="POST",status="200"} 1', body)
+        self.assertIn('http_requests_total{route="stock-list",method="GET",status="200"} 2', body)
+        self.assertIn('http_requests_total{route="unmatched",method="GET",status="404"} 1', body)
+        self.assertIn('http_request_duration_seconds_count{route="stock-list",method="GET"} 2', body)
+        self.assertIn('http_request_duration_seconds_bucket{route="stock-list",method="GET",le="+Inf"} 2', body)
+        self.assertIn('http_request_db_seconds_total{route="stock-list",method="GET"}', body)
+        self.assertIn('http_response_size_bytes_count{route="stock-list",method="GET"} 2', body)
+
+    def test_counts_queries(self):
+        Stock.objects.create(product=Product.objects.create(name="Phone", sku="SKU1", unit_price=100),
+                             location=Location.objects.create(warehouse=Warehouse.objects.create(name="Main", capacity=10), name="A1"),
+                             quantity=1)
+        self.client.get(reverse('stock-list'))
+        body = self.scrape()
+        # The employee rides in the token, so each list is its count and page queries
+        self.assertIn('http_request_db_queries_sum{route="stock-list",method="GET"} 2', body)
+        self.assertIn('http_request_db_queries_bucket{route="stock-list",method="GET",le="1"} 0', body)
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.1'])
+    def test_scrape_restricted_by_address(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+
+class AvailabilityTest(APITestCase):
+    def setUp(self):
+        from datetime import datetime, timezone as dt_timezone
+        from django.core.cache import cache
+        from orders.models import PurchaseOrder, PurchaseOrderItem
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        Employee.objects.create(user=self.user, name='Test User', role='employee')
+        self.client.force_authenticate(user=self.user)
+        self.prod = Product.objects.create(name="Phone", sku="SKU1", barcode="BAR1", unit_price=100)
+        self.prod2 = Product.objects.create(name="Tablet", sku="SKU2", barcode="BAR2", unit_price=200)
+        loc = Location.objects.create(warehouse=Warehouse.objects.create(name="Main", capacity=1000), name="A1")
+        Stock.objects.create(product=self.prod, location=loc, quantity=7)
+        june = datetime(2026, 6, 1, 9, tzinfo=dt_timezone.utc)
+        july = datetime(2026, 7, 1, 9, tzinfo=dt_timezone.utc)
+        for expected, status_, quantity, received in (
+            (july, 'open', 10, 4), (june, 'open', 5, 0), (june, 'open', 2, 0),
+            (None, 'open', 3, 0), (june, 'cancelled', 50, 0), (june, 'open', 8, 8),
+        ):
+            po = PurchaseOrder.objects.create(status=status_, expected_date=expected)
+            PurchaseOrderItem.objects.create(purchase_order=po, product=self.prod, quantity=quantity, received_quantity=received)
+
+    def test_on_hand_and_inbound_by_date(self):
+        from .availability import availability
+        with self.assertNumQueries(3):
+            first, second = availability([self.prod.id, self.prod2.id])
+        self.assertEqual((first['on_hand'], first['reserved'], first['available']), (7, 0, 7))
+        self.assertEqual(
+            [(row['date'], row['quantity']) for row in first['inbound']],
+            [('2026-06-01', 7), ('2026-07-01', 6), (None, 3)],
+        )
+        self.assertEqual(first['inbound_total'], 16)
+        self.assertEqual((second['on_hand'], second['inbound']), (0, []))
+        # The same page again is one cache read
+        with self.assertNumQueries(0):
+            availability([self.prod.id, self.prod2.id])
+
+    def test_endpoint_accepts_query_and_body(self):
+        response = self.client.get(reverse('availability'), {'product': f'{self.prod2.id},{self.prod.id}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual([row['product'] for row in response.json()['results']], [self.prod2.id, self.prod.id])
+        response = self.client.post(reverse('availability'), {'products': [self.prod.id]}, format='json')
+        self.assertEqual(response.json()['results'][0]['inbound'][0]['quantity'], 7)
+        self.assertEqual(self.client.get(reverse('availability')).status_code, 400)
+        self.assertEqual(self.client.post(reverse('availability'), {'products': 'x'}, format='json').status_code, 400)
+
+class StockRollupTest(APITestCase):
+    def setUp(self):
+        from datetime import datetime, timezone as dt_timezone
+        from .models import StockSnapshot
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        Employee.objects.create(user=self.user, name='Test User', role='employee')
+        self.client.force_authenticate(user=self.user)
+        self.prod = Product.objects.create(name="Phone", sku="SKU1", barcode="BAR1", unit_price=100)
+        self.wh = Warehouse.objects.create(name="Main", capacity=1000)
+        self.stock = Stock.objects.create(product=self.prod, location=Location.objects.create(warehouse=self.wh, name="A1"), quantity=10)
+        self.at = lambda day, hour, minute=0: datetime(2025, 1, day, hour, minute, tzinfo=dt_timezone.utc)
+        StockSnapshot.objects.filter(stock=self.stock).update(taken_at=self.at(1, 10))
+        for when, kind, quantity, reference in (
+            (self.at(2, 9, 15), 'IN', 5, 'PO-1'), (self.at(2, 9, 40), 'OUT', 3, 'SO-1'), (self.at(2, 14), 'OUT', 1, None),
+        ):
+            self.move(when, kind, quantity, reference)
+
+    def move(self, when, kind, quantity, reference):
+        movement = StockMovement.objects.create(stock=self.stock, movement_type=kind, quantity=quantity, reference=reference)
+        StockMovement.objects.filter(pk=movement.pk).update(timestamp=when)
+
+    def rows(self, bucket):
+        from .models import StockRollup
+        return list(
+            StockRollup.objects.filter(bucket=bucket).order_by('period_start')
+            .values_list('period_start', 'sold', 'received', 'adjusted', 'closing_on_hand')
+        )
+
+    def test_rollups_are_incremental(self):
+        from .rollups import roll_up
+        # Three movements and the stock's first snapshot
+        self.assertEqual(roll_up(settle_seconds=0), 4)
+        self.assertEqual(self.rows('hour'), [
+            (self.at(1, 10), 0, 0, 0, 10), (self.at(2, 9), 3, 5, 0, 12), (self.at(2, 14), 0, 0, -1, 11),
+        ])
+        self.assertEqual(self.rows('day'), [(self.at(1, 0), 0, 0, 0, 10), (self.at(2, 0), 3, 5, -1, 11)])
+
+        self.move(self.at(2, 15), 'OUT', 2, 'SO-2')
+        self.move(self.at(4, 10), 'IN', 2, None)
+        self.assertEqual(roll_up(settle_seconds=0), 2)
+        self.assertEqual(roll_up(settle_seconds=0), 0)
+        self.assertEqual(self.rows('day')[1:], [(self.at(2, 0), 5, 5, -1, 9), (self.at(4, 0), 0, 0, 2, 11)])
+        self.assertEqual(len(self.rows('hour')), 5)
+
+    def test_late_movements_and_direct_writes_update_closing(self):
+        from .rollups import roll_up
+        self.move(self.at(4, 10), 'IN', 2, None)
+        roll_up(settle_seconds=0)
+        # Folded after the day 4 row exists
+        self.move(self.at(2, 12), 'IN', 1, None)
+        self.move(self.at(2, 16), 'IN', 4, 'SO-1')
+        self.assertEqual(roll_up(settle_seconds=0), 2)
+        self.assertEqual(self.rows('day')[1:], [(self.at(2, 0), -1, 5, 0, 16), (self.at(4, 0), 0, 0, 2, 18)])
+        self.assertEqual(dict((row[0], row[4]) for row in self.rows('hour'))[self.at(2, 14)], 12)
+
+        self.stock.quantity = 30
+        self.stock.save()
+        self.assertEqual(roll_up(settle_seconds=0), 1)
+        latest = self.rows('day')[-1]
+        self.assertGreater(latest[0], self.at(4, 0))
+        self.assertEqual(latest[1:], (0, 0, 0, 30))
+        # A checkpoint that agrees with the ledger adds no row
+        from .ledger import take_snapshots
+        take_snapshots(settle_seconds=0)
+        self.assertEqual(roll_up(settle_seconds=0), 1)
+        self.assertEqual(len(self.rows('day')), 4)
+
+    def test_chunk_queries_do_not_grow_with_periods(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .rollups import roll_up
+        roll_up(settle_seconds=0)
+        counts = []
+        for day, hours in ((5, 3), (6, 24)):
+            for hour in range(hours):
+                self.move(self.at(day, hour), 'IN', 1, None)
+            with CaptureQueriesContext(connection) as context:
+                self.assertEqual(roll_up(settle_seconds=0), hours)
+            counts.append(len(context.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_recent_movements_wait_to_settle(self):
+        from .rollups import roll_up
+        StockMovement.objects.create(stock=self.stock, movement_type='IN', quantity=1)
+        self.assertEqual(roll_up(settle_seconds=60), 4)
+        self.assertEqual(roll_up(settle_seconds=60), 0)
+
+    def test_timeseries_endpoint(self):
+        from datetime import date
+        from .rollups import periods, roll_up, timeseries
+        self.move(self.at(4, 10), 'IN', 2, None)
+        roll_up(settle_seconds=0)
+        response = self.client.get(reverse('reports-timeseries'), {'start': '2025-01-01', 'end': '2025-01-05'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(row['period'][:10], row['sold'], row['received'], row['adjusted'], row['closing_on_hand']) for row in response.data['results']],
+            [('2025-01-01', 0, 0, 0, 10), ('2025-01-02', 3, 5, -1, 11), ('2025-01-03', 0, 0, 0, 11),
+             ('2025-01-04', 0, 0, 2, 13), ('2025-01-05', 0, 0, 0, 13)],
+        )
+        # The opening quantity carries in from before the range
+        with self.assertNumQueries(3):
+            series = timeseries('hour', periods('hour', date(2025, 1, 3), date(2025, 1, 3)), products=[self.prod.id])
+        self.assertEqual({row['closing_on_hand'] for row in series}, {11})
+        response = self.client.get(reverse('reports-timeseries'), {'start': '2025-01-02', 'end': '2025-01-02', 'product': '9999'})
+        self.assertEqual({row['closing_on_hand'] for row in response.data['results']}, {0})
+        self.assertEqual(self.client.get(reverse('reports-timeseries'), {'bucket': 'week'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('reports-timeseries'), {'bucket': 'hour', 'start': '2025-01-01', 'end': '2025-03-01'}).status_code, 400)
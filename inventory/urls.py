@@ -1,9 +1,14 @@
+from django.urls import path
 from rest_framework.routers import DefaultRouter
-from .views import StockViewSet, StockMovementViewSet, StockAdjustmentViewSet
+from .views import StockViewSet, StockMovementViewSet, StockAdjustmentViewSet, StockSummaryViewSet, AvailabilityView, TimeseriesView
 
 router = DefaultRouter()
 router.register(r'stock', StockViewSet, basename='stock')
 router.register(r'stock-movements', StockMovementViewSet, basename='stockmovement')
 router.register(r'stock-adjustments', StockAdjustmentViewSet, basename='stockadjustment')
+router.register(r'stock-summary', StockSummaryViewSet, basename='stocksummary')
 
-urlpatterns = router.urls
+urlpatterns = router.urls + [
+    path('availability/', AvailabilityView.as_view(), name='availability'),
+    path('reports/timeseries/', TimeseriesView.as_view(), name='reports-timeseries'),
+]
@@ -1,30 +1,115 @@
 import logging
+from datetime import datetime, time, timedelta
+from django.http import HttpResponse
 from django.shortcuts import render
-from rest_framework import viewsets, permissions
-from .models import Stock, StockMovement, StockAdjustment
-from .serializers import StockSerializer, StockMovementSerializer, StockAdjustmentSerializer
-from inventory_api.permissions import RolePermission
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError as DRFValidationError
+from rest_framework.parsers import JSONParser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .availability import AVAILABILITY_MAX_PRODUCTS, payload
+from .bulk import bulk_upsert_stock
+from .ledger import annotate_as_of
+from .posting import post_movements
+from .rollups import BUCKETS, periods, timeseries
+from .models import Stock, StockMovement, StockAdjustment, ProductStockSummary, WarehouseStockSummary
+from .serializers import (
+    StockSerializer, StockMovementSerializer, StockAdjustmentSerializer,
+    ProductStockSummarySerializer, WarehouseStockSummarySerializer,
+)
+from inventory_api.fieldsets import SparseFieldsetViewMixin
+from inventory_api.idempotency import IdempotentCreateMixin
+from inventory_api.export import ExportMixin
+from inventory_api.parsers import NDJSONParser
+from inventory_api.permissions import RolePermission, get_role
 from inventory_api.exceptions import (
     InventoryError, StockNotAvailableError, PermissionDeniedError,
-    ValidationError, NotFoundError, BusinessRuleError
+    ValidationError, NotFoundError, BusinessRuleError, InsufficientStockError
 )
 
 logger = logging.getLogger('inventory')
 
 # Create your views here.
 
-class StockViewSet(viewsets.ModelViewSet):
+def parse_as_of(value):
+    """Parse ``?at=`` as a datetime, or a date meaning the end of that day."""
+    if not value:
+        raise DRFValidationError({'at': 'This query parameter is required.'})
+    try:
+        day = parse_date(value)
+        at = datetime.combine(day, time.max) if day else parse_datetime(value)
+    except ValueError:
+        at = None
+    if at is None:
+        raise DRFValidationError({'at': 'Expected an ISO 8601 date or datetime.'})
+    if timezone.is_naive(at):
+        at = timezone.make_aware(at)
+    return at
+
+def parse_id_list(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return [int(pk) for pk in value.split(',') if pk]
+    except ValueError:
+        raise DRFValidationError({name: 'Expected a comma-separated list of ids.'})
+
+class StockViewSet(SparseFieldsetViewMixin, IdempotentCreateMixin, ExportMixin, viewsets.ModelViewSet):
     queryset = Stock.objects.all().order_by('id')
     serializer_class = StockSerializer
 
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'bulk']:
             return [RolePermission(['admin', 'manager'])]
         return [RolePermission(['admin', 'manager', 'employee'])]
 
-class StockMovementViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['post'], url_path='bulk', parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        rows = request.data
+        if not isinstance(rows, list):
+            return Response({'detail': 'Expected a JSON array or NDJSON body of stock rows.'}, status=status.HTTP_400_BAD_REQUEST)
+        logger.info('Bulk stock upsert of %d rows requested by user: %s', len(rows), request.user)
+        upserted, errors = bulk_upsert_stock(rows)
+        code = status.HTTP_400_BAD_REQUEST if errors and not upserted else status.HTTP_200_OK
+        return Response({'received': len(rows), 'upserted': upserted, 'errors': errors}, status=code)
+
+    @action(detail=False, methods=['get'], url_path='as-of')
+    def as_of(self, request):
+        at = parse_as_of(request.query_params.get('at'))
+        queryset = Stock.objects.all()
+        warehouses = parse_id_list(request.query_params, 'warehouse')
+        if warehouses is not None:
+            queryset = queryset.filter(location__warehouse_id__in=warehouses)
+        products = parse_id_list(request.query_params, 'product')
+        if products is not None:
+            queryset = queryset.filter(product_id__in=products)
+        rows = annotate_as_of(queryset, at).order_by('id').values(
+            'id', 'product_id', 'location_id', 'location__warehouse_id', 'quantity_as_of',
+        )
+        page = self.paginate_queryset(rows)
+        data = [
+            {
+                'stock': row['id'],
+                'product': row['product_id'],
+                'location': row['location_id'],
+                'warehouse': row['location__warehouse_id'],
+                'quantity': row['quantity_as_of'],
+            }
+            for row in (page if page is not None else rows)
+        ]
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response({'at': at, 'results': data})
+
+class StockMovementViewSet(SparseFieldsetViewMixin, IdempotentCreateMixin, ExportMixin, viewsets.ModelViewSet):
     queryset = StockMovement.objects.all().order_by('id')
     serializer_class = StockMovementSerializer
+    # Movements are a ledger: posted rows are never edited or deleted
+    http_method_names = ['get', 'post', 'head', 'options']
 
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
@@ -33,11 +118,15 @@ class StockMovementViewSet(viewsets.ModelViewSet):
 
     def create(self, request, *args, **kwargs):
         logger.info('Stock movement create requested by user: %s', request.user)
+        many = isinstance(request.data, list)
+        serializer = self.get_serializer(data=request.data, many=many)
+        serializer.is_valid(raise_exception=True)
+        rows = serializer.validated_data if many else [serializer.validated_data]
         try:
-            return super().create(request, *args, **kwargs)
-        except StockNotAvailableError as e:
-            logger.warning('Stock not available for movement: %s', e)
-            raise
+            movements = post_movements(StockMovement(**attrs) for attrs in rows)
+        except InsufficientStockError as e:
+            logger.warning('Stock not available for movement: %s', e.errors)
+            return Response({'detail': 'Stock not available', 'errors': e.errors}, status=status.HTTP_400_BAD_REQUEST)
         except ValidationError as e:
             logger.error('Validation error: %s', e)
             raise
@@ -47,8 +136,10 @@ class StockMovementViewSet(viewsets.ModelViewSet):
         except Exception as e:
             logger.error('Stock movement creation failed: %s', e)
             raise InventoryError('Failed to create stock movement')
+        data = self.get_serializer(movements, many=True).data if many else self.get_serializer(movements[0]).data
+        return Response(data, status=status.HTTP_201_CREATED)
 
-class StockAdjustmentViewSet(viewsets.ModelViewSet):
+class StockAdjustmentViewSet(SparseFieldsetViewMixin, IdempotentCreateMixin, viewsets.ModelViewSet):
     queryset = StockAdjustment.objects.all().order_by('id')
     serializer_class = StockAdjustmentSerializer
 
@@ -59,12 +150,103 @@ class StockAdjustmentViewSet(viewsets.ModelViewSet):
 
     def create(self, request, *args, **kwargs):
         user = request.user
-        try:
-            role = user.employee.role
-        except Exception:
+        role = get_role(user)
+        if role is None:
             logger.error('Employee object not found for user: %s', user)
             raise PermissionDeniedError('Employee object not found')
         if role not in ['admin', 'manager']:
             logger.warning('Permission denied for role: %s', role)
             raise PermissionDeniedError('Only manager or admin can approve stock adjustments.')
         return super().create(request, *args, **kwargs)
+
+class StockSummaryViewSet(SparseFieldsetViewMixin, viewsets.ReadOnlyModelViewSet):
+    """Per-product availability from the maintained summary table."""
+    queryset = ProductStockSummary.objects.all().order_by('product_id')
+    serializer_class = ProductStockSummarySerializer
+
+    def get_permissions(self):
+        return [RolePermission(['admin', 'manager', 'employee'])]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        products = parse_id_list(self.request.query_params, 'product')
+        if products is not None:
+            queryset = queryset.filter(product_id__in=products)
+        return queryset
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        data = self.get_serializer(instance).data
+        warehouses = WarehouseStockSummary.objects.filter(product_id=instance.product_id).order_by('warehouse_id')
+        data['warehouses'] = WarehouseStockSummarySerializer(warehouses, many=True).data
+        return Response(data)
+
+class AvailabilityView(APIView):
+    """Available-to-promise for many products: ``GET ?product=1,2,3`` or ``POST {"products": [1, 2, 3]}``."""
+
+    def get_permissions(self):
+        return [RolePermission(['admin', 'manager', 'employee'])]
+
+    def get(self, request):
+        return self.respond(parse_id_list(request.query_params, 'product'))
+
+    def post(self, request):
+        products = request.data.get('products') if hasattr(request.data, 'get') else None
+        if not isinstance(products, list):
+            raise DRFValidationError({'products': 'Expected a list of product ids.'})
+        try:
+            products = [int(pk) for pk in products]
+        except (TypeError, ValueError):
+            raise DRFValidationError({'products': 'Expected a list of product ids.'})
+        return self.respond(products)
+
+    def respond(self, products):
+        if not products:
+            raise DRFValidationError({'product': 'Give at least one product id.'})
+        if len(products) > AVAILABILITY_MAX_PRODUCTS:
+            raise DRFValidationError({'product': f'At most {AVAILABILITY_MAX_PRODUCTS} products per request.'})
+        # Already encoded JSON; skips the renderer
+        return HttpResponse(payload(products), content_type='application/json')
+
+class TimeseriesView(APIView):
+    """Sold, received, adjusted and closing on-hand per hour or day, from the stock rollups.
+
+    ``?bucket=day|hour&start=2026-01-01&end=2026-01-31&product=1,2&warehouse=3``.
+    Dates are inclusive; by default the last 30 days (``day``) or today
+    (``hour``).
+    """
+    MAX_PERIODS = 24 * 31
+
+    def get_permissions(self):
+        return [RolePermission(['admin', 'manager', 'employee'])]
+
+    def get(self, request):
+        params = request.query_params
+        bucket = params.get('bucket', 'day')
+        if bucket not in BUCKETS:
+            raise DRFValidationError({'bucket': f'Expected one of: {", ".join(BUCKETS)}.'})
+        end = self.parse_day(params, 'end') or timezone.localdate()
+        start = self.parse_day(params, 'start') or (end - timedelta(days=29) if bucket == 'day' else end)
+        if start > end:
+            raise DRFValidationError({'start': 'Must not be after end.'})
+        days = (end - start).days + 1
+        if days * (24 if bucket == 'hour' else 1) > self.MAX_PERIODS:
+            raise DRFValidationError({'start': f'At most {self.MAX_PERIODS} periods per request.'})
+        results = timeseries(
+            bucket, periods(bucket, start, end),
+            products=parse_id_list(params, 'product'), warehouses=parse_id_list(params, 'warehouse'),
+        )
+        return Response({'bucket': bucket, 'start': start, 'end': end, 'results': results})
+
+    @staticmethod
+    def parse_day(params, name):
+        value = params.get(name)
+        if not value:
+            return None
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            raise DRFValidationError({name: 'Expected an ISO 8601 date.'})
+        return day
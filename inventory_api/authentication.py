@@ -0,0 +1,79 @@
+"""
+JWT authentication with the employee role signed into the token.
+
+``RoleTokenObtainPairSerializer`` adds the employee id, role and token
+version to every token it issues. ``RoleJWTAuthentication`` trusts those
+claims and returns a ``RoleTokenUser`` built from the token instead of
+loading the User and Employee rows, so authenticating and checking a role
+cost no queries.
+
+A token is only honoured while its ``token_version`` matches the
+employee's. The version is bumped, and the cached copy refreshed, whenever
+the role, the linked user, or the user's active or superuser flags change,
+which revokes every outstanding token for that user. The cache should be
+shared across workers in production so revocation takes effect everywhere
+at once.
+"""
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+
+from users.models import Employee
+
+ROLE_CLAIM = 'role'
+TOKEN_VERSION_TIMEOUT = 300
+NO_EMPLOYEE = -1
+
+
+def token_version_key(user_id):
+    return 'token-version:%s' % user_id
+
+
+def current_token_version(user_id):
+    """The token version tokens for ``user_id`` must carry; None without an employee."""
+    key = token_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = Employee.objects.filter(user_id=user_id).values_list('token_version', flat=True).first()
+        version = NO_EMPLOYEE if version is None else version
+        cache.set(key, version, TOKEN_VERSION_TIMEOUT)
+    return None if version == NO_EMPLOYEE else version
+
+
+class RoleTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        employee = Employee.objects.filter(user=user).values_list('id', 'role', 'token_version').first()
+        if employee is None:
+            # Without a version to check against, these users are loaded per request
+            return token
+        token['employee_id'], token[ROLE_CLAIM], token['token_version'] = employee
+        token['username'] = user.get_username()
+        token['is_staff'] = user.is_staff
+        token['is_superuser'] = user.is_superuser
+        return token
+
+
+class RoleTokenUser(TokenUser):
+    @cached_property
+    def role(self):
+        return self.token.get(ROLE_CLAIM)
+
+    @cached_property
+    def employee_id(self):
+        return self.token.get('employee_id')
+
+
+class RoleJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if ROLE_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+        user = RoleTokenUser(validated_token)
+        if validated_token.get('token_version') != current_token_version(user.id):
+            raise InvalidToken(_('Token has been revoked.'))
+        return user
@@ -0,0 +1,175 @@
+"""
+Batch endpoint: many API calls in one round trip.
+
+``POST /api/batch/`` takes ``{"requests": [...], "atomic": false}`` (or a bare
+array), where each sub-request is ``{"method", "path", "body", "headers"}``.
+Sub-requests are resolved against the project URLconf and dispatched in
+order, in-process, to the same views, so every view's permission classes and
+validation apply as usual. What they skip is the per-request overhead: the
+caller is authenticated once for the whole batch, and middleware runs once.
+Each sub-request is still recorded in the request metrics under its own
+route. Routes that stream their response, such as exports, are refused with
+a 400, since a batch would have to hold the whole stream in memory.
+
+With ``"atomic": true`` the batch runs in one transaction. It stops at the
+first sub-request that fails (status 400 or above) and rolls everything back.
+The responses so far are still returned, with ``"committed": false``.
+"""
+import io
+import json
+import logging
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .metrics import registry, route_name, timed_queries
+
+logger = logging.getLogger('inventory')
+
+BATCH_MAX_REQUESTS = getattr(settings, 'BATCH_MAX_REQUESTS', 50)
+BATCH_METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+# Copied from the batch request to each sub-request
+INHERITED_META = ('SERVER_NAME', 'SERVER_PORT', 'HTTP_HOST', 'REMOTE_ADDR', 'wsgi.url_scheme', 'HTTP_X_FORWARDED_PROTO')
+
+
+class BatchError(Exception):
+    pass
+
+
+def _validate(entry, index):
+    if not isinstance(entry, dict):
+        raise BatchError(f'Request {index}: expected an object.')
+    method = str(entry.get('method', 'GET')).upper()
+    if method not in BATCH_METHODS:
+        raise BatchError(f'Request {index}: method must be one of {", ".join(BATCH_METHODS)}.')
+    path = entry.get('path')
+    if not isinstance(path, str) or not path.startswith('/api/'):
+        raise BatchError(f'Request {index}: path must start with /api/.')
+    headers = entry.get('headers') or {}
+    if not isinstance(headers, dict):
+        raise BatchError(f'Request {index}: headers must be an object.')
+    return method, path, entry.get('body'), headers
+
+
+def build_request(parent, method, path, body, headers):
+    """A sub-request of ``parent``, authenticated as its user."""
+    url = urlsplit(path)
+    request = HttpRequest()
+    request.method = method
+    request.path = request.path_info = url.path
+    request.META = {key: parent.META[key] for key in INHERITED_META if key in parent.META}
+    request.META.update({
+        'REQUEST_METHOD': method,
+        'PATH_INFO': url.path,
+        'QUERY_STRING': url.query,
+        'HTTP_ACCEPT': 'application/json',
+    })
+    for name, value in headers.items():
+        request.META['HTTP_' + name.upper().replace('-', '_')] = str(value)
+    request.GET = QueryDict(url.query)
+    payload = b'' if body is None else json.dumps(body).encode()
+    request.META['CONTENT_TYPE'] = 'application/json'
+    request.META['CONTENT_LENGTH'] = str(len(payload))
+    request._stream = io.BytesIO(payload)
+    request._read_started = False
+    request.user = parent.user
+    # DRF authenticates a request carrying these as the given user, skipping token decoding
+    request._force_auth_user = parent.user
+    request._force_auth_token = parent.auth
+    return request
+
+
+def _body(response):
+    data = getattr(response, 'data', None)
+    if data is not None or not response.content:
+        return data
+    if response.get('Content-Type', '').startswith('application/json'):
+        return json.loads(response.content)
+    return response.content.decode()
+
+
+def _error(code, detail):
+    return {'status': code, 'headers': {}, 'body': {'detail': detail}}
+
+
+def _run(parent, match, method, path, body, headers):
+    """Returns ``(result, size)`` for a resolved sub-request."""
+    if match.url_name == 'batch':
+        return _error(status.HTTP_400_BAD_REQUEST, 'Batches cannot be nested.'), 0
+    request = build_request(parent, method, path, body, headers)
+    try:
+        response = match.func(request, *match.args, **match.kwargs)
+    except Exception:
+        logger.exception('Batch sub-request %s %s failed', method, path)
+        return _error(status.HTTP_500_INTERNAL_SERVER_ERROR, 'Internal server error.'), 0
+    if getattr(response, 'streaming', False):
+        # Closing before the first chunk is read runs no export query
+        response.close()
+        return _error(status.HTTP_400_BAD_REQUEST, 'Streaming responses cannot be batched.'), 0
+    if hasattr(response, 'render') and not getattr(response, 'is_rendered', True):
+        response.render()
+    result = {
+        'status': response.status_code,
+        'headers': {name: value for name, value in response.items() if name != 'Content-Type'},
+        'body': _body(response),
+    }
+    return result, len(response.content)
+
+
+def dispatch(parent, method, path, body, headers):
+    """Run one sub-request; returns ``{'status', 'headers', 'body'}``."""
+    try:
+        match = resolve(urlsplit(path).path)
+    except Resolver404:
+        match = None
+    started = time.perf_counter()
+    with timed_queries() as timer:
+        if match is None:
+            result, size = _error(status.HTTP_404_NOT_FOUND, 'Not found.'), 0
+        else:
+            result, size = _run(parent, match, method, path, body, headers)
+    elapsed = time.perf_counter() - started
+    # Middleware does not see sub-requests, so they are recorded here
+    registry.observe(route_name(match), method, result['status'], elapsed, timer.count, timer.seconds, size)
+    return result
+
+
+class BatchView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        data = request.data
+        entries = data.get('requests') if isinstance(data, dict) else data
+        atomic = bool(data.get('atomic')) if isinstance(data, dict) else False
+        if not isinstance(entries, list) or not entries:
+            return Response({'detail': 'Expected a non-empty list of requests.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(entries) > BATCH_MAX_REQUESTS:
+            return Response(
+                {'detail': f'A batch may hold at most {BATCH_MAX_REQUESTS} requests.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            parsed = [_validate(entry, index) for index, entry in enumerate(entries)]
+        except BatchError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        responses = []
+        committed = True
+        if atomic:
+            with transaction.atomic():
+                for sub in parsed:
+                    responses.append(dispatch(request._request, *sub))
+                    if responses[-1]['status'] >= 400:
+                        transaction.set_rollback(True)
+                        committed = False
+                        break
+        else:
+            responses = [dispatch(request._request, *sub) for sub in parsed]
+        return Response({'atomic': atomic, 'committed': committed, 'responses': responses})
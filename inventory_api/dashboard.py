@@ -0,0 +1,106 @@
+"""
+Portal dashboard summary.
+
+One endpoint returns every number the dashboard draws: table counts, order
+status histograms, the highest-priced products and stock per product. Each
+figure is a single ``COUNT``/``GROUP BY`` or an indexed read of the stock
+summary table, and the payload is cached for ``DASHBOARD_CACHE_TIMEOUT``
+seconds so concurrent page loads share one computation.
+
+The cached payload holds every figure. Figures whose list endpoint a role
+may not read (``RESTRICTED_COUNTS``) are dropped from that role's response.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils import timezone
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from inventory.models import ProductStockSummary, Stock
+from orders.models import PurchaseOrder, SalesOrder
+from products.models import Product
+from suppliers.models import Supplier
+from users.models import Employee
+from warehouses.models import Warehouse
+from .permissions import RolePermission, get_role
+
+DASHBOARD_CACHE_KEY = 'dashboard:summary'
+DASHBOARD_TOP_N = 20
+# Counts readable by fewer roles than the dashboard, with the roles of their list endpoint
+RESTRICTED_COUNTS = {
+    'suppliers': ('admin', 'manager'),
+    'warehouses': ('admin', 'manager'),
+    'purchase_orders': ('admin', 'manager'),
+    'employees': ('admin',),
+}
+
+
+def status_counts(queryset):
+    rows = queryset.order_by().values('status').annotate(total=Count('id')).order_by('status')
+    return {row['status'] or 'unknown': row['total'] for row in rows}
+
+
+def visible_to(data, user):
+    """``data`` without the counts ``user``'s role may not list."""
+    if user.is_superuser:
+        return data
+    role = get_role(user)
+    hidden = {name for name, roles in RESTRICTED_COUNTS.items() if role not in roles}
+    if not hidden:
+        return data
+    data = {**data, 'counts': {name: total for name, total in data['counts'].items() if name not in hidden}}
+    if 'purchase_orders' in hidden:
+        del data['purchase_orders_by_status']
+    return data
+
+
+def build_summary(top_n=DASHBOARD_TOP_N):
+    top_prices = (
+        Product.objects.exclude(unit_price=None)
+        .order_by('-unit_price', 'id')
+        .values('id', 'name', 'unit_price')[:top_n]
+    )
+    top_stock = (
+        ProductStockSummary.objects.order_by('-available', 'product_id')
+        .values('product_id', 'product__name', 'available', 'reserved', 'on_hand')[:top_n]
+    )
+    return {
+        'generated_at': timezone.now(),
+        'counts': {
+            'products': Product.objects.count(),
+            'suppliers': Supplier.objects.count(),
+            'warehouses': Warehouse.objects.count(),
+            'stock': Stock.objects.count(),
+            'purchase_orders': PurchaseOrder.objects.count(),
+            'sales_orders': SalesOrder.objects.count(),
+            'employees': Employee.objects.count(),
+        },
+        'purchase_orders_by_status': status_counts(PurchaseOrder.objects.all()),
+        'sales_orders_by_status': status_counts(SalesOrder.objects.all()),
+        'top_products_by_price': [
+            {'product': row['id'], 'name': row['name'], 'unit_price': row['unit_price']} for row in top_prices
+        ],
+        'stock_by_product': [
+            {
+                'product': row['product_id'],
+                'name': row['product__name'],
+                'available': row['available'],
+                'reserved': row['reserved'],
+                'on_hand': row['on_hand'],
+            }
+            for row in top_stock
+        ],
+    }
+
+
+class DashboardSummaryView(APIView):
+    def get_permissions(self):
+        return [RolePermission(['admin', 'manager', 'employee'])]
+
+    def get(self, request):
+        data = cache.get(DASHBOARD_CACHE_KEY)
+        if data is None:
+            data = build_summary()
+            cache.set(DASHBOARD_CACHE_KEY, data, getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 30))
+        return Response(visible_to(data, request.user))
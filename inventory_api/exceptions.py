@@ -28,3 +28,19 @@ class BusinessRuleError(InventoryError):
     def __init__(self, message="Business rule violation"):
         self.message = message
         super().__init__(self.message)
+
+class InsufficientStockError(StockNotAvailableError):
+    def __init__(self, shortages, message="Stock not available", label="product"):
+        # shortages maps a product (or stock, see label) id -> (requested, available)
+        self.shortages = shortages
+        self.errors = [
+            f"Stock not available for {label} {key}. Requested: {requested}, Available: {available}"
+            for key, (requested, available) in shortages.items()
+        ]
+        super().__init__(list(shortages), message)
+
+class ReceiptError(ValidationError):
+    def __init__(self, errors, message="Invalid receipt"):
+        # errors is a list of {'item': id, 'errors': [...]} entries
+        self.errors = errors
+        super().__init__(message)
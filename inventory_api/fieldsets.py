@@ -0,0 +1,132 @@
+"""
+Sparse fieldsets (``?fields=``) and expansion (``?expand=``) for GET requests.
+
+``?fields=id,name,sku`` keeps only the named top-level fields of the response.
+``?expand=supplier`` replaces a foreign-key id with the related object, for
+the fields a serializer lists in ``Meta.expandable_fields``::
+
+    class Meta:
+        expandable_fields = {'supplier': 'suppliers.serializers.SupplierSerializer'}
+
+``SparseFieldsetMixin`` goes on serializers and shapes their fields.
+``SparseFieldsetViewMixin`` goes on viewsets and rebuilds the list and
+retrieve queryset from the shaped serializer: ``select_related`` for nested
+objects, ``prefetch_related`` for nested lists, and ``only()`` for the
+columns actually rendered. Dropping ``variants`` drops its prefetch query,
+and expanding ``supplier`` joins it instead of adding a query per row.
+Without either parameter nothing changes.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.utils.module_loading import import_string
+from rest_framework import serializers
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def _param_set(request, name):
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    return {part.strip() for part in value.split(',') if part.strip()}
+
+
+def requested_shape(request):
+    """``(fields, expand)`` named by a GET request, each a set or ``None``."""
+    if request is None or request.method != 'GET':
+        return None, None
+    return _param_set(request, FIELDS_PARAM), _param_set(request, EXPAND_PARAM)
+
+
+class SparseFieldsetMixin:
+    """Serializer mixin applying ``?fields=`` and ``?expand=`` to the top-level serializer."""
+
+    def _is_root(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self._is_root():
+            return fields
+        only, expand = requested_shape(self.context.get('request'))
+        if expand:
+            expandable = getattr(self.Meta, 'expandable_fields', {})
+            unknown = expand - set(expandable)
+            if unknown:
+                raise serializers.ValidationError({EXPAND_PARAM: [f"Cannot expand: {', '.join(sorted(unknown))}."]})
+            for name in expand:
+                fields[name] = import_string(expandable[name])(read_only=True)
+        if only is not None:
+            unknown = only - {name for name, field in fields.items() if not field.write_only}
+            if unknown:
+                raise serializers.ValidationError({FIELDS_PARAM: [f"Unknown fields: {', '.join(sorted(unknown))}."]})
+            fields = {name: field for name, field in fields.items() if name in only or field.write_only}
+        return fields
+
+
+def _walk(serializer, model, prefix, joined, select, prefetch, columns):
+    """Collect the lookups ``serializer`` needs; returns False if ``columns`` is incomplete."""
+    complete = True
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        if field.source == '*':
+            complete = False
+            continue
+        root = field.source_attrs[0]
+        try:
+            model_field = model._meta.get_field(root)
+        except FieldDoesNotExist:
+            # A property or method: any column may be read
+            complete = False
+            continue
+        path = prefix + root
+        nested = field.child if isinstance(field, serializers.ListSerializer) else field
+        many = model_field.many_to_many or model_field.one_to_many
+        if isinstance(nested, serializers.BaseSerializer):
+            if many or not joined:
+                prefetch.add(path)
+                _walk(nested, model_field.related_model, path + '__', False, select, prefetch, columns)
+            else:
+                select.add(path)
+                columns.add(path)
+                complete &= _walk(nested, model_field.related_model, path + '__', True, select, prefetch, columns)
+        elif many:
+            prefetch.add(path)
+        elif joined:
+            columns.add(path)
+            if len(field.source_attrs) > 1:
+                # e.g. source='category.name'
+                select.add(path)
+                complete = False
+    return complete
+
+
+def shape_queryset(queryset, serializer):
+    """Rebuild the eager loading and column list of ``queryset`` for ``serializer``."""
+    select, prefetch, columns = set(), set(), set()
+    complete = _walk(serializer, queryset.model, '', True, select, prefetch, columns)
+    queryset = queryset.select_related(None).prefetch_related(None)
+    if select:
+        queryset = queryset.select_related(*sorted(select))
+    if prefetch:
+        queryset = queryset.prefetch_related(*sorted(prefetch))
+    if complete:
+        queryset = queryset.only(*(sorted(columns) or ['pk']))
+    return queryset
+
+
+class SparseFieldsetViewMixin:
+    """Viewset mixin shaping the list/retrieve queryset to ``?fields=`` and ``?expand=``."""
+    sparse_fieldset_actions = ('list', 'retrieve')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if getattr(self, 'action', None) in self.sparse_fieldset_actions:
+            only, expand = requested_shape(self.request)
+            if only is not None or expand:
+                queryset = shape_queryset(queryset, self.get_serializer())
+        return queryset
@@ -0,0 +1,181 @@
+"""
+``Idempotency-Key`` support for create endpoints.
+
+A client that may retry a POST sends ``Idempotency-Key: <unique string>``.
+Before the view runs, the first request with a key claims it by inserting an
+IdempotencyKey row; the unique index on ``(user, key)`` makes the claim
+atomic across processes. When the request succeeds, its status, body and
+``Location`` are stored on the row, and a retry with the same key is answered
+from the row without running the view again, with ``Idempotent-Replayed:
+true``.
+
+* A retry that arrives while the first request is still running gets 409
+  with ``Retry-After``. A request holds its key for at most
+  ``IDEMPOTENCY_IN_FLIGHT_TIMEOUT`` seconds (60 by default): if its worker
+  died (say, killed after a gateway timeout) the next retry after that
+  takes the key over instead of getting 409 until the key expires.
+* Reusing a key for a different method, path or body gets 422.
+* A request that fails (status 400 or above) releases its key, so the
+  corrected request can be sent with the same one.
+* Keys expire after ``IDEMPOTENCY_KEY_TTL`` seconds (24 hours by default).
+  An expired key can be claimed again, and ``manage.py
+  purge_idempotency_keys`` deletes expired rows.
+
+Keys are scoped to the authenticated user. Anonymous requests ignore the
+header.
+"""
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+
+from users.models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+IDEMPOTENCY_KEY_TTL = getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60)
+IDEMPOTENCY_IN_FLIGHT_TIMEOUT = getattr(settings, 'IDEMPOTENCY_IN_FLIGHT_TIMEOUT', 60)
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field('key').max_length
+
+
+class IdempotencyInFlight(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'A request with this Idempotency-Key is still being processed.'
+    default_code = 'idempotency_in_flight'
+    # Sent as Retry-After by DRF's exception handler
+    wait = 1
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'This Idempotency-Key was already used for a different request.'
+    default_code = 'idempotency_key_reused'
+
+
+class Replay(Exception):
+    """Raised from ``initial`` to answer a retry with the stored response."""
+
+    def __init__(self, record):
+        self.record = record
+        super().__init__(record.key)
+
+
+def fingerprint(request):
+    digest = hashlib.sha256()
+    digest.update(request.method.encode() + b'\0' + request.get_full_path().encode() + b'\0')
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def expired_before():
+    return timezone.now() - timedelta(seconds=IDEMPOTENCY_KEY_TTL)
+
+
+def abandoned(record):
+    """True once ``record`` can be claimed again: expired, or in flight past its lease."""
+    if record.created_at < expired_before():
+        return True
+    lease = timezone.now() - timedelta(seconds=IDEMPOTENCY_IN_FLIGHT_TIMEOUT)
+    return record.status_code is None and record.created_at < lease
+
+
+def claim(user_id, key, request_fingerprint):
+    """Claim ``key`` for a new request.
+
+    Returns ``(record, True)`` when the caller should run the request, or
+    ``(record, False)`` with the record of an earlier request holding the key.
+    """
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(user_id=user_id, key=key, fingerprint=request_fingerprint)
+            return record, True
+        except IntegrityError:
+            pass
+        record = IdempotencyKey.objects.filter(user_id=user_id, key=key).first()
+        if record is None:
+            # Released between our insert and this read; try once more
+            continue
+        if not abandoned(record):
+            return record, False
+        # Expired or abandoned: take it over, unless another retry just did
+        now = timezone.now()
+        taken = IdempotencyKey.objects.filter(pk=record.pk, created_at=record.created_at).update(
+            fingerprint=request_fingerprint, status_code=None, response=None, location='', created_at=now,
+        )
+        if taken:
+            record.fingerprint, record.status_code, record.response, record.location, record.created_at = (
+                request_fingerprint, None, None, '', now,
+            )
+            return record, True
+    # Contended by other retries; let the client come back
+    raise IdempotencyInFlight()
+
+
+def purge_expired():
+    """Delete expired keys; returns how many were removed."""
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=expired_before()).delete()
+    return deleted
+
+
+class IdempotentCreateMixin:
+    """Viewset mixin honouring ``Idempotency-Key`` on ``idempotent_actions``."""
+    idempotent_actions = ('create',)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.idempotency_record = None
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key or self.action not in self.idempotent_actions or not request.user.is_authenticated:
+            return
+        if len(key) > MAX_KEY_LENGTH:
+            raise ValidationError({IDEMPOTENCY_HEADER: f'Must be at most {MAX_KEY_LENGTH} characters.'})
+        request_fingerprint = fingerprint(request)
+        record, claimed = claim(request.user.pk, key, request_fingerprint)
+        if claimed:
+            self.idempotency_record = record
+        elif record.fingerprint != request_fingerprint:
+            raise IdempotencyKeyReused()
+        elif record.status_code is None:
+            raise IdempotencyInFlight()
+        else:
+            raise Replay(record)
+
+    def handle_exception(self, exc):
+        if not isinstance(exc, Replay):
+            try:
+                return super().handle_exception(exc)
+            except Exception:
+                # Unhandled errors skip finalize_response; don't leave the key in flight
+                self.release_idempotency_key()
+                raise
+        response = Response(exc.record.response, status=exc.record.status_code)
+        if exc.record.location:
+            response['Location'] = exc.record.location
+        response['Idempotent-Replayed'] = 'true'
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        record = getattr(self, 'idempotency_record', None)
+        if record is not None and status.is_success(response.status_code):
+            self.idempotency_record = None
+            # Matched on created_at too: a retry may have taken the key over after our lease ran out
+            IdempotencyKey.objects.filter(pk=record.pk, created_at=record.created_at).update(
+                status_code=response.status_code,
+                response=getattr(response, 'data', None),
+                location=response.get('Location', ''),
+            )
+        else:
+            self.release_idempotency_key()
+        return response
+
+    def release_idempotency_key(self):
+        record = getattr(self, 'idempotency_record', None)
+        if record is not None:
+            self.idempotency_record = None
+            IdempotencyKey.objects.filter(pk=record.pk, created_at=record.created_at).delete()
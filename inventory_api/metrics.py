@@ -0,0 +1,171 @@
+"""
+Request metrics, exposed in Prometheus text format at ``/metrics``.
+
+``MetricsMiddleware`` records, for every request, under its route (the URL
+name, e.g. ``product-list`` or ``purchaseorder-receive``) and method:
+
+* ``http_requests_total`` by status code;
+* ``http_request_duration_seconds``, a latency histogram;
+* ``http_request_db_queries``, a histogram of queries per request, and
+  ``http_request_db_seconds_total``, the time spent in them;
+* ``http_response_size_bytes``, a histogram of response body sizes.
+
+Recording is a few dict updates under a lock plus a wrapper around each
+query, so it is cheap enough to leave on. Requests that match no route are
+recorded as ``unmatched`` to keep label cardinality bounded. Streaming
+responses (exports) are timed to their first byte, with size 0.
+
+Batch sub-requests never pass through middleware, so ``inventory_api.batch``
+records each one itself, under the sub-request's own route. The batch as a
+whole is recorded as well, under ``batch``.
+
+Each process keeps its own numbers. Under a multi-worker server, scrape
+each worker or run one metrics process.
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # One slot per bucket plus +Inf; cumulated when rendered
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(pairs):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{%s}' % ','.join(f'{name}="{escape(value)}"' for name, value in pairs)
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = defaultdict(int)
+        self.latency = {}
+        self.queries = {}
+        self.db_seconds = defaultdict(float)
+        self.sizes = {}
+
+    def observe(self, route, method, status, seconds, queries, db_seconds, size):
+        key = (route, method)
+        with self._lock:
+            self.requests[(route, method, status)] += 1
+            if key not in self.latency:
+                self.latency[key] = Histogram(LATENCY_BUCKETS)
+                self.queries[key] = Histogram(QUERY_BUCKETS)
+                self.sizes[key] = Histogram(SIZE_BUCKETS)
+            self.latency[key].observe(seconds)
+            self.queries[key].observe(queries)
+            self.db_seconds[key] += db_seconds
+            self.sizes[key].observe(size)
+
+    def _histogram(self, lines, name, help, histograms):
+        lines += [f'# HELP {name} {help}', f'# TYPE {name} histogram']
+        for (route, method), histogram in sorted(histograms.items()):
+            base = [('route', route), ('method', method)]
+            running = 0
+            for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                running += count
+                lines.append(f'{name}_bucket{_labels(base + [("le", bound)])} {running}')
+            lines.append(f'{name}_sum{_labels(base)} {histogram.sum}')
+            lines.append(f'{name}_count{_labels(base)} {histogram.count}')
+
+    def render(self):
+        with self._lock:
+            lines = [
+                '# HELP http_requests_total Requests served, by route, method and status.',
+                '# TYPE http_requests_total counter',
+            ]
+            for (route, method, status), count in sorted(self.requests.items()):
+                lines.append(f'http_requests_total{_labels([("route", route), ("method", method), ("status", status)])} {count}')
+            self._histogram(lines, 'http_request_duration_seconds', 'Request latency in seconds.', self.latency)
+            self._histogram(lines, 'http_request_db_queries', 'Database queries per request.', self.queries)
+            lines += [
+                '# HELP http_request_db_seconds_total Time spent in database queries.',
+                '# TYPE http_request_db_seconds_total counter',
+            ]
+            for (route, method), seconds in sorted(self.db_seconds.items()):
+                lines.append(f'http_request_db_seconds_total{_labels([("route", route), ("method", method)])} {seconds:.6f}')
+            self._histogram(lines, 'http_response_size_bytes', 'Response body size in bytes.', self.sizes)
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class QueryTimer:
+    """``execute_wrapper`` counting queries and the time spent in them."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+@contextmanager
+def timed_queries():
+    """Yields a ``QueryTimer`` for the queries run inside the block, on any connection."""
+    timer = QueryTimer()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timer))
+        yield timer
+
+
+def route_name(match):
+    return (match.view_name or match.route) if match else 'unmatched'
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        with timed_queries() as timer:
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+        route = route_name(getattr(request, 'resolver_match', None))
+        size = 0 if getattr(response, 'streaming', False) else len(response.content)
+        registry.observe(route, request.method, response.status_code, elapsed, timer.count, timer.seconds, size)
+        return response
+
+
+def metrics_view(request):
+    allowed = getattr(settings, 'METRICS_ALLOWED_IPS', None)
+    if allowed is not None and request.META.get('REMOTE_ADDR') not in allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,104 @@
+"""
+Pagination classes.
+
+``DefaultPagination`` keeps the page-number behaviour every client relies on
+(``?page=N``) and switches to ``KeysetPagination`` when a request asks for it
+with ``?pagination=keyset`` or follows a ``?cursor=`` link. Viewsets that
+should always page by key can set ``pagination_class = KeysetPagination``.
+
+Keyset pages are fetched with ``WHERE key > last_seen ORDER BY key LIMIT n``
+on an indexed column, so page 10,000 costs the same as page 1, and no
+``COUNT(*)`` is issued unless the client asks for ``?count=estimate``.
+"""
+import json
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Max, Min
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+
+
+class KeysetPagination(CursorPagination):
+    # The primary key, whatever its column: ProductStockSummary is keyed on product_id
+    ordering = 'pk'
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'KEYSET_MAX_PAGE_SIZE', 1000)
+    count_query_param = 'count'
+
+    def get_ordering(self, request, queryset, view):
+        # Views may key on another indexed, nearly-unique column, e.g. 'timestamp'
+        ordering = getattr(view, 'keyset_ordering', None)
+        if ordering:
+            return (ordering,) if isinstance(ordering, str) else tuple(ordering)
+        return super().get_ordering(request, queryset, view)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.estimated_count = None
+        if request.query_params.get(self.count_query_param) == 'estimate':
+            self.estimated_count = estimate_count(queryset)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        payload = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.estimated_count is not None:
+            payload = {'estimated_count': self.estimated_count, **payload}
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['estimated_count'] = {'type': 'integer', 'example': 1000}
+        return response_schema
+
+
+def estimate_count(queryset):
+    """Cheap row estimate: the planner's guess on PostgreSQL, the key span elsewhere."""
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+    bounds = queryset.order_by().aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return 0
+    return bounds['high'] - bounds['low'] + 1
+
+
+class DefaultPagination(PageNumberPagination):
+    # Page-number mode keeps its uncapped page_size; the cap is keyset-only
+    page_size_query_param = 'page_size'
+    mode_query_param = 'pagination'
+    keyset_class = KeysetPagination
+
+    def wants_keyset(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'keyset'
+            or self.keyset_class.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.wants_keyset(request):
+            self.keyset = self.keyset_class()
+            page = self.keyset.paginate_queryset(queryset, request, view)
+            self.display_page_controls = getattr(self.keyset, 'display_page_controls', False)
+            return page
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def to_html(self):
+        if self.keyset is not None:
+            return self.keyset.to_html()
+        return super().to_html()
@@ -1,5 +1,13 @@
 from rest_framework.permissions import BasePermission, SAFE_METHODS
 
+def get_role(user):
+    # Signed into the access token by RoleJWTAuthentication; otherwise loaded
+    role = getattr(user, 'role', None)
+    if role is not None:
+        return role
+    employee = getattr(user, 'employee', None)
+    return getattr(employee, 'role', None)
+
 class RolePermission(BasePermission):
     def __init__(self, allowed_roles):
         self.allowed_roles = allowed_roles
@@ -11,10 +19,10 @@ class RolePermission(BasePermission):
         # Allow Django superusers full access
         if hasattr(user, 'is_superuser') and user.is_superuser:
             return True
-        # Check for Employee object and role
-        employee = getattr(user, 'employee', None)
-        if employee and hasattr(employee, 'role'):
-            return employee.role in self.allowed_roles
+        # Check the employee role
+        role = get_role(user)
+        if role is not None:
+            return role in self.allowed_roles
         return False
 
 def role_required(*roles):
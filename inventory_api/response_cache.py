@@ -0,0 +1,125 @@
+"""
+Response cache for rarely-changing catalog reads.
+
+Viewsets using ``CachedResponseMixin`` name the models their responses are
+built from in ``cache_models``. Each of those models has a version counter in
+the ``RESPONSE_CACHE_ALIAS`` cache, bumped on every save and delete by the
+receivers ``track`` connects (and by ``bump`` after bulk writes, which send no
+signals). A response is cached under a key made of the request's host, path,
+sorted query parameters, the caller's role and the current versions, so a
+write anywhere in a response's models makes every older entry unreachable;
+nothing has to be found and deleted.
+
+The key's digest doubles as the response's ETag. A request whose
+``If-None-Match`` matches gets a 304 after one ``get_many`` of the version
+counters, without touching the ORM.
+
+Counters live in the same cache as the responses. Use a cache shared by all
+processes (file-based, Redis, memcached) when more than one process writes,
+e.g. a worker plus ``manage.py import_catalog``.
+"""
+import hashlib
+import random
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from inventory_api.permissions import get_role
+
+RESPONSE_CACHE_ALIAS = getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')
+RESPONSE_CACHE_TIMEOUT = getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300)
+
+
+def _cache():
+    return caches[RESPONSE_CACHE_ALIAS]
+
+
+def version_key(model):
+    return 'response-version:%s' % model._meta.label_lower
+
+
+def bump(*models):
+    """Invalidate every cached response built from any of ``models``."""
+    cache = _cache()
+    for model in models:
+        key = version_key(model)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, random.getrandbits(48), None)
+
+
+def versions(models):
+    """Current version of each model, creating missing counters."""
+    cache = _cache()
+    keys = [version_key(model) for model in models]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # Random start: a counter that was evicted must not reuse old keys
+            cache.add(key, random.getrandbits(48), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def _bump_sender(sender, raw=False, **kwargs):
+    bump(sender)
+    # Again on commit: a read before the commit caches the old rows under the new version
+    transaction.on_commit(lambda: bump(sender))
+
+
+def track(*models):
+    """Bump ``models``' versions on every save and delete."""
+    for model in models:
+        uid = 'response-cache:%s' % model._meta.label_lower
+        post_save.connect(_bump_sender, sender=model, dispatch_uid=uid, weak=False)
+        post_delete.connect(_bump_sender, sender=model, dispatch_uid=uid, weak=False)
+
+
+def response_key(request, models, role):
+    params = urlencode(sorted(request.query_params.lists()), doseq=True)
+    parts = [request.get_host(), request.path, params, str(role)] + [str(v) for v in versions(models)]
+    return 'response:' + hashlib.sha1('\n'.join(parts).encode()).hexdigest()
+
+
+class CachedResponseMixin:
+    """Viewset mixin caching ``list`` and ``retrieve`` responses, with ETags."""
+    cache_models = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not self.cache_models:
+            return handler(request, *args, **kwargs)
+        role = 'superuser' if getattr(request.user, 'is_superuser', False) else get_role(request.user)
+        key = response_key(request, self.cache_models, role)
+        etag = '"%s"' % key.rsplit(':', 1)[-1]
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            response['X-Cache'] = 'HIT'
+        else:
+            cache = _cache()
+            data = cache.get(key)
+            if data is not None:
+                response = Response(data)
+                response['X-Cache'] = 'HIT'
+            else:
+                response = handler(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                cache.set(key, response.data, RESPONSE_CACHE_TIMEOUT)
+                response['X-Cache'] = 'MISS'
+        response['ETag'] = etag
+        # Clients may keep the body but must revalidate it
+        response['Cache-Control'] = 'private, no-cache'
+        return response
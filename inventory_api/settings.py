@@ -65,6 +65,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so its timings include every other middleware
+    'inventory_api.metrics.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -215,17 +217,68 @@ LOGGING = {
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'inventory_api.authentication.RoleJWTAuthentication',
     ),
     'EXCEPTION_HANDLER': 'inventory_api.exception_handlers.custom_exception_handler',
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'inventory_api.pagination.DefaultPagination',
     'PAGE_SIZE': 10,
     'PAGE_SIZE_QUERY_PARAM': 'page_size',
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Catalog list/retrieve responses (inventory_api.response_cache). For more
+    # than one process, use a shared backend such as
+    # 'django.core.cache.backends.filebased.FileBasedCache' with a LOCATION
+    # directory.
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'responses',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+RESPONSE_CACHE_ALIAS = 'responses'
+# Seconds a cached response is kept; writes invalidate it sooner
+RESPONSE_CACHE_TIMEOUT = 300
+
+# Seconds /api/dashboard/summary/ is served from cache
+DASHBOARD_CACHE_TIMEOUT = 30
+
+# Upper bound for ?page_size= on keyset (?pagination=keyset) pages
+KEYSET_MAX_PAGE_SIZE = 1000
+
+# Clients allowed to scrape /metrics; None allows any
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+# Most sub-requests one POST /api/batch/ may carry
+BATCH_MAX_REQUESTS = 50
+
+# Seconds /api/availability/ may serve a product's figures from cache
+AVAILABILITY_CACHE_TIMEOUT = 5
+
+# Seconds in the past manage.py snapshot_stock stamps its checkpoints, so
+# transactions in flight while it runs are not double counted
+SNAPSHOT_SETTLE_SECONDS = 60
+
+# Seconds a stock movement must age before manage.py rollup_stock folds it in
+ROLLUP_SETTLE_SECONDS = 60
+
+# Seconds an Idempotency-Key is remembered (see inventory_api.idempotency)
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+
+# Seconds a request may hold its Idempotency-Key before a retry can take it
+# over; keep it above the slowest create request
+IDEMPOTENCY_IN_FLIGHT_TIMEOUT = 60
+
+# Entries kept by the in-process barcode/SKU cache behind /api/products/by-code/
+PRODUCT_CODE_CACHE_SIZE = 10000
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=30),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
+    'TOKEN_OBTAIN_SERIALIZER': 'inventory_api.authentication.RoleTokenObtainPairSerializer',
 }
@@ -0,0 +1,34 @@
+"""
+Test helpers.
+
+``QueryBudgetMixin`` pins the number of SQL queries an endpoint may issue.
+List endpoints are requested at several page sizes and must stay within the
+budget at every size with the same count, so a serializer that starts
+loading a relation per row fails the test instead of slowing production.
+"""
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+QUERY_BUDGET_PAGE_SIZES = (1, 5, 20)
+
+
+class QueryBudgetMixin:
+    def count_queries(self, url, params=None):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200, response.content[:500])
+        return len(context.captured_queries), response
+
+    def assertListQueryBudget(self, url, budget, params=None, page_sizes=QUERY_BUDGET_PAGE_SIZES):
+        # Warm-up: per-client caches (e.g. the user's employee row) are not the endpoint's cost
+        self.count_queries(url, params)
+        counts = {}
+        for page_size in page_sizes:
+            counts[page_size], response = self.count_queries(url, {**(params or {}), 'page_size': page_size})
+            self.assertEqual(len(response.data['results']), min(page_size, response.data['count']))
+        self.assertLessEqual(max(counts.values()), budget, 'Queries per page size: %s' % counts)
+        self.assertEqual(len(set(counts.values())), 1, 'Query count grows with page size: %s' % counts)
+
+    def assertRetrieveQueryBudget(self, url, budget, params=None):
+        count, _ = self.count_queries(url, params)
+        self.assertLessEqual(count, budget)
@@ -18,6 +18,9 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include, re_path
 from inventory_api.portal_views import login_view, home_view
+from inventory_api.batch import BatchView
+from inventory_api.dashboard import DashboardSummaryView
+from inventory_api.metrics import metrics_view
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 # Swagger imports
 from rest_framework import permissions
@@ -50,6 +53,9 @@ urlpatterns = [
     path('api/', include('inventory.urls')),
     path('api/', include('orders.urls')),
     path('api/', include('users.urls')),
+    path('api/dashboard/summary/', DashboardSummaryView.as_view(), name='dashboard-summary'),
+    path('api/batch/', BatchView.as_view(), name='batch'),
+    path('metrics', metrics_view, name='metrics'),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 path('login/', login_view, name='portal-login'),
@@ -0,0 +1,63 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries
+from django.test.utils import CaptureQueriesContext
+
+from orders.models import PurchaseOrder, PurchaseOrderItem
+from orders.receiving import receive
+from products.models import Product
+from warehouses.models import Warehouse
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure purchase order receipt throughput in lines/sec: a partial '
+        'receipt of every line followed by the remainder. Creates its own '
+        'fixture rows and removes them afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=500)
+        parser.add_argument('--orders', type=int, default=5)
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        line_count = options['lines']
+        # Receipts go to the first warehouse; only create one if there is none
+        warehouse = None
+        if not Warehouse.objects.exists():
+            warehouse = Warehouse.objects.create(name=f'bench-{tag}', capacity=line_count)
+        products = Product.objects.bulk_create(
+            Product(name=f'bench-{tag}-{i}', sku=f'BENCH-{tag}-{i}', barcode=f'BENCH-{tag}-{i}')
+            for i in range(line_count)
+        )
+        product_ids = [p.pk for p in products]
+        orders = []
+        try:
+            for _ in range(options['orders']):
+                po = PurchaseOrder.objects.create(status='open')
+                orders.append(po.pk)
+                items = PurchaseOrderItem.objects.bulk_create(
+                    PurchaseOrderItem(purchase_order=po, product_id=pk, quantity=10) for pk in product_ids
+                )
+                self._pass('partial', po, [{'item': item.pk, 'quantity': 4} for item in items])
+                self._pass('remainder', po, None)
+        finally:
+            PurchaseOrder.objects.filter(pk__in=orders).delete()
+            Product.objects.filter(pk__in=product_ids).delete()
+            if warehouse is not None:
+                warehouse.delete()
+
+    def _pass(self, label, po, lines):
+        reset_queries()
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            po, received = receive(po, lines)
+            elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{label}: po={po.pk} lines={len(received)} status={po.status} '
+            f'queries={len(context.captured_queries)} elapsed={elapsed:.3f}s '
+            f'lines/sec={len(received) / elapsed:.0f}'
+        )
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:06
+
+from django.db import migrations, models
+
+
+def mark_received_items(apps, schema_editor):
+    PurchaseOrderItem = apps.get_model('orders', 'PurchaseOrderItem')
+    PurchaseOrderItem.objects.filter(purchase_order__status='received', quantity__isnull=False).update(
+        received_quantity=models.F('quantity'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_alter_purchaseorder_created_by_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchaseorderitem',
+            name='received_quantity',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(mark_received_items, migrations.RunPython.noop),
+    ]
@@ -14,6 +14,7 @@ class PurchaseOrderItem(models.Model):
     product = models.ForeignKey('products.Product', on_delete=models.PROTECT, null=True, blank=True)
     quantity = models.IntegerField(null=True, blank=True)
     unit_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    received_quantity = models.IntegerField(default=0)
 
 class SalesOrder(models.Model):
     customer = models.ForeignKey('users.Customer', on_delete=models.PROTECT, null=True, blank=True)
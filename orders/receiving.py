@@ -0,0 +1,115 @@
+"""
+Purchase order receiving.
+
+A receipt is applied in one transaction: the order and its items are
+locked, the requested quantities are checked against what is still
+outstanding per line, the putaway engine slots the whole receipt at once
+(a line may be split over several locations), missing Stock rows are
+created in bulk, and the goods are posted as ``IN``
+movements through the ledger engine, which increments every Stock row with
+a single UPDATE. Either every line is received or nothing is.
+"""
+from collections import OrderedDict
+
+from django.db import transaction
+
+from inventory.models import StockMovement
+from inventory.posting import ensure_stock, post_movements
+from inventory_api.exceptions import BusinessRuleError, ReceiptError
+from warehouses.putaway import plan_putaway
+from .models import PurchaseOrder, PurchaseOrderItem
+
+
+def receipt_reference(purchase_order):
+    return f'PO-{purchase_order.pk}'
+
+
+def outstanding(item):
+    return max((item.quantity or 0) - item.received_quantity, 0)
+
+
+def plan_receipt(items, lines=None):
+    """Return ``{item_pk: quantity}`` to receive; raises ``ReceiptError``.
+
+    Without ``lines`` every item's outstanding quantity is received.
+    ``lines`` is a list of ``{'item': pk, 'quantity': n}``; lines for the
+    same item add up.
+    """
+    items = {item.pk: item for item in items}
+    if lines is None:
+        return OrderedDict((pk, outstanding(item)) for pk, item in items.items() if outstanding(item) > 0)
+    if not isinstance(lines, list):
+        raise ReceiptError([{'item': None, 'errors': ['Expected a list of {"item", "quantity"} lines.']}])
+    plan = OrderedDict()
+    errors = []
+    for line in lines:
+        try:
+            pk, quantity = int(line['item']), int(line['quantity'])
+        except (KeyError, TypeError, ValueError):
+            errors.append({'item': line.get('item') if isinstance(line, dict) else None,
+                           'errors': ['Each line needs an item id and an integer quantity.']})
+            continue
+        if pk not in items:
+            errors.append({'item': pk, 'errors': ['Item does not belong to this purchase order.']})
+        elif quantity <= 0:
+            errors.append({'item': pk, 'errors': ['Quantity must be positive.']})
+        else:
+            plan[pk] = plan.get(pk, 0) + quantity
+    for pk, quantity in plan.items():
+        if quantity > outstanding(items[pk]):
+            errors.append({'item': pk, 'errors': [
+                f'Cannot receive {quantity}; {outstanding(items[pk])} outstanding.'
+            ]})
+    if errors:
+        raise ReceiptError(errors)
+    return plan
+
+
+def receive(purchase_order, lines=None, warehouse_id=None):
+    """Receive ``lines`` (default: everything outstanding) of ``purchase_order``.
+
+    Goods go to ``warehouse_id``, or the first warehouse. Returns
+    ``(purchase_order, received)`` where ``received`` is a list of
+    ``{'item', 'product', 'location', 'quantity'}`` entries, one per
+    location a line was put away in. The order is marked ``received`` once
+    every line is fully received.
+    """
+    with transaction.atomic():
+        purchase_order = PurchaseOrder.objects.select_for_update().get(pk=purchase_order.pk)
+        if purchase_order.status == 'received':
+            raise BusinessRuleError('Already received')
+        if purchase_order.status == 'cancelled':
+            raise BusinessRuleError('Cannot receive a cancelled purchase order')
+        items = list(
+            purchase_order.items.select_for_update().filter(product__isnull=False).order_by('pk')
+        )
+        plan = plan_receipt(items, lines)
+        by_pk = {item.pk: item for item in items}
+        receiving = [by_pk[pk] for pk in plan]
+        slots = plan_putaway(
+            OrderedDict((item.pk, (item.product_id, plan[item.pk])) for item in receiving), warehouse_id,
+            create_default=True,
+        ) if receiving else {}
+        received = [
+            {'item': item.pk, 'product': item.product_id, 'location': location_id, 'quantity': quantity}
+            for item in receiving
+            for location_id, quantity in slots[item.pk]
+        ]
+        stock_ids = ensure_stock((line['product'], line['location']) for line in received)
+        reference = receipt_reference(purchase_order)
+        post_movements(
+            StockMovement(
+                stock_id=stock_ids[(line['product'], line['location'])],
+                movement_type='IN',
+                quantity=line['quantity'],
+                reference=reference,
+            )
+            for line in received
+        )
+        for item in receiving:
+            item.received_quantity += plan[item.pk]
+        PurchaseOrderItem.objects.bulk_update(receiving, ['received_quantity'])
+        if all(outstanding(item) == 0 for item in items):
+            purchase_order.status = 'received'
+            purchase_order.save(update_fields=['status'])
+    return purchase_order, received
@@ -1,16 +1,27 @@
 from rest_framework import serializers
+from inventory_api.fieldsets import SparseFieldsetMixin
+from products.models import Product
 from .models import PurchaseOrder, PurchaseOrderItem, SalesOrder, SalesOrderItem
 
-class PurchaseOrderItemSerializer(serializers.ModelSerializer):
+class PurchaseOrderItemSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = PurchaseOrderItem
         fields = '__all__'
+        # Only the receive action moves goods in
+        read_only_fields = ['received_quantity']
+        expandable_fields = {
+            'product': 'products.serializers.ProductSerializer',
+        }
 
-class PurchaseOrderSerializer(serializers.ModelSerializer):
+class PurchaseOrderSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     items = PurchaseOrderItemSerializer(many=True, read_only=True)
     class Meta:
         model = PurchaseOrder
         fields = ['id', 'supplier', 'created_by', 'status', 'order_date', 'expected_date', 'items']
+        expandable_fields = {
+            'supplier': 'suppliers.serializers.SupplierSerializer',
+            'created_by': 'users.serializers.EmployeeSerializer',
+        }
 
     def validate_status(self, value):
         valid_status = ['open', 'received', 'cancelled']
@@ -23,16 +34,54 @@ class PurchaseOrderSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('Supplier is required.')
         return data
 
-class SalesOrderItemSerializer(serializers.ModelSerializer):
+class SalesOrderItemSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = SalesOrderItem
         fields = '__all__'
+        expandable_fields = {
+            'product': 'products.serializers.ProductSerializer',
+        }
 
-class SalesOrderSerializer(serializers.ModelSerializer):
-    items = SalesOrderItemSerializer(many=True, read_only=True)
+class LineProductField(serializers.PrimaryKeyRelatedField):
+    """Product of an order line, taken from the products its list loaded in bulk."""
+
+    def to_internal_value(self, data):
+        products = getattr(self.parent.parent, 'products', {})
+        try:
+            return products[int(data)]
+        except (KeyError, TypeError, ValueError):
+            return super().to_internal_value(data)
+
+class SalesOrderLineListSerializer(serializers.ListSerializer):
+    def to_internal_value(self, data):
+        # One query for every line's product instead of one per line
+        ids = set()
+        for item in data if isinstance(data, list) else []:
+            try:
+                ids.add(int(item.get('product')))
+            except (AttributeError, TypeError, ValueError):
+                pass
+        self.products = Product.objects.in_bulk(ids)
+        return super().to_internal_value(data)
+
+class SalesOrderLineSerializer(SalesOrderItemSerializer):
+    """An item written inline with its sales order."""
+    product = LineProductField(queryset=Product.objects.all())
+
+    class Meta(SalesOrderItemSerializer.Meta):
+        read_only_fields = ['sales_order']
+        extra_kwargs = {'quantity': {'required': True, 'allow_null': False, 'min_value': 1}}
+        list_serializer_class = SalesOrderLineListSerializer
+
+class SalesOrderSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    items = SalesOrderLineSerializer(many=True, required=False)
     class Meta:
         model = SalesOrder
         fields = ['id', 'customer', 'created_by', 'status', 'order_date', 'shipped_date', 'items']
+        expandable_fields = {
+            'customer': 'users.serializers.CustomerSerializer',
+            'created_by': 'users.serializers.EmployeeSerializer',
+        }
 
     def validate_status(self, value):
         valid_status = ['open', 'shipped', 'cancelled']
@@ -44,3 +93,15 @@ class SalesOrderSerializer(serializers.ModelSerializer):
         if not data.get('customer'):
             raise serializers.ValidationError('Customer is required.')
         return data
+
+    def create(self, validated_data):
+        items = validated_data.pop('items', [])
+        order = super().create(validated_data)
+        SalesOrderItem.objects.bulk_create(SalesOrderItem(sales_order=order, **item) for item in items)
+        return order
+
+    def update(self, instance, validated_data):
+        if 'items' in validated_data:
+            # Stock was allocated for the lines the order was created with
+            raise serializers.ValidationError({'items': 'Items can only be set when the order is created.'})
+        return super().update(instance, validated_data)
@@ -1,4 +1,6 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APITestCase
 from django.urls import reverse
 from .models import PurchaseOrder, PurchaseOrderItem, SalesOrder, SalesOrderItem
@@ -8,6 +10,7 @@ from users.models import Employee, Customer
 from django.contrib.auth.models import User
 from warehouses.models import Warehouse, Location
 from inventory.models import Stock
+from inventory_api.testing import QueryBudgetMixin
 
 class OrdersModelTest(TestCase):
     def setUp(self):
@@ -122,3 +125,319 @@ class OrdersAPITest(APITestCase):
         from inventory.models import Stock
         stock = Stock.objects.get(id=self.stock.id)
         self.assertEqual(stock.quantity, initial_stock + 3)
+
+    def test_partial_receipt_keeps_purchase_order_open(self):
+        from inventory.models import StockMovement
+        po = PurchaseOrder.objects.create(supplier=self.supplier, created_by=self.emp, status="open")
+        item = PurchaseOrderItem.objects.create(purchase_order=po, product=self.prod, quantity=5, unit_price=100)
+        url = reverse('purchaseorder-receive', args=[po.id])
+        response = self.client.post(url, {"lines": [{"item": item.id, "quantity": 2}]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'open')
+        item.refresh_from_db()
+        self.assertEqual(item.received_quantity, 2)
+        response = self.client.post(url, format='json')
+        self.assertEqual(response.data['status'], 'received')
+        self.assertEqual(response.data['received'][0]['quantity'], 3)
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 7)
+        self.assertEqual(
+            list(StockMovement.objects.filter(reference=f'PO-{po.id}').values_list('movement_type', 'quantity')),
+            [('IN', 2), ('IN', 3)],
+        )
+        response = self.client.post(url, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_receipt_follows_putaway_split(self):
+        self.loc.capacity = 4
+        self.loc.save()
+        overflow = Location.objects.create(warehouse=self.wh, name="A2")
+        po = PurchaseOrder.objects.create(supplier=self.supplier, created_by=self.emp, status="open")
+        item = PurchaseOrderItem.objects.create(purchase_order=po, product=self.prod, quantity=5, unit_price=100)
+        response = self.client.post(reverse('purchaseorder-receive', args=[po.id]), format='json')
+        self.assertEqual(
+            [(line['location'], line['quantity']) for line in response.data['received']],
+            [(self.loc.id, 2), (overflow.id, 3)],
+        )
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 4)
+        self.assertEqual(Stock.objects.get(product=self.prod, location=overflow).quantity, 3)
+
+    def test_receipt_into_empty_warehouse_creates_default_location(self):
+        empty = Warehouse.objects.create(name="Empty", capacity=10)
+        po = PurchaseOrder.objects.create(supplier=self.supplier, created_by=self.emp, status="open")
+        PurchaseOrderItem.objects.create(purchase_order=po, product=self.prod, quantity=5, unit_price=100)
+        response = self.client.post(reverse('purchaseorder-receive', args=[po.id]), {"warehouse": empty.id}, format='json')
+        self.assertEqual(response.status_code, 200)
+        default = Location.objects.get(warehouse=empty)
+        self.assertEqual((default.name, response.data['received'][0]['location']), ('Default', default.id))
+
+    def test_receipt_rejects_bad_warehouse(self):
+        po = PurchaseOrder.objects.create(supplier=self.supplier, created_by=self.emp, status="open")
+        PurchaseOrderItem.objects.create(purchase_order=po, product=self.prod, quantity=5, unit_price=100)
+        url = reverse('purchaseorder-receive', args=[po.id])
+        self.assertEqual(self.client.post(url, {"warehouse": "abc"}, format='json').status_code, 400)
+        self.assertEqual(self.client.post(url, {"warehouse": [1]}, format='json').status_code, 400)
+        self.assertEqual(self.client.post(url, {"warehouse": 999999}, format='json').status_code, 400)
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 2)
+
+    def test_over_receipt_is_rejected_without_changes(self):
+        other = Product.objects.create(name="Tablet", sku="SKU2", barcode="BAR2", category=self.cat, unit_price=200)
+        po = PurchaseOrder.objects.create(supplier=self.supplier, created_by=self.emp, status="open")
+        first = PurchaseOrderItem.objects.create(purchase_order=po, product=self.prod, quantity=5, unit_price=100)
+        second = PurchaseOrderItem.objects.create(purchase_order=po, product=other, quantity=1, unit_price=200)
+        url = reverse('purchaseorder-receive', args=[po.id])
+        lines = [{"item": first.id, "quantity": 5}, {"item": second.id, "quantity": 2}]
+        response = self.client.post(url, {"lines": lines}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'][0]['item'], second.id)
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 2)
+        self.assertFalse(Stock.objects.filter(product=other).exists())
+        first.refresh_from_db()
+        self.assertEqual(first.received_quantity, 0)
+
+    def test_receipt_query_count_does_not_grow_with_lines(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from warehouses.putaway import PutawayRules
+        from .receiving import receive
+        # Putaway rules are compiled once and cached; measure the warm path
+        PutawayRules.load(self.wh.id)
+        counts = []
+        for size in (3, 30):
+            po = PurchaseOrder.objects.create(supplier=self.supplier, created_by=self.emp, status="open")
+            products = Product.objects.bulk_create(
+                Product(name=f"P{size}-{i}", sku=f"SKU{size}-{i}", barcode=f"BAR{size}-{i}") for i in range(size)
+            )
+            PurchaseOrderItem.objects.bulk_create(
+                PurchaseOrderItem(purchase_order=po, product=product, quantity=2) for product in products
+            )
+            with CaptureQueriesContext(connection) as context:
+                po, received = receive(po)
+            self.assertEqual(len(received), size)
+            self.assertEqual(po.status, 'received')
+            counts.append(len(context.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_sales_order_rolls_back_stock_on_partial_shortage(self):
+        other = Product.objects.create(name="Tablet", sku="SKU2", barcode="BAR2", category=self.cat, unit_price=200)
+        data = {
+            "customer": self.cust.id,
+            "created_by": self.emp.id,
+            "status": "open",
+            "items": [
+                {"product": self.prod.id, "quantity": 1, "unit_price": 100},
+                {"product": other.id, "quantity": 1, "unit_price": 200}
+            ]
+        }
+        response = self.client.post(self.so_url, data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 2)
+        self.assertFalse(SalesOrder.objects.exists())
+
+    def test_invalid_sales_order_does_not_deduct_stock(self):
+        data = {"status": "open", "items": [{"product": self.prod.id, "quantity": 1, "unit_price": 100}]}
+        response = self.client.post(self.so_url, data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 2)
+
+    def test_sales_order_deduction_is_written_to_ledger(self):
+        from inventory.models import StockMovement
+        data = {
+            "customer": self.cust.id,
+            "status": "open",
+            "items": [{"product": self.prod.id, "quantity": 2, "unit_price": 100}]
+        }
+        response = self.client.post(self.so_url, data, format='json')
+        self.assertEqual(response.status_code, 201)
+        movement = StockMovement.objects.get()
+        self.assertEqual((movement.stock_id, movement.movement_type, movement.quantity), (self.stock.id, 'OUT', 2))
+        self.assertEqual(movement.reference, f"SO-{response.data['id']}")
+
+
+    def test_sales_order_items_are_written_with_the_order(self):
+        other = Product.objects.create(name="Tablet", sku="SKU2", barcode="BAR2", category=self.cat, unit_price=200)
+        Stock.objects.create(product=other, location=self.loc, quantity=3)
+        data = {
+            "customer": self.cust.id,
+            "status": "open",
+            "items": [
+                {"product": self.prod.id, "quantity": 2, "unit_price": 100},
+                {"product": other.id, "quantity": 3, "unit_price": 200}
+            ]
+        }
+        response = self.client.post(self.so_url, data, format='json')
+        self.assertEqual(response.status_code, 201)
+        order = SalesOrder.objects.get(pk=response.data['id'])
+        self.assertEqual(
+            list(order.items.order_by('id').values_list('product_id', 'quantity')),
+            [(self.prod.id, 2), (other.id, 3)],
+        )
+        self.assertEqual([item['product'] for item in response.data['items']], [self.prod.id, other.id])
+        response = self.client.patch(reverse('salesorder-detail', args=[order.id]), {"items": []}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_sales_order_items_are_rejected(self):
+        for item in ({"product": self.prod.id}, {"product": self.prod.id, "quantity": 0}, {"product": 9999, "quantity": 1}):
+            response = self.client.post(self.so_url, {"customer": self.cust.id, "status": "open", "items": [item]}, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('items', response.data)
+        self.assertFalse(SalesOrder.objects.exists())
+        self.assertFalse(SalesOrderItem.objects.exists())
+
+    def test_sales_order_query_count_does_not_grow_with_lines(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from inventory import summary
+        counts = []
+        for size in (3, 60):
+            products = Product.objects.bulk_create(
+                Product(name=f"P{size}-{i}", sku=f"SKU{size}-{i}", barcode=f"BAR{size}-{i}") for i in range(size)
+            )
+            Stock.objects.bulk_create(Stock(product=product, location=self.loc, quantity=5) for product in products)
+            summary.rebuild([product.id for product in products])
+            items = [{"product": product.id, "quantity": 2, "unit_price": 10} for product in products]
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.post(self.so_url, {"customer": self.cust.id, "status": "open", "items": items}, format='json')
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(len(response.data['items']), size)
+            counts.append(len(context.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+        self.assertFalse(Stock.objects.filter(product__sku__startswith='SKU60-').exclude(quantity=3).exists())
+
+class OrdersQueryBudgetTest(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.emp = Employee.objects.create(user=self.user, name="Emp1", role="manager")
+        self.client.force_authenticate(user=self.user)
+        prod = Product.objects.create(name="Phone", sku="SKU1", barcode="BAR1", unit_price=100)
+        supplier = Supplier.objects.create(name="Acme")
+        cust = Customer.objects.create(name="Cust1")
+        for _ in range(25):
+            po = PurchaseOrder.objects.create(supplier=supplier, created_by=self.emp, status="open")
+            PurchaseOrderItem.objects.bulk_create(PurchaseOrderItem(purchase_order=po, product=prod, quantity=1) for _ in range(3))
+            so = SalesOrder.objects.create(customer=cust, created_by=self.emp, status="open")
+            SalesOrderItem.objects.bulk_create(SalesOrderItem(sales_order=so, product=prod, quantity=1) for _ in range(3))
+        self.po, self.so = po, so
+
+    def test_list_purchase_orders(self):
+        self.assertListQueryBudget(reverse('purchaseorder-list'), 3)
+
+    def test_retrieve_purchase_order(self):
+        self.assertRetrieveQueryBudget(reverse('purchaseorder-detail', args=[self.po.id]), 2)
+
+    def test_list_sales_orders(self):
+        self.assertListQueryBudget(reverse('salesorder-list'), 3)
+
+    def test_retrieve_sales_order(self):
+        self.assertRetrieveQueryBudget(reverse('salesorder-detail', args=[self.so.id]), 2)
+
+    def test_list_purchase_orders_without_items(self):
+        self.assertListQueryBudget(reverse('purchaseorder-list'), 2, params={'fields': 'id,status,supplier'})
+
+    def test_expand_joins_instead_of_querying_per_row(self):
+        self.assertListQueryBudget(
+            reverse('purchaseorder-list'), 2, params={'fields': 'id,supplier,created_by', 'expand': 'supplier,created_by'},
+        )
+        self.assertListQueryBudget(reverse('salesorder-list'), 3, params={'expand': 'customer'})
+        response = self.client.get(reverse('salesorder-list'), {'expand': 'customer', 'page_size': 1})
+        self.assertEqual(response.data['results'][0]['customer']['name'], "Cust1")
+        self.assertEqual(len(response.data['results'][0]['items']), 3)
+
+
+class IdempotencyKeyTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        Employee.objects.create(user=self.user, name="Emp1", role="manager")
+        self.client.force_authenticate(user=self.user)
+        self.prod = Product.objects.create(name="Phone", sku="SKU1", barcode="BAR1", unit_price=100)
+        self.cust = Customer.objects.create(name="Cust1")
+        self.loc = Location.objects.create(warehouse=Warehouse.objects.create(name="Main", capacity=1000), name="A1")
+        self.stock = Stock.objects.create(product=self.prod, location=self.loc, quantity=5)
+        self.order = {"customer": self.cust.id, "status": "open", "items": [{"product": self.prod.id, "quantity": 2}]}
+
+    def post(self, url, data, key):
+        return self.client.post(url, data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_is_answered_from_the_store(self):
+        first = self.post(reverse('salesorder-list'), self.order, 'order-1')
+        self.assertEqual(first.status_code, 201)
+        with CaptureQueriesContext(connection) as context:
+            retry = self.post(reverse('salesorder-list'), self.order, 'order-1')
+        # Only the key table is read; no order logic runs
+        statements = {query['sql'] for query in context.captured_queries if 'FROM' in query['sql'] or 'INTO' in query['sql']}
+        self.assertTrue(statements and all('users_idempotencykey' in sql for sql in statements), statements)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(SalesOrder.objects.count(), 1)
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 3)
+        # Another user's key of the same name is unrelated
+        other = User.objects.create_user(username='other', password='testpass')
+        Employee.objects.create(user=other, name="Emp2", role="manager")
+        self.client.force_authenticate(user=other)
+        self.assertNotIn('Idempotent-Replayed', self.post(reverse('salesorder-list'), self.order, 'order-1'))
+        self.assertEqual(SalesOrder.objects.count(), 2)
+
+    def test_stock_movement_retry_deducts_once(self):
+        movement = {"stock": self.stock.id, "movement_type": "OUT", "quantity": 1}
+        for _ in range(3):
+            self.assertEqual(self.post(reverse('stockmovement-list'), movement, 'move-1').status_code, 201)
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 4)
+
+    def test_key_reused_for_another_request(self):
+        self.post(reverse('salesorder-list'), self.order, 'order-1')
+        response = self.post(reverse('salesorder-list'), {**self.order, "status": "cancelled"}, 'order-1')
+        self.assertEqual(response.status_code, 422)
+
+    def test_in_flight_key_gets_conflict(self):
+        from users.models import IdempotencyKey
+        self.post(reverse('salesorder-list'), self.order, 'order-1')
+        # As if the first request were still running
+        IdempotencyKey.objects.update(status_code=None, response=None)
+        response = self.post(reverse('salesorder-list'), self.order, 'order-1')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(SalesOrder.objects.count(), 1)
+
+    def test_abandoned_in_flight_key_is_taken_over(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from users.models import IdempotencyKey
+        self.post(reverse('salesorder-list'), self.order, 'order-1')
+        # As if the worker had died mid-request two minutes ago
+        IdempotencyKey.objects.update(status_code=None, response=None, created_at=timezone.now() - timedelta(minutes=2))
+        response = self.post(reverse('salesorder-list'), self.order, 'order-1')
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(IdempotencyKey.objects.get().status_code, 201)
+        response = self.post(reverse('salesorder-list'), self.order, 'order-1')
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+
+    def test_failed_request_releases_key(self):
+        response = self.post(reverse('salesorder-list'), {**self.order, "items": [{"product": self.prod.id, "quantity": 50}]}, 'order-1')
+        self.assertEqual(response.status_code, 400)
+        response = self.post(reverse('salesorder-list'), self.order, 'order-1')
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', response)
+
+    def test_expired_key_can_be_claimed_again(self):
+        from datetime import timedelta
+        from io import StringIO
+        from django.core.management import call_command
+        from django.utils import timezone
+        from users.models import IdempotencyKey
+        self.post(reverse('salesorder-list'), self.order, 'order-1')
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(days=2))
+        response = self.post(reverse('salesorder-list'), self.order, 'order-1')
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(SalesOrder.objects.count(), 2)
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(days=2))
+        call_command('purge_idempotency_keys', stdout=StringIO())
+        self.assertFalse(IdempotencyKey.objects.exists())
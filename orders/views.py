@@ -1,95 +1,121 @@
 
 import logging
+from django.db import transaction
 from django.shortcuts import render
 from rest_framework import viewsets, permissions
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from .models import PurchaseOrder, PurchaseOrderItem, SalesOrder, SalesOrderItem
 from .serializers import PurchaseOrderSerializer, PurchaseOrderItemSerializer, SalesOrderSerializer, SalesOrderItemSerializer
+from inventory_api.fieldsets import SparseFieldsetViewMixin
+from inventory_api.idempotency import IdempotentCreateMixin
+from inventory_api.export import ExportMixin
 from inventory_api.permissions import RolePermission
-from inventory_api.exceptions import InventoryError, StockNotAvailableError
+from inventory_api.exceptions import InventoryError, StockNotAvailableError, InsufficientStockError, BusinessRuleError, ReceiptError
+from inventory.allocation import allocate, check_availability, merge_lines, release
+from .receiving import receive as receive_purchase_order
 
 logger = logging.getLogger('inventory')
 
 # Create your views here.
 
-class PurchaseOrderViewSet(viewsets.ModelViewSet):
-    queryset = PurchaseOrder.objects.all().order_by('id')
+class PurchaseOrderViewSet(SparseFieldsetViewMixin, IdempotentCreateMixin, ExportMixin, viewsets.ModelViewSet):
+    queryset = PurchaseOrder.objects.prefetch_related('items').order_by('id')
     serializer_class = PurchaseOrderSerializer
     permission_classes = [type('CustomRolePermission', (RolePermission,), {'__init__': lambda self: RolePermission.__init__(self, ['admin', 'manager'])})]
-
-    from rest_framework.decorators import action
-    from rest_framework.response import Response
+    # A retried partial receipt would receive its lines twice
+    idempotent_actions = ('create', 'receive')
 
     @action(detail=True, methods=['post'], url_path='receive')
     def receive(self, request, pk=None):
         po = self.get_object()
+        data = request.data if hasattr(request.data, 'get') else {}
+        warehouse = data.get('warehouse')
+        if warehouse is not None:
+            try:
+                warehouse = int(warehouse)
+            except (TypeError, ValueError):
+                return Response({'detail': 'warehouse must be a warehouse id.'}, status=400)
+        try:
+            po, received = receive_purchase_order(po, data.get('lines'), warehouse)
+        except ReceiptError as e:
+            return Response({'detail': e.message, 'errors': e.errors}, status=400)
+        except BusinessRuleError as e:
+            return Response({'detail': e.message}, status=400)
+        logger.info('Purchase order %s received %d lines by user: %s', po.pk, len(received), request.user)
         if po.status == 'received':
-            return self.Response({'detail': 'Already received'}, status=400)
-        from inventory.models import Stock
-        from .models import PurchaseOrderItem
-        items = PurchaseOrderItem.objects.filter(purchase_order=po)
-        for item in items:
-            # Find a location for the product's warehouse, or create one if needed
-            from warehouses.models import Location, Warehouse
-            warehouse = None
-            if hasattr(item.product, 'category') and hasattr(item.product.category, 'name'):
-                warehouse = Warehouse.objects.first()
-            else:
-                warehouse = Warehouse.objects.first()
-            location = Location.objects.filter(warehouse=warehouse).first()
-            if not location:
-                location = Location.objects.create(warehouse=warehouse, name='Default', type='Bin')
-            stock, created = Stock.objects.get_or_create(product=item.product, location=location)
-            stock.quantity += item.quantity
-            stock.save()
-        po.status = 'received'
-        po.save()
-        return self.Response({'detail': 'Stock incremented and PO marked as received'})
+            detail = 'Stock incremented and PO marked as received'
+        else:
+            detail = 'Stock incremented; PO partially received'
+        return Response({'detail': detail, 'status': po.status, 'received': received})
 
-class PurchaseOrderItemViewSet(viewsets.ModelViewSet):
+class PurchaseOrderItemViewSet(SparseFieldsetViewMixin, IdempotentCreateMixin, viewsets.ModelViewSet):
     queryset = PurchaseOrderItem.objects.all().order_by('id')
     serializer_class = PurchaseOrderItemSerializer
     permission_classes = [type('CustomRolePermission', (RolePermission,), {'__init__': lambda self: RolePermission.__init__(self, ['admin', 'manager'])})]
 
-class SalesOrderViewSet(viewsets.ModelViewSet):
-    queryset = SalesOrder.objects.all().order_by('id')
+class SalesOrderViewSet(SparseFieldsetViewMixin, IdempotentCreateMixin, ExportMixin, viewsets.ModelViewSet):
+    queryset = SalesOrder.objects.prefetch_related('items').order_by('id')
     serializer_class = SalesOrderSerializer
     permission_classes = [type('CustomRolePermission', (RolePermission,), {'__init__': lambda self: RolePermission.__init__(self, ['admin', 'manager', 'employee'])})]
 
     def create(self, request, *args, **kwargs):
-        items = request.data.get('items', [])
-        from inventory.models import Stock
-        errors = []
-        stock_to_update = []
         logger.info('Sales order create requested by user: %s', request.user)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        lines = merge_lines(
+            {'product': item['product'].pk, 'quantity': item['quantity']}
+            for item in serializer.validated_data.get('items', [])
+        )
         try:
-            for item in items:
-                product_id = item.get('product')
-                quantity = int(item.get('quantity', 0))
-                stock_qs = Stock.objects.filter(product_id=product_id)
-                total_stock = sum([s.quantity for s in stock_qs])
-                if quantity > total_stock:
-                    errors.append(f"Stock not available for product {product_id}. Requested: {quantity}, Available: {total_stock}")
-                else:
-                    # Prepare deduction
-                    stock_to_update.append((stock_qs, quantity))
-        except StockNotAvailableError as e:
-            logger.warning('Stock not available for sales order: %s', e)
-            raise
-        if errors:
-            from rest_framework.response import Response
-            return Response({'detail': 'Stock not available', 'errors': errors}, status=400)
-        # Deduct stock (FIFO)
-        for stock_qs, quantity in stock_to_update:
-            for stock in stock_qs.order_by('id'):
-                if quantity <= 0:
-                    break
-                deduct = min(stock.quantity, quantity)
-                stock.quantity -= deduct
-                stock.save()
-                quantity -= deduct
-        return super().create(request, *args, **kwargs)
+            check_availability(lines)
+            # The order, its items and the stock deduction commit or roll back together
+            with transaction.atomic():
+                self.perform_create(serializer)
+                order = serializer.instance
+                allocate(lines, sales_order=order if order.status == 'open' else None)
+        except InsufficientStockError as e:
+            logger.warning('Stock not available for sales order: %s', e.errors)
+            return Response({'detail': 'Stock not available', 'errors': e.errors}, status=400)
+        except BusinessRuleError as e:
+            logger.warning('Sales order allocation conflict: %s', e)
+            return Response({'detail': e.message}, status=409)
+        headers = self.get_success_headers(serializer.data)
+        return Response(serializer.data, status=201, headers=headers)
+
+    def update(self, request, *args, **kwargs):
+        try:
+            return super().update(request, *args, **kwargs)
+        except InsufficientStockError as e:
+            logger.warning('Stock not available to reopen sales order: %s', e.errors)
+            return Response({'detail': 'Stock not available', 'errors': e.errors}, status=400)
+        except BusinessRuleError as e:
+            logger.warning('Sales order update conflict: %s', e)
+            return Response({'detail': e.message}, status=409)
+
+    def perform_update(self, serializer):
+        previous = serializer.instance.status
+        if previous == 'shipped' and serializer.validated_data.get('status') == 'open':
+            raise BusinessRuleError('A shipped order cannot be reopened.')
+        with transaction.atomic():
+            order = serializer.save()
+            if previous == 'open' and order.status != 'open':
+                # Shipping consumes the reserved units; any other status returns them
+                release(order)
+            elif previous != 'open' and order.status == 'open':
+                # Reopening reserves the units again, as creating the order did
+                lines = merge_lines(
+                    {'product': item.product_id, 'quantity': item.quantity} for item in order.items.all()
+                )
+                check_availability(lines)
+                allocate(lines, sales_order=order)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            release(instance)
+            instance.delete()
 
-class SalesOrderItemViewSet(viewsets.ModelViewSet):
+class SalesOrderItemViewSet(SparseFieldsetViewMixin, IdempotentCreateMixin, viewsets.ModelViewSet):
     queryset = SalesOrderItem.objects.all().order_by('id')
     serializer_class = SalesOrderItemSerializer
     permission_classes = [type('CustomRolePermission', (RolePermission,), {'__init__': lambda self: RolePermission.__init__(self, ['admin', 'manager', 'employee'])})]
@@ -98,7 +124,7 @@ class SalesOrderItemViewSet(viewsets.ModelViewSet):
         logger.info('Sales order item create requested by user: %s', request.user)
         return super().create(request, *args, **kwargs)
 
-class SalesOrderItemViewSet(viewsets.ModelViewSet):
+class SalesOrderItemViewSet(SparseFieldsetViewMixin, IdempotentCreateMixin, viewsets.ModelViewSet):
     queryset = SalesOrderItem.objects.all()
     serializer_class = SalesOrderItemSerializer
     permission_classes = [type('CustomRolePermission', (RolePermission,), {'__init__': lambda self: RolePermission.__init__(self, ['admin', 'manager', 'employee'])})]
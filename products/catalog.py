@@ -0,0 +1,323 @@
+"""
+Streaming catalog import.
+
+Rows are read one at a time from a CSV or NDJSON file and written in chunks,
+so memory use is bounded by the chunk size, not the file size. Each chunk
+costs a fixed handful of queries: the existing products matching its SKUs
+and barcodes, one ``bulk_create`` for new products, an upsert
+(``INSERT .. ON CONFLICT DO UPDATE``) for existing ones, and one delete plus
+one insert for replaced variants.
+
+A row is matched to an existing product by ``sku``, or by ``barcode`` when it
+has no SKU. Only the columns present in a row are written, so a feed can
+update prices without touching names. Recognised columns:
+
+* the product fields ``sku``, ``barcode``, ``name``, ``description``,
+  ``unit_price``, ``weight`` and ``dimensions``;
+* ``category``, a path such as ``Electronics/Phones``; missing categories are
+  created in the transaction of the chunk that needs them, and an empty
+  value clears the category;
+* ``variants``, replacing the product's variants: a list of
+  ``{"name", "value"}`` objects, or ``Color=Black;Size=L`` in CSV.
+
+Rows that fail validation are reported by line number and skipped. Each
+chunk commits on its own, so an interrupted import keeps the chunks already
+written and can simply be run again.
+
+``bulk_create`` and ``bulk_update`` send no signals, so each chunk updates
+the search index, drops its products from the barcode/SKU cache and bumps
+the response cache versions itself.
+"""
+import codecs
+import csv
+import json
+import time
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, transaction
+
+from inventory_api import response_cache
+from . import lookup
+from .models import Category, Product, ProductVariant
+from .search import index_products
+
+IMPORT_CHUNK_SIZE = 1000
+IMPORT_FORMATS = ('csv', 'ndjson')
+# Rejected rows listed in an upload's response; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+PRODUCT_FIELDS = ('sku', 'barcode', 'name', 'description', 'unit_price', 'weight', 'dimensions')
+CATEGORY_SEPARATOR = '/'
+
+
+def detect_format(name, content_type=None):
+    """Guess ``csv`` or ``ndjson`` from a file name or content type."""
+    name = (name or '').lower()
+    content_type = (content_type or '').lower()
+    if name.endswith(('.ndjson', '.jsonl')) or 'ndjson' in content_type:
+        return 'ndjson'
+    if name.endswith('.csv') or 'csv' in content_type:
+        return 'csv'
+    return None
+
+
+def read_rows(lines, format):
+    """Yield ``(line_number, row, error)`` from an iterable of text lines."""
+    if format == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield line_number, None, f'Invalid JSON: {exc}'
+            continue
+        if isinstance(row, dict):
+            yield line_number, row, None
+        else:
+            yield line_number, None, 'Expected an object.'
+
+
+def decode_lines(stream, encoding='utf-8-sig'):
+    """Iterate text lines from a binary file, e.g. an upload."""
+    return codecs.iterdecode(stream, encoding)
+
+
+class CategoryResolver:
+    """Resolves ``A/B/C`` paths to category ids, creating what is missing.
+
+    Categories created since the last ``commit()`` are forgotten again by
+    ``rollback()``, for when the transaction that created them fails.
+    """
+
+    def __init__(self):
+        self.children = {
+            (parent_id, name): pk
+            for pk, parent_id, name in Category.objects.values_list('pk', 'parent_id', 'name')
+        }
+        self.created = []
+
+    def commit(self):
+        self.created = []
+
+    def rollback(self):
+        for key in self.created:
+            del self.children[key]
+        self.created = []
+
+    def resolve(self, path):
+        parent_id = None
+        for name in (part.strip() for part in path.split(CATEGORY_SEPARATOR)):
+            if not name:
+                continue
+            pk = self.children.get((parent_id, name))
+            if pk is None:
+                # Saved one by one so the closure table and caches follow
+                pk = Category.objects.create(name=name, parent_id=parent_id).pk
+                self.children[(parent_id, name)] = pk
+                self.created.append((parent_id, name))
+            parent_id = pk
+        return parent_id
+
+
+def _parse_variants(value):
+    if value in (None, ''):
+        return []
+    if isinstance(value, str):
+        variants = []
+        for pair in value.split(';'):
+            if pair.strip():
+                name, sep, val = pair.partition('=')
+                if not sep:
+                    raise ValueError(f'Expected name=value, got "{pair.strip()}".')
+                variants.append({'name': name.strip(), 'value': val.strip()})
+        value = variants
+    if not isinstance(value, list) or not all(isinstance(v, dict) and v.get('name') for v in value):
+        raise ValueError('Expected a list of {"name", "value"} objects.')
+    for variant in value:
+        if len(str(variant['name'])) > 100 or len(str(variant.get('value', ''))) > 100:
+            raise ValueError('Variant names and values are limited to 100 characters.')
+    return [(str(v['name']), str(v.get('value', ''))) for v in value]
+
+
+def parse_row(row):
+    """Return ``(fields, variants, errors)`` for one input row.
+
+    ``variants`` is ``None`` when the row has no ``variants`` column. A
+    ``category`` path is left in ``fields`` as text; it is resolved when the
+    chunk is written.
+    """
+    fields, errors, variants = {}, {}, None
+    for name in PRODUCT_FIELDS:
+        if name not in row:
+            continue
+        value = row[name]
+        if isinstance(value, str):
+            value = value.strip()
+        if value == '':
+            value = None
+        try:
+            fields[name] = Product._meta.get_field(name).clean(value, None)
+        except DjangoValidationError as exc:
+            errors[name] = exc.messages
+    if not fields.get('sku') and not fields.get('barcode'):
+        errors.setdefault('sku', []).append('A sku or barcode is required.')
+    if 'variants' in row:
+        try:
+            variants = _parse_variants(row['variants'])
+        except ValueError as exc:
+            errors['variants'] = [str(exc)]
+    if 'category' in row and not errors:
+        path = row['category']
+        if path not in (None, '') and not isinstance(path, str):
+            errors['category'] = ['Expected a category path such as "Electronics/Phones".']
+        else:
+            fields['category'] = path or None
+    return fields, variants, errors
+
+
+def _upsert(products, key, fields):
+    """Write existing ``products`` as one INSERT .. ON CONFLICT (key) DO UPDATE.
+
+    Much cheaper than ``bulk_update``, whose per-field CASE grows with the
+    chunk. The products are inserted without their pks so the conflict is
+    raised on ``key``.
+    """
+    if not products or not fields:
+        return
+    pks = [product.pk for product in products]
+    for product in products:
+        product.pk = None
+    try:
+        Product.objects.bulk_create(products, update_conflicts=True, unique_fields=[key], update_fields=fields)
+    finally:
+        for product, pk in zip(products, pks):
+            product.pk = pk
+
+
+def _write_chunk(chunk, resolver):
+    """Upsert ``[(line, fields, variants)]``; returns ``(created, updated, errors)``."""
+    skus = {fields['sku'] for _, fields, _ in chunk if fields.get('sku')}
+    barcodes = {fields['barcode'] for _, fields, _ in chunk if fields.get('barcode')}
+    by_sku = {p.sku: p for p in Product.objects.filter(sku__in=skus)} if skus else {}
+    by_barcode = {p.barcode: p for p in Product.objects.filter(barcode__in=barcodes)} if barcodes else {}
+    for product in by_sku.values():
+        if product.barcode:
+            by_barcode.setdefault(product.barcode, product)
+
+    pending = {}    # key -> Product, new or existing
+    variants = {}   # key -> [(name, value)]
+    updated_fields = set()
+    claimed = {}    # barcode -> key claiming it in this chunk
+    errors = []
+    try:
+        with transaction.atomic():
+            # Missing categories are created here, so a failed chunk leaves none behind
+            for line, fields, row_variants in chunk:
+                key = ('sku', fields['sku']) if fields.get('sku') else ('barcode', fields['barcode'])
+                product = pending.get(key)
+                if product is None:
+                    product = by_sku.get(key[1]) if key[0] == 'sku' else by_barcode.get(key[1])
+                barcode = fields.get('barcode')
+                if barcode:
+                    owner = by_barcode.get(barcode)
+                    if (owner is not None and (product is None or owner.pk != product.pk)) or claimed.get(barcode, key) != key:
+                        errors.append({'line': line, 'errors': {'barcode': ['Already used by another product.']}})
+                        continue
+                    claimed[barcode] = key
+                if 'category' in fields:
+                    path = fields.pop('category')
+                    fields['category_id'] = resolver.resolve(path) if path else None
+                if product is None:
+                    product = Product()
+                for name, value in fields.items():
+                    setattr(product, name, value)
+                if product.pk is not None:
+                    updated_fields.update(fields)
+                pending[key] = product
+                if row_variants is not None:
+                    variants[key] = row_variants
+
+            created = [p for p in pending.values() if p.pk is None]
+            updated = {'sku': [], 'barcode': []}
+            for (kind, _), product in pending.items():
+                if product.pk is not None:
+                    updated[kind].append(product)
+            Product.objects.bulk_create(created)
+            for kind, products in updated.items():
+                _upsert(products, kind, [name for name in sorted(updated_fields) if name != kind])
+            if variants:
+                replaced = [pending[key].pk for key in variants]
+                ProductVariant.objects.filter(product_id__in=replaced).delete()
+                ProductVariant.objects.bulk_create([
+                    ProductVariant(product_id=pending[key].pk, name=name, value=value)
+                    for key, rows in variants.items()
+                    for name, value in rows
+                ])
+            product_ids = [p.pk for p in pending.values()]
+            index_products(product_ids)
+            # Again on commit: a lookup before the commit caches the old row
+            transaction.on_commit(lambda: lookup.invalidate(product_ids))
+            transaction.on_commit(lambda: response_cache.bump(Product, ProductVariant))
+    except IntegrityError as exc:
+        # A key clash the checks above cannot see, e.g. a concurrent writer
+        resolver.rollback()
+        rejected = {error['line'] for error in errors}
+        errors.extend(
+            {'line': line, 'errors': {'non_field_errors': [str(exc)]}} for line, _, _ in chunk if line not in rejected
+        )
+        return 0, 0, sorted(errors, key=lambda error: error['line'])
+    resolver.commit()
+    lookup.invalidate(product_ids)
+    response_cache.bump(Product, ProductVariant)
+    return len(created), len(updated['sku']) + len(updated['barcode']), errors
+
+
+def import_catalog(rows, chunk_size=IMPORT_CHUNK_SIZE, on_error=None, on_progress=None):
+    """Upsert products from ``rows`` (as yielded by ``read_rows``).
+
+    ``on_error(error)`` is called with each ``{'line', 'errors'}`` entry and
+    ``on_progress(stats)`` after every chunk. Returns the final stats:
+    ``rows``, ``created``, ``updated``, ``rejected``, ``elapsed`` and
+    ``rows_per_sec``.
+    """
+    started = time.perf_counter()
+    stats = {'rows': 0, 'created': 0, 'updated': 0, 'rejected': 0}
+    resolver = CategoryResolver()
+
+    def report(errors):
+        stats['rejected'] += len(errors)
+        if on_error is not None:
+            for error in errors:
+                on_error(error)
+
+    def flush(chunk):
+        if chunk:
+            created, updated, errors = _write_chunk(chunk, resolver)
+            stats['created'] += created
+            stats['updated'] += updated
+            report(errors)
+        stats['elapsed'] = round(time.perf_counter() - started, 3)
+        stats['rows_per_sec'] = round(stats['rows'] / stats['elapsed']) if stats['elapsed'] else stats['rows']
+        if on_progress is not None:
+            on_progress(dict(stats))
+
+    chunk = []
+    for line, row, error in rows:
+        stats['rows'] += 1
+        if error is None:
+            fields, variants, row_errors = parse_row(row)
+            error = row_errors or None
+        if error is not None:
+            report([{'line': line, 'errors': error if isinstance(error, dict) else {'non_field_errors': [error]}}])
+            continue
+        chunk.append((line, fields, variants))
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = []
+    flush(chunk)
+    return stats
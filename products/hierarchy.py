@@ -0,0 +1,112 @@
+"""
+Maintenance of the CategoryClosure table.
+
+The table holds every (ancestor, descendant, depth) pair of the category
+tree, so "everything under Electronics" is
+``descendant_links.filter(ancestor=electronics)``, one indexed join, however
+deep the tree is.
+
+The signals in ``products.signals`` keep it in step with ``Category.parent``:
+
+* a new category copies its parent's ancestor rows;
+* a re-parented category detaches its subtree from the old ancestors and
+  attaches it under the new ones, touching only the rows that change;
+* before a category is deleted its children's subtrees are detached, because
+  the ``SET_NULL`` on ``parent`` that turns them into roots sends no signals.
+
+Writes that bypass signals (``update()``, ``loaddata``) must be followed by
+``rebuild`` or the ``rebuild_category_closure`` command.
+"""
+from django.db import transaction
+
+from inventory_api.exceptions import BusinessRuleError
+from .models import Category, CategoryClosure
+
+CLOSURE_CHUNK_SIZE = 1000
+
+
+def subtree_ids(category_id):
+    """``category_id`` and all its descendants, as a subquery."""
+    return CategoryClosure.objects.filter(ancestor_id=category_id).values('descendant_id')
+
+
+def ancestor_ids(category_id):
+    """``category_id`` and all its ancestors, nearest first."""
+    return list(
+        CategoryClosure.objects.filter(descendant_id=category_id).order_by('depth').values_list('ancestor_id', flat=True)
+    )
+
+
+def closure_rows(parents):
+    """Yield ``(ancestor_id, descendant_id, depth)`` for ``{category_id: parent_id}``."""
+    for category_id in parents:
+        ancestor, depth, seen = category_id, 0, set()
+        # A cycle written past the signals stops at the first repeat
+        while ancestor is not None and ancestor not in seen:
+            seen.add(ancestor)
+            yield ancestor, category_id, depth
+            ancestor, depth = parents.get(ancestor), depth + 1
+
+
+def rebuild():
+    """Recompute the whole table from ``Category.parent``."""
+    parents = dict(Category.objects.values_list('pk', 'parent_id'))
+    rows = [
+        CategoryClosure(ancestor_id=ancestor, descendant_id=descendant, depth=depth)
+        for ancestor, descendant, depth in closure_rows(parents)
+    ]
+    with transaction.atomic():
+        CategoryClosure.objects.all().delete()
+        CategoryClosure.objects.bulk_create(rows, batch_size=CLOSURE_CHUNK_SIZE)
+    return len(rows)
+
+
+def check_move(category, parent_id):
+    """Raise if making ``parent_id`` the parent of ``category`` would form a cycle."""
+    if parent_id is not None and category.pk is not None and (
+        CategoryClosure.objects.filter(ancestor_id=category.pk, descendant_id=parent_id).exists()
+    ):
+        raise BusinessRuleError('A category cannot be moved under itself or one of its descendants')
+
+
+def _attach(subtree, parent_id):
+    """Link ``subtree`` (``[(descendant_id, depth below its root)]``) under ``parent_id``."""
+    above = CategoryClosure.objects.filter(descendant_id=parent_id).values_list('ancestor_id', 'depth')
+    CategoryClosure.objects.bulk_create(
+        [
+            CategoryClosure(ancestor_id=ancestor, descendant_id=descendant, depth=up + down + 1)
+            for ancestor, up in above
+            for descendant, down in subtree
+        ],
+        batch_size=CLOSURE_CHUNK_SIZE,
+    )
+
+
+def _detach(category_id, subtree_ids):
+    """Unlink ``subtree_ids`` (rooted at ``category_id``) from the ancestors above it."""
+    above = [pk for pk in ancestor_ids(category_id) if pk != category_id]
+    if above:
+        CategoryClosure.objects.filter(ancestor_id__in=above, descendant_id__in=subtree_ids).delete()
+
+
+def insert_node(category):
+    CategoryClosure.objects.create(ancestor_id=category.pk, descendant_id=category.pk, depth=0)
+    if category.parent_id is not None:
+        _attach([(category.pk, 0)], category.parent_id)
+
+
+def move_node(category, old_parent_id):
+    """Re-link ``category``'s subtree after its parent changed from ``old_parent_id``."""
+    with transaction.atomic():
+        subtree = list(CategoryClosure.objects.filter(ancestor_id=category.pk).values_list('descendant_id', 'depth'))
+        if old_parent_id is not None:
+            _detach(category.pk, [pk for pk, _ in subtree])
+        if category.parent_id is not None:
+            _attach(subtree, category.parent_id)
+
+
+def remove_node(category):
+    """Turn ``category``'s children into roots ahead of its deletion."""
+    below = [pk for pk in subtree_ids(category.pk).values_list('descendant_id', flat=True) if pk != category.pk]
+    if below:
+        CategoryClosure.objects.filter(ancestor_id__in=ancestor_ids(category.pk), descendant_id__in=below).delete()
@@ -0,0 +1,157 @@
+"""
+Barcode/SKU resolution for scanners, served from an in-process LRU cache.
+
+Each entry is a compact product record (id, name, sku, barcode, unit price,
+category and variants) already encoded as JSON, so a hit costs a dict lookup
+and no queries or serializer work.
+
+Entries are dropped by the signals in ``products.signals`` when a product,
+one of its variants or any category changes, once immediately and again
+when the transaction commits. The write also bumps a shared version in the
+Django cache; other processes see the new version on their next lookup and
+clear their own copies.
+"""
+import json
+import threading
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+from .models import Product, ProductVariant
+
+CODE_CACHE_SIZE = getattr(settings, 'PRODUCT_CODE_CACHE_SIZE', 10000)
+CODE_CACHE_VERSION_KEY = 'products:code-cache:version'
+
+
+class CodeCache:
+    """A bounded, thread-safe LRU of ``code -> encoded record``."""
+
+    def __init__(self, max_size=CODE_CACHE_SIZE):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        # {code: (product_id, payload)}, least recently used first
+        self._entries = OrderedDict()
+        # {product_id: {code, ...}}
+        self._codes = defaultdict(set)
+        # Bumped on every invalidation so a load racing one is not stored
+        self.generation = 0
+        self.version = None
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def get(self, code):
+        with self._lock:
+            entry = self._entries.get(code)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(code)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, code, product_id, payload, generation):
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[code] = (product_id, payload)
+            self._entries.move_to_end(code)
+            self._codes[product_id].add(code)
+            while len(self._entries) > self.max_size:
+                evicted, (evicted_id, _) = self._entries.popitem(last=False)
+                self._codes[evicted_id].discard(evicted)
+                if not self._codes[evicted_id]:
+                    del self._codes[evicted_id]
+                self.evictions += 1
+
+    def discard(self, product_ids):
+        with self._lock:
+            self.generation += 1
+            self.invalidations += 1
+            for product_id in product_ids:
+                for code in self._codes.pop(product_id, ()):
+                    self._entries.pop(code, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self.invalidations += 1
+            self._entries.clear()
+            self._codes.clear()
+
+    def sync(self):
+        """Clear this process's entries if another process has invalidated."""
+        version = cache.get_or_set(CODE_CACHE_VERSION_KEY, 1, None)
+        if version != self.version:
+            if self.version is not None:
+                self.clear()
+            self.version = version
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+code_cache = CodeCache()
+
+
+def invalidate(product_ids=None):
+    """Drop cached records for ``product_ids``, or every record if ``None``."""
+    if product_ids is None:
+        code_cache.clear()
+    else:
+        code_cache.discard(product_ids)
+    try:
+        version = cache.incr(CODE_CACHE_VERSION_KEY)
+    except ValueError:
+        version = 1
+        cache.set(CODE_CACHE_VERSION_KEY, version, None)
+    # This process is already up to date; don't clear it again on next sync
+    code_cache.version = version
+
+
+def encode_product(code):
+    """Return ``(product_id, payload)`` for the product with barcode or SKU ``code``."""
+    rows = list(
+        Product.objects.filter(Q(barcode=code) | Q(sku=code)).values(
+            'pk', 'name', 'sku', 'barcode', 'unit_price', 'category_id', 'category__name',
+        )
+    )
+    if not rows:
+        return None, None
+    # A barcode match wins over another product's SKU
+    row = next((row for row in rows if row['barcode'] == code), rows[0])
+    record = {
+        'id': row['pk'],
+        'name': row['name'],
+        'sku': row['sku'],
+        'barcode': row['barcode'],
+        'unit_price': row['unit_price'],
+        'category': {'id': row['category_id'], 'name': row['category__name']} if row['category_id'] else None,
+        'variants': list(
+            ProductVariant.objects.filter(product_id=row['pk']).order_by('pk').values('id', 'name', 'value')
+        ),
+    }
+    return row['pk'], json.dumps(record, cls=DjangoJSONEncoder).encode()
+
+
+def resolve_code(code):
+    """The encoded record for barcode or SKU ``code``, or ``None`` if unknown."""
+    code_cache.sync()
+    payload = code_cache.get(code)
+    if payload is None:
+        generation = code_cache.generation
+        product_id, payload = encode_product(code)
+        if payload is not None:
+            code_cache.put(code, product_id, payload, generation)
+    return payload
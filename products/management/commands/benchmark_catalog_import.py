@@ -0,0 +1,62 @@
+import json
+import os
+import resource
+import tempfile
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from products.catalog import IMPORT_CHUNK_SIZE, import_catalog, read_rows
+from products.models import Category, Product
+from products.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure catalog import throughput: an insert pass and an update pass '
+        'over a generated NDJSON file. Reports rows/sec and peak resident memory. '
+        'Creates its own fixture rows and removes them afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        handle, path = tempfile.mkstemp(suffix='.ndjson')
+        try:
+            for label, price in (('insert', '9.99'), ('update', '12.50')):
+                with os.fdopen(os.open(path, os.O_WRONLY | os.O_TRUNC), 'w') as out:
+                    for i in range(options['rows']):
+                        out.write(json.dumps({
+                            'sku': f'BENCH-{tag}-{i}',
+                            'barcode': f'{tag}{i:010d}',
+                            'name': f'bench product {i}',
+                            'unit_price': price,
+                            'category': f'bench-{tag}/group-{i % 50}',
+                            'variants': [{'name': 'Size', 'value': str(i % 5)}],
+                        }) + '\n')
+                self._pass(label, path, options['chunk_size'])
+        finally:
+            os.close(handle)
+            os.unlink(path)
+            Product.objects.filter(sku__startswith=f'BENCH-{tag}-').delete()
+            for category in Category.objects.filter(name__startswith=f'bench-{tag}'):
+                Category.objects.filter(parent=category).delete()
+                category.delete()
+            rebuild_index()
+
+    def _pass(self, label, path, chunk_size):
+        started = time.perf_counter()
+        with open(path, encoding='utf-8') as lines:
+            stats = import_catalog(read_rows(lines, 'ndjson'), chunk_size=chunk_size)
+        elapsed = time.perf_counter() - started
+        # Kilobytes on Linux
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self.stdout.write(
+            f"{label}: rows={stats['rows']} created={stats['created']} updated={stats['updated']} "
+            f"rejected={stats['rejected']} elapsed={elapsed:.1f}s rows/sec={stats['rows'] / elapsed:.0f} "
+            f"peak_rss={peak / 1024:.0f}MiB"
+        )
@@ -0,0 +1,62 @@
+import random
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from products.models import Product
+from products.search import rebuild_index, search_products
+
+WORDS = (
+    'steel', 'copper', 'bolt', 'washer', 'bracket', 'hinge', 'cable', 'sensor', 'valve', 'pump',
+    'filter', 'gasket', 'bearing', 'spring', 'clamp', 'socket', 'relay', 'switch', 'panel', 'motor',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure product search latency (p50/p95/p99) for barcode, SKU '
+        'prefix and name queries. Creates its own fixture products and removes '
+        'them afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--queries', type=int, default=500)
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        count = options['products']
+        rng = random.Random(0)
+        products = [
+            Product(
+                name=' '.join(rng.sample(WORDS, 3)) + f' {i}',
+                sku=f'BENCH-{tag}-{i:07d}',
+                barcode=f'{tag}{i:010d}',
+            )
+            for i in range(count)
+        ]
+        for start in range(0, count, 10000):
+            Product.objects.bulk_create(products[start:start + 10000])
+        try:
+            rebuild_index()
+            queries = {
+                'barcode': [f'{tag}{rng.randrange(count):010d}' for _ in range(options['queries'])],
+                'sku prefix': [f'BENCH-{tag}-{rng.randrange(count):07d}'[:-2] for _ in range(options['queries'])],
+                'name': [' '.join(rng.sample(WORDS, 2)) for _ in range(options['queries'])],
+            }
+            for label, batch in queries.items():
+                timings = []
+                for query in batch:
+                    started = time.perf_counter()
+                    search_products(query)
+                    timings.append((time.perf_counter() - started) * 1000)
+                timings.sort()
+                pick = lambda p: timings[min(int(len(timings) * p), len(timings) - 1)]
+                self.stdout.write(
+                    f'{label}: queries={len(timings)} p50={pick(0.5):.2f}ms '
+                    f'p95={pick(0.95):.2f}ms p99={pick(0.99):.2f}ms'
+                )
+        finally:
+            Product.objects.filter(sku__startswith=f'BENCH-{tag}-').delete()
+            rebuild_index()
@@ -0,0 +1,53 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.catalog import IMPORT_CHUNK_SIZE, IMPORT_FORMATS, detect_format, import_catalog, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Upsert products and variants from a CSV or NDJSON catalog file, '
+        'matching on sku (or barcode). Streams the file in chunks, so any '
+        'size can be imported with bounded memory.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=IMPORT_FORMATS, help='Defaults to the file extension.')
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE)
+        parser.add_argument('--errors', help='Write rejected rows to this NDJSON file.')
+        parser.add_argument('--report-every', type=int, default=50000, help='Print progress every N rows.')
+
+    def handle(self, *args, **options):
+        format = options['format'] or detect_format(options['path'])
+        if format is None:
+            raise CommandError('Cannot tell the file format from its name; pass --format csv or --format ndjson.')
+        error_file = open(options['errors'], 'w', encoding='utf-8') if options['errors'] else None
+        next_report = [options['report_every']]
+
+        def on_error(error):
+            if error_file is not None:
+                error_file.write(json.dumps(error) + '\n')
+
+        def on_progress(stats):
+            if stats['rows'] >= next_report[0]:
+                next_report[0] = stats['rows'] + options['report_every']
+                self.stdout.write(
+                    f"rows={stats['rows']} created={stats['created']} updated={stats['updated']} "
+                    f"rejected={stats['rejected']} rows/sec={stats['rows_per_sec']}"
+                )
+
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as lines:
+                stats = import_catalog(
+                    read_rows(lines, format), chunk_size=options['chunk_size'],
+                    on_error=on_error, on_progress=on_progress,
+                )
+        finally:
+            if error_file is not None:
+                error_file.close()
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {stats['rows']} rows in {stats['elapsed']:.1f}s ({stats['rows_per_sec']} rows/sec): "
+            f"{stats['created']} created, {stats['updated']} updated, {stats['rejected']} rejected."
+        ))
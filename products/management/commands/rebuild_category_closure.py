@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from products.hierarchy import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the CategoryClosure table from Category.parent. Run after '
+        'writes that bypass model signals, such as update() or loaddata.'
+    )
+
+    def handle(self, *args, **options):
+        written = rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} closure rows.'))
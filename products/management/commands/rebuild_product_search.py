@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from products.models import Product
+from products.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the product search index from the product table. Run after '
+        'writes that bypass model signals, such as bulk imports.'
+    )
+
+    def handle(self, *args, **options):
+        rebuild_index()
+        self.stdout.write(f'Indexed {Product.objects.count()} products.')
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from products.search import get_backend
+    backend = get_backend(schema_editor.connection.alias)
+    if backend is not None:
+        with schema_editor.connection.cursor() as cursor:
+            backend.create(cursor)
+            backend.rebuild(cursor)
+
+
+def drop_search_index(apps, schema_editor):
+    from products.search import get_backend
+    backend = get_backend(schema_editor.connection.alias)
+    if backend is not None:
+        with schema_editor.connection.cursor() as cursor:
+            backend.drop(cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_alter_product_barcode_alter_product_category_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
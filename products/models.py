@@ -20,3 +20,18 @@ class ProductVariant(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='variants')
     name = models.CharField(max_length=100)
     value = models.CharField(max_length=100)
+
+class CategoryClosure(models.Model):
+    """
+    The transitive closure of the Category tree: one row per (ancestor,
+    descendant) pair, including each category paired with itself at depth 0.
+    Maintained by products.hierarchy on every category save and delete, so a
+    subtree or ancestor query is a single indexed join.
+    """
+    ancestor = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ('ancestor', 'descendant')
+        indexes = [models.Index(fields=['descendant', 'ancestor'], name='categoryclosure_desc_idx')]
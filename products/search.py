@@ -0,0 +1,154 @@
+"""
+Product search over name, SKU and barcode.
+
+Results come in three tiers, best first:
+
+1. exact barcode or SKU hits, from the unique indexes;
+2. SKU prefix hits, as an index range scan;
+3. full-text hits ranked by the database: an FTS5 table with BM25 ranking
+   on SQLite, trigram word similarity over GIN indexes on PostgreSQL.
+
+PostgreSQL maintains its indexes itself. The SQLite FTS table is kept in
+step by the signals in ``products.signals``; writes that bypass signals
+(``bulk_create``, ``update()``) must be followed by ``rebuild_index`` or the
+``rebuild_product_search`` command.
+"""
+import re
+
+from django.db import connection, connections, transaction
+from django.db.models import Q
+
+from .models import Product
+
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+FTS_TABLE = 'products_product_fts'
+# Sorts after every other character, closing a prefix range
+PREFIX_END = '\U0010ffff'
+
+
+class SQLiteSearchBackend:
+    def create(self, cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+            f"USING fts5(name, sku, barcode, tokenize='unicode61', prefix='2 3')"
+        )
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+    def index(self, cursor, rows):
+        rows = [(pk, name or '', sku or '', barcode or '') for pk, name, sku, barcode in rows]
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+        cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, name, sku, barcode) VALUES (%s, %s, %s, %s)', rows)
+
+    def remove(self, cursor, product_ids):
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(pk,) for pk in product_ids])
+
+    def rebuild(self, cursor):
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, sku, barcode) "
+            f"SELECT id, COALESCE(name, ''), COALESCE(sku, ''), COALESCE(barcode, '') FROM products_product"
+        )
+
+    def match(self, cursor, query, limit):
+        tokens = re.findall(r'\w+', query.lower())
+        if not tokens:
+            return []
+        expression = ' '.join('"%s"*' % token for token in tokens)
+        cursor.execute(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'ORDER BY bm25({FTS_TABLE}, 1.0, 2.0, 2.0) LIMIT %s',
+            [expression, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+class PostgreSQLSearchBackend:
+    def create(self, cursor):
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS products_product_name_trgm '
+            'ON products_product USING gin (name gin_trgm_ops)'
+        )
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS products_product_sku_trgm '
+            'ON products_product USING gin (sku gin_trgm_ops)'
+        )
+
+    def drop(self, cursor):
+        cursor.execute('DROP INDEX IF EXISTS products_product_name_trgm')
+        cursor.execute('DROP INDEX IF EXISTS products_product_sku_trgm')
+
+    def index(self, cursor, rows):
+        pass
+
+    def remove(self, cursor, product_ids):
+        pass
+
+    def rebuild(self, cursor):
+        cursor.execute('REINDEX INDEX products_product_name_trgm')
+        cursor.execute('REINDEX INDEX products_product_sku_trgm')
+
+    def match(self, cursor, query, limit):
+        cursor.execute(
+            'SELECT id FROM products_product WHERE %s <%% name OR %s <%% sku '
+            'ORDER BY GREATEST(word_similarity(%s, name), word_similarity(%s, sku)) DESC, id LIMIT %s',
+            [query, query, query, query, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgreSQLSearchBackend,
+}
+
+
+def get_backend(using='default'):
+    backend = BACKENDS.get(connections[using].vendor)
+    return backend() if backend else None
+
+
+def index_products(product_ids):
+    backend = get_backend()
+    if backend is None:
+        return
+    rows = Product.objects.filter(pk__in=product_ids).values_list('pk', 'name', 'sku', 'barcode')
+    with connection.cursor() as cursor:
+        backend.index(cursor, rows)
+
+
+def unindex_products(product_ids):
+    backend = get_backend()
+    if backend is not None:
+        with connection.cursor() as cursor:
+            backend.remove(cursor, product_ids)
+
+
+def rebuild_index():
+    """Rebuild the search index from the product table."""
+    backend = get_backend()
+    if backend is not None:
+        with transaction.atomic(), connection.cursor() as cursor:
+            backend.rebuild(cursor)
+
+
+def search_products(query, limit=SEARCH_LIMIT):
+    """Return up to ``limit`` ids of products matching ``query``, best first."""
+    query = (query or '').strip()
+    if not query:
+        return []
+    found = list(Product.objects.filter(Q(barcode=query) | Q(sku=query)).values_list('pk', flat=True))
+    if len(found) < limit:
+        found += Product.objects.filter(sku__gte=query, sku__lt=query + PREFIX_END).exclude(
+            pk__in=found,
+        ).order_by('sku').values_list('pk', flat=True)[:limit - len(found)]
+    backend = get_backend()
+    if len(found) < limit and backend is not None:
+        with connection.cursor() as cursor:
+            matches = backend.match(cursor, query, limit + len(found))
+        seen = set(found)
+        found += [pk for pk in matches if pk not in seen]
+    return found[:limit]
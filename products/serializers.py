@@ -1,17 +1,31 @@
 from rest_framework import serializers
-from .models import Category, Product, ProductVariant
+from inventory_api.fieldsets import SparseFieldsetMixin
+from .models import Category, CategoryClosure, Product, ProductVariant
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = '__all__'
+        expandable_fields = {
+            'parent': 'products.serializers.CategorySerializer',
+        }
+
+    def validate_parent(self, parent):
+        if parent is not None and self.instance is not None and (
+            CategoryClosure.objects.filter(ancestor_id=self.instance.pk, descendant_id=parent.pk).exists()
+        ):
+            raise serializers.ValidationError('A category cannot be moved under itself or one of its descendants.')
+        return parent
 
-class ProductVariantSerializer(serializers.ModelSerializer):
+class ProductVariantSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = ProductVariant
         fields = '__all__'
+        expandable_fields = {
+            'product': 'products.serializers.ProductSerializer',
+        }
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     category = CategorySerializer(read_only=True, required=False, allow_null=True)
     category_id = serializers.PrimaryKeyRelatedField(queryset=Category.objects.all(), source='category', write_only=True, required=False, allow_null=True)
     variants = ProductVariantSerializer(many=True, read_only=True, required=False)
@@ -0,0 +1,67 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from inventory_api import response_cache
+from . import hierarchy, lookup
+from .models import Category, Product, ProductVariant
+from .search import index_products, unindex_products
+
+response_cache.track(Category, Product, ProductVariant)
+
+
+def _invalidate_codes(product_ids=None):
+    # Again on commit: a lookup between the write and the commit caches the old row
+    lookup.invalidate(product_ids)
+    transaction.on_commit(lambda: lookup.invalidate(product_ids))
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_products([instance.pk])
+    _invalidate_codes([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    unindex_products([instance.pk])
+    _invalidate_codes([instance.pk])
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def variant_changed(sender, instance, **kwargs):
+    _invalidate_codes([instance.product_id])
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    _invalidate_codes()
+
+
+@receiver(pre_save, sender=Category)
+def capture_category_parent(sender, instance, raw=False, **kwargs):
+    instance._previous_parent_id = None
+    if raw or instance.pk is None:
+        return
+    previous = Category.objects.filter(pk=instance.pk).values_list('parent_id', flat=True).first()
+    instance._previous_parent_id = previous
+    if previous != instance.parent_id:
+        hierarchy.check_move(instance, instance.parent_id)
+
+
+@receiver(post_save, sender=Category)
+def update_category_closure(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        hierarchy.insert_node(instance)
+    elif instance._previous_parent_id != instance.parent_id:
+        hierarchy.move_node(instance, instance._previous_parent_id)
+
+
+@receiver(pre_delete, sender=Category)
+def detach_category_children(sender, instance, **kwargs):
+    hierarchy.remove_node(instance)
@@ -5,6 +5,7 @@ from .models import Category, Product, ProductVariant
 from .serializers import ProductSerializer
 from django.contrib.auth.models import User
 from users.models import Employee
+from inventory_api.testing import QueryBudgetMixin
 
 class ProductModelTest(TestCase):
     def test_create_category(self):
@@ -145,3 +146,464 @@ class ProductAPITest(APITestCase):
             with self.assertRaises(Exception) as context:
                 self.client.post(self.product_url, data)
             self.assertIn('Simulated error', str(context.exception))
+
+    def test_export_ndjson(self):
+        import json
+        Product.objects.create(name="Phone", sku="SKU1", barcode="BAR1", category=self.cat, unit_price=100)
+        Product.objects.create(name="Tablet", sku="SKU2", barcode="BAR2", unit_price=200)
+        response = self.client.get(reverse('product-export'), {'format': 'ndjson'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['sku'] for row in rows], ['SKU1', 'SKU2'])
+        self.assertEqual(rows[0]['category'], self.cat.id)
+        self.assertEqual(rows[1]['unit_price'], '200.00')
+
+    def test_export_csv(self):
+        import csv
+        Product.objects.create(name="Phone, black", sku="SKU1", barcode="BAR1", unit_price=100)
+        response = self.client.get(reverse('product-export'), {'format': 'csv'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('filename="product.csv"', response['Content-Disposition'])
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0][:2], ['id', 'name'])
+        self.assertEqual(rows[1][1], 'Phone, black')
+
+    def test_export_requires_authentication(self):
+        self.client.credentials()
+        response = self.client.get(reverse('product-export'), {'format': 'csv'})
+        self.assertEqual(response.status_code, 401)
+
+    def test_export_rejects_other_formats(self):
+        response = self.client.get(reverse('product-export'), {'format': 'json'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ProductQueryBudgetTest(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        Employee.objects.create(user=self.user, role='admin')
+        self.client.force_authenticate(user=self.user)
+        for i in range(25):
+            cat = Category.objects.create(name=f"Cat{i}")
+            prod = Product.objects.create(name=f"P{i}", sku=f"SKU{i}", barcode=f"BAR{i}", category=cat, unit_price=10)
+            ProductVariant.objects.create(product=prod, name="Color", value="Black")
+            ProductVariant.objects.create(product=prod, name="Size", value="L")
+        self.product = prod
+
+    def test_list_products(self):
+        self.assertListQueryBudget(reverse('product-list'), 3)
+
+    def test_retrieve_product(self):
+        self.assertRetrieveQueryBudget(reverse('product-detail', args=[self.product.id]), 2)
+
+
+class ProductSearchTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        Employee.objects.create(user=self.user, role='employee')
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('product-search')
+        self.bolt = Product.objects.create(name="Steel Bolt M8", sku="BOLT-M8", barcode="400100")
+        self.washer = Product.objects.create(name="Copper Washer", sku="WSH-10", barcode="400200")
+        self.bracket = Product.objects.create(name="Bolt Bracket", sku="BRK-01", barcode="BOLT-M8X")
+
+    def search(self, query, **params):
+        response = self.client.get(self.url, {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.data['results']]
+
+    def test_exact_barcode_ranks_first(self):
+        self.assertEqual(self.search('BOLT-M8X')[0], self.bracket.id)
+        self.assertEqual(self.search('400200'), [self.washer.id])
+
+    def test_sku_prefix(self):
+        self.assertEqual(self.search('WSH')[0], self.washer.id)
+
+    def test_name_fragment(self):
+        self.assertEqual(set(self.search('bolt')), {self.bolt.id, self.bracket.id})
+        self.assertEqual(self.search('copp'), [self.washer.id])
+        self.assertEqual(self.search('bolt', limit=1), [self.bolt.id])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.washer.name = "Brass Spacer"
+        self.washer.save()
+        self.assertEqual(self.search('copper'), [])
+        self.assertEqual(self.search('spacer'), [self.washer.id])
+        self.washer.delete()
+        self.assertEqual(self.search('spacer'), [])
+
+    def test_rebuild_after_bulk_create(self):
+        from django.core.management import call_command
+        from io import StringIO
+        Product.objects.bulk_create([Product(name="Hex Nut", sku="NUT-1", barcode="400300")])
+        self.assertEqual(self.search('hex'), [])
+        call_command('rebuild_product_search', stdout=StringIO())
+        self.assertEqual(len(self.search('hex')), 1)
+
+    def test_query_required(self):
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'q': 'bolt', 'limit': 'x'}).status_code, 400)
+
+
+class ProductCodeLookupTest(APITestCase):
+    def setUp(self):
+        from .lookup import code_cache
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        Employee.objects.create(user=self.user, role='admin')
+        self.client.force_authenticate(user=self.user)
+        self.cat = Category.objects.create(name="Fasteners")
+        self.product = Product.objects.create(
+            name="Bolt", sku="BOLT-1", barcode="500100", category=self.cat, unit_price=2,
+        )
+        ProductVariant.objects.create(product=self.product, name="Size", value="M8")
+        self.cache = code_cache
+        self.cache.clear()
+
+    def lookup(self, code):
+        return self.client.get(reverse('product-by-code', args=[code]))
+
+    def test_resolves_barcode_and_sku(self):
+        response = self.lookup('500100')
+        self.assertEqual(response.status_code, 200)
+        record = response.json()
+        self.assertEqual(record['id'], self.product.id)
+        self.assertEqual(record['unit_price'], '2.00')
+        self.assertEqual(record['category'], {'id': self.cat.id, 'name': 'Fasteners'})
+        self.assertEqual(record['variants'][0]['value'], 'M8')
+        self.assertEqual(self.lookup('BOLT-1').json()['id'], self.product.id)
+        self.assertEqual(self.lookup('nope').status_code, 404)
+
+    def test_hits_skip_the_database(self):
+        self.lookup('500100')
+        hits = self.cache.hits
+        with self.assertNumQueries(0):
+            response = self.lookup('500100')
+        self.assertEqual(response.json()['name'], 'Bolt')
+        self.assertEqual(self.cache.hits, hits + 1)
+
+    def test_invalidated_by_product_variant_and_category_changes(self):
+        self.lookup('500100')
+        self.product.name = "Hex Bolt"
+        self.product.save()
+        self.assertEqual(self.lookup('500100').json()['name'], 'Hex Bolt')
+        ProductVariant.objects.create(product=self.product, name="Finish", value="Zinc")
+        self.assertEqual(len(self.lookup('500100').json()['variants']), 2)
+        self.cat.name = "Hardware"
+        self.cat.save()
+        self.assertEqual(self.lookup('500100').json()['category']['name'], 'Hardware')
+        self.product.barcode = "500199"
+        self.product.save()
+        self.assertEqual(self.lookup('500100').status_code, 404)
+        self.product.delete()
+        self.assertEqual(self.lookup('500199').status_code, 404)
+
+    def test_bounded_with_lru_eviction(self):
+        from .lookup import CodeCache
+        lru = CodeCache(max_size=2)
+        lru.put('a', 1, b'a', lru.generation)
+        lru.put('b', 2, b'b', lru.generation)
+        lru.get('a')
+        lru.put('c', 3, b'c', lru.generation)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('a'), b'a')
+        self.assertEqual(lru.stats()['evictions'], 1)
+
+    def test_stats(self):
+        self.lookup('500100')
+        self.lookup('500100')
+        stats = self.client.get(reverse('product-code-cache-stats')).data
+        self.assertEqual(stats['size'], 1)
+        self.assertGreaterEqual(stats['hits'], 1)
+        self.assertIn('hit_rate', stats)
+
+
+class CategoryClosureTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        Employee.objects.create(user=self.user, role='manager')
+        self.client.force_authenticate(user=self.user)
+        self.electronics = Category.objects.create(name="Electronics")
+        self.phones = Category.objects.create(name="Phones", parent=self.electronics)
+        self.android = Category.objects.create(name="Android", parent=self.phones)
+        self.garden = Category.objects.create(name="Garden")
+
+    def closure(self):
+        from .models import CategoryClosure
+        return set(CategoryClosure.objects.values_list('ancestor_id', 'descendant_id', 'depth'))
+
+    def expected(self):
+        from .hierarchy import closure_rows
+        return set(closure_rows(dict(Category.objects.values_list('pk', 'parent_id'))))
+
+    def test_insert_links_every_ancestor(self):
+        self.assertIn((self.electronics.id, self.android.id, 2), self.closure())
+        self.assertEqual(self.closure(), self.expected())
+
+    def test_move_updates_subtree_incrementally(self):
+        self.phones.parent = self.garden
+        self.phones.save()
+        self.assertIn((self.garden.id, self.android.id, 2), self.closure())
+        self.assertNotIn((self.electronics.id, self.android.id, 2), self.closure())
+        self.assertEqual(self.closure(), self.expected())
+        self.phones.parent = None
+        self.phones.save()
+        self.assertEqual(self.closure(), self.expected())
+
+    def test_move_under_own_descendant_is_rejected(self):
+        url = reverse('category-detail', args=[self.electronics.id])
+        response = self.client.patch(url, {'parent': self.android.id}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.closure(), self.expected())
+
+    def test_delete_turns_children_into_roots(self):
+        self.phones.delete()
+        self.android.refresh_from_db()
+        self.assertIsNone(self.android.parent_id)
+        self.assertEqual(self.closure(), self.expected())
+
+    def test_rebuild_command(self):
+        from django.core.management import call_command
+        from io import StringIO
+        from .models import CategoryClosure
+        Category.objects.filter(pk=self.garden.pk).update(parent=self.android)
+        call_command('rebuild_category_closure', stdout=StringIO())
+        self.assertIn((self.electronics.id, self.garden.id, 3), self.closure())
+        self.assertEqual(CategoryClosure.objects.count(), len(self.expected()))
+
+    def test_product_filter_and_subtree_stock(self):
+        from inventory.models import Stock
+        from warehouses.models import Location, Warehouse
+        location = Location.objects.create(warehouse=Warehouse.objects.create(name="Main"), name="A1")
+        phone = Product.objects.create(name="Pixel", sku="PX", category=self.android)
+        tv = Product.objects.create(name="TV", sku="TV", category=self.electronics)
+        Product.objects.create(name="Rake", sku="RK", category=self.garden)
+        Stock.objects.create(product=phone, location=location, quantity=4)
+        Stock.objects.create(product=tv, location=location, quantity=6)
+
+        response = self.client.get(reverse('product-list'), {'category_tree': self.phones.id})
+        self.assertEqual([row['id'] for row in response.data['results']], [phone.id])
+        response = self.client.get(reverse('product-list'), {'category_tree': self.electronics.id})
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(self.client.get(reverse('product-list'), {'category_tree': 'x'}).status_code, 400)
+
+        with self.assertNumQueries(3):
+            data = self.client.get(reverse('category-stock', args=[self.electronics.id])).data
+        self.assertEqual((data['products'], data['available']), (2, 10))
+        self.assertEqual(data['children'], [
+            {'id': self.phones.id, 'name': 'Phones', 'products': 1, 'on_hand': 4, 'reserved': 0, 'available': 4},
+        ])
+
+
+class CatalogImportTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        Employee.objects.create(user=self.user, role='manager')
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('product-import-catalog')
+        self.existing = Product.objects.create(name="Old Name", sku="CAT-1", barcode="600100", unit_price=1)
+        ProductVariant.objects.create(product=self.existing, name="Color", value="Red")
+
+    def upload(self, name, content, **data):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        return self.client.post(self.url, {'file': SimpleUploadedFile(name, content.encode()), **data}, format='multipart')
+
+    def test_csv_upsert_on_sku(self):
+        from .models import CategoryClosure
+        response = self.upload('feed.csv', (
+            "sku,barcode,name,unit_price,category,variants\n"
+            "CAT-1,600100,New Name,2.50,Tools/Hand Tools,Color=Blue;Size=L\n"
+            "CAT-2,600200,Hammer,9.99,Tools/Hand Tools,\n"
+            "CAT-3,600300,Bad Price,abc,,\n"
+        ))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['updated'], response.data['rejected']), (1, 1, 1))
+        self.assertEqual(response.data['errors'][0]['line'], 4)
+        self.assertIn('unit_price', response.data['errors'][0]['errors'])
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.name, str(self.existing.unit_price)), ("New Name", "2.50"))
+        self.assertEqual(sorted(self.existing.variants.values_list('value', flat=True)), ['Blue', 'L'])
+        hand_tools = Category.objects.get(name="Hand Tools")
+        self.assertEqual(self.existing.category_id, hand_tools.id)
+        self.assertTrue(CategoryClosure.objects.filter(ancestor__name="Tools", descendant=hand_tools).exists())
+        hammer = Product.objects.get(sku="CAT-2")
+        self.assertFalse(hammer.variants.exists())
+        # Bulk writes keep the search index and scanner cache current
+        self.assertEqual(self.client.get(reverse('product-search'), {'q': 'hammer'}).data['results'][0]['id'], hammer.id)
+        self.assertEqual(self.client.get(reverse('product-by-code', args=['600100'])).json()['name'], "New Name")
+
+    def test_ndjson_partial_update_by_barcode(self):
+        self.client.get(reverse('product-by-code', args=['600100']))
+        response = self.upload('feed.ndjson', (
+            '{"barcode": "600100", "unit_price": "3.00"}\n'
+            'not json\n'
+            '{"sku": "CAT-9", "barcode": "600100"}\n'
+        ))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['updated'], response.data['rejected']), (1, 2))
+        self.assertEqual([error['line'] for error in response.data['errors']], [2, 3])
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.name, str(self.existing.unit_price)), ("Old Name", "3.00"))
+        self.assertEqual(self.existing.variants.count(), 1)
+        self.assertEqual(self.client.get(reverse('product-by-code', args=['600100'])).json()['unit_price'], "3.00")
+
+    def test_queries_do_not_grow_with_rows(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .catalog import import_catalog
+        Category.objects.create(name="Tools")
+
+        def run(count, offset):
+            rows = (
+                (i, {'sku': f'Q-{offset + i}', 'name': 'x', 'category': 'Tools', 'variants': [{'name': 'Size', 'value': 'S'}]}, None)
+                for i in range(count)
+            )
+            with CaptureQueriesContext(connection) as queries:
+                import_catalog(rows, chunk_size=100)
+            return len(queries)
+
+        self.assertEqual(run(10, 0), run(100, 1000))
+
+    def test_failed_chunk_rejects_each_line_once_and_keeps_no_categories(self):
+        from unittest import mock
+        from django.db import IntegrityError
+        from .catalog import import_catalog
+        rows = [
+            (1, {'sku': 'F-1', 'barcode': '600100', 'name': 'x', 'category': 'Garden/Hoses'}, None),
+            (2, {'sku': 'F-2', 'name': 'y', 'category': 'Garden/Hoses'}, None),
+        ]
+        with mock.patch('products.catalog.index_products', side_effect=IntegrityError('clash')):
+            stats = import_catalog(iter(rows))
+        self.assertEqual(stats['rejected'], 2)
+        self.assertFalse(Category.objects.filter(name="Garden").exists())
+        # The resolver forgot the rolled-back categories, so a retry recreates them
+        self.assertEqual(import_catalog(iter(rows[1:]))['created'], 1)
+        self.assertEqual(Product.objects.get(sku="F-2").category.name, "Hoses")
+
+    def test_command_writes_error_file(self):
+        import json
+        import os
+        import tempfile
+        from io import StringIO
+        from django.core.management import call_command
+        with tempfile.TemporaryDirectory() as tmp:
+            path, errors = os.path.join(tmp, 'feed.ndjson'), os.path.join(tmp, 'errors.ndjson')
+            with open(path, 'w') as feed:
+                feed.write('{"sku": "CMD-1", "name": "Wrench"}\n{"name": "no key"}\n')
+            out = StringIO()
+            call_command('import_catalog', path, errors=errors, stdout=out)
+            with open(errors) as error_file:
+                rejected = [json.loads(line) for line in error_file]
+        self.assertIn('1 created', out.getvalue())
+        self.assertEqual(rejected[0]['line'], 2)
+        self.assertTrue(Product.objects.filter(sku="CMD-1", name="Wrench").exists())
+
+    def test_requires_manager_and_file(self):
+        self.assertEqual(self.client.post(self.url, {}, format='multipart').status_code, 400)
+        self.assertEqual(self.upload('feed.txt', 'sku\nA\n').status_code, 400)
+        employee = User.objects.create_user(username='emp', password='testpass')
+        Employee.objects.create(user=employee, role='employee')
+        self.client.force_authenticate(user=employee)
+        self.assertEqual(self.upload('feed.csv', 'sku\nA\n').status_code, 403)
+
+
+class SparseFieldsetTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        Employee.objects.create(user=self.user, role='admin')
+        self.client.force_authenticate(user=self.user)
+        self.cat = Category.objects.create(name="Electronics")
+        for i in range(5):
+            product = Product.objects.create(name=f"P{i}", sku=f"SKU{i}", barcode=f"B{i}", category=self.cat, unit_price=10)
+            ProductVariant.objects.create(product=product, name="Color", value="Black")
+        self.product = product
+
+    def test_fields_trim_response_and_queries(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('product-list'), {'fields': 'id,name,sku,unit_price'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data['results'][0]), {'id', 'name', 'sku', 'unit_price'})
+        # Count and page only: no category join, no variant prefetch, no unused columns
+        self.assertEqual(len(queries), 2)
+        page_sql = queries.captured_queries[-1]['sql']
+        self.assertNotIn('products_category', page_sql)
+        self.assertNotIn('description', page_sql)
+
+    def test_nested_fields_keep_their_eager_loading(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('product-list'), {'fields': 'id,category,variants'})
+        self.assertEqual(response.data['results'][0]['category']['name'], "Electronics")
+        self.assertEqual(response.data['results'][0]['variants'][0]['value'], "Black")
+
+    def test_retrieve_and_expand(self):
+        response = self.client.get(reverse('product-detail', args=[self.product.id]), {'fields': 'sku'})
+        self.assertEqual(response.data, {'sku': 'SKU4'})
+        variant = self.product.variants.get()
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                reverse('productvariant-detail', args=[variant.id]), {'expand': 'product', 'fields': 'id,product'},
+            )
+        self.assertEqual(response.data['product']['sku'], 'SKU4')
+        self.assertEqual(response.data['product']['category']['name'], 'Electronics')
+
+    def test_unknown_fields_are_rejected(self):
+        self.assertEqual(self.client.get(reverse('product-list'), {'fields': 'id,bogus'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('product-list'), {'expand': 'category'}).status_code, 400)
+
+
+class ResponseCacheTest(APITestCase):
+    def setUp(self):
+        # An employee's role is in the token, so authenticating needs no query
+        user = User.objects.create_user(username='testuser', password='testpass')
+        Employee.objects.create(user=user, role='employee')
+        token = self.client.post(reverse('token_obtain_pair'), {'username': 'testuser', 'password': 'testpass'}).data['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.cat = Category.objects.create(name="Electronics")
+        self.product = Product.objects.create(name="Phone", sku="SKU1", barcode="BAR1", category=self.cat, unit_price=100)
+        self.url = reverse('product-list')
+
+    def test_hit_skips_the_orm(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        other = self.client.get(self.url, {'page_size': 5})
+        self.assertNotEqual(other['ETag'], etag)
+
+    def test_writes_to_any_dependency_invalidate(self):
+        detail = reverse('product-detail', args=[self.product.id])
+        etag = self.client.get(detail)['ETag']
+        self.cat.name = "Gadgets"
+        self.cat.save()
+        response = self.client.get(detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['category']['name'], "Gadgets")
+        ProductVariant.objects.create(product=self.product, name="Color", value="Black")
+        self.assertEqual(len(self.client.get(detail).data['variants']), 1)
+
+    def test_bulk_import_invalidates(self):
+        from .catalog import import_catalog
+        self.client.get(self.url)
+        import_catalog([(1, {'sku': 'SKU1', 'name': 'Renamed'}, None)])
+        self.assertEqual(self.client.get(self.url).data['results'][0]['name'], 'Renamed')
+
+    def test_keyed_by_role(self):
+        etag = self.client.get(self.url)['ETag']
+        manager = User.objects.create_user(username='mgr', password='testpass')
+        Employee.objects.create(user=manager, role='manager')
+        self.client.force_authenticate(user=manager)
+        self.assertNotEqual(self.client.get(self.url)['ETag'], etag)
@@ -1,39 +1,147 @@
 import logging
+from django.http import HttpResponse
 from rest_framework import viewsets, permissions, status
+from django.db.models import Count, Q, Sum
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError as DRFValidationError
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
-from .models import Category, Product, ProductVariant
+from .catalog import IMPORT_FORMATS, MAX_REPORTED_ERRORS, decode_lines, detect_format, import_catalog, read_rows
+from .hierarchy import subtree_ids
+from .lookup import code_cache, resolve_code
+from .models import Category, CategoryClosure, Product, ProductVariant
+from .search import MAX_SEARCH_LIMIT, SEARCH_LIMIT, search_products
 from .serializers import CategorySerializer, ProductSerializer, ProductVariantSerializer
+from inventory_api.fieldsets import SparseFieldsetViewMixin
+from inventory_api.idempotency import IdempotentCreateMixin
+from inventory_api.export import ExportMixin
 from inventory_api.permissions import RolePermission
+from inventory_api.response_cache import CachedResponseMixin
 from inventory_api.exceptions import InventoryError, PermissionDeniedError
 
 logger = logging.getLogger('inventory')
 
 # Create your views here.
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(SparseFieldsetViewMixin, IdempotentCreateMixin, CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all().order_by('id')
     serializer_class = CategorySerializer
+    cache_models = (Category,)
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_permissions(self):
+        if self.action == 'stock':
+            return [RolePermission(['admin', 'manager', 'employee'])]
+        return super().get_permissions()
+
     def create(self, request, *args, **kwargs):
         logger.info('Category create requested by user: %s', request.user)
         return super().create(request, *args, **kwargs)
 
-class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.all().order_by('id')
+    @action(detail=True, methods=['get'])
+    def stock(self, request, pk=None):
+        """Stock totals for this category's subtree and each child's subtree."""
+        category = self.get_object()
+        totals = {
+            row['ancestor_id']: row
+            for row in CategoryClosure.objects.filter(Q(ancestor_id=category.pk) | Q(ancestor__parent_id=category.pk))
+            .values('ancestor_id')
+            .annotate(
+                products=Count('descendant__product'),
+                on_hand=Sum('descendant__product__stock_summary__on_hand'),
+                reserved=Sum('descendant__product__stock_summary__reserved'),
+                available=Sum('descendant__product__stock_summary__available'),
+            )
+        }
+
+        def subtree(pk, name):
+            row = totals.get(pk, {})
+            return {
+                'id': pk,
+                'name': name,
+                'products': row.get('products', 0),
+                **{field: row.get(field) or 0 for field in ('on_hand', 'reserved', 'available')},
+            }
+
+        data = subtree(category.pk, category.name)
+        data['children'] = [
+            subtree(pk, name)
+            for pk, name in Category.objects.filter(parent_id=category.pk).order_by('pk').values_list('pk', 'name')
+        ]
+        return Response(data)
+
+class ProductViewSet(SparseFieldsetViewMixin, IdempotentCreateMixin, CachedResponseMixin, ExportMixin, viewsets.ModelViewSet):
+    queryset = Product.objects.select_related('category').prefetch_related('variants').order_by('id')
     serializer_class = ProductSerializer
+    cache_models = (Product, Category, ProductVariant)
 
     permission_classes = [RolePermission]
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'code_cache_stats', 'import_catalog']:
             return [RolePermission(allowed_roles=['admin', 'manager'])]
         return [permissions.IsAuthenticated()]
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        category_tree = self.request.query_params.get('category_tree')
+        if category_tree:
+            try:
+                category_tree = int(category_tree)
+            except ValueError:
+                raise DRFValidationError({'category_tree': 'Expected a category id.'})
+            queryset = queryset.filter(category_id__in=subtree_ids(category_tree))
+        return queryset
+
     def create(self, request, *args, **kwargs):
         logger.info('Product create requested by user: %s', request.user)
         return super().create(request, *args, **kwargs)
 
-class ProductVariantViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def import_catalog(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'detail': 'Upload the catalog as the multipart field "file".'}, status=status.HTTP_400_BAD_REQUEST)
+        format = request.data.get('format') or detect_format(upload.name, upload.content_type)
+        if format not in IMPORT_FORMATS:
+            return Response({'detail': 'format must be csv or ndjson.'}, status=status.HTTP_400_BAD_REQUEST)
+        logger.info('Catalog import of %s (%d bytes) requested by user: %s', upload.name, upload.size, request.user)
+        errors = []
+
+        def on_error(error):
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append(error)
+
+        stats = import_catalog(read_rows(decode_lines(upload), format), on_error=on_error)
+        code = status.HTTP_400_BAD_REQUEST if stats['rejected'] and not (stats['created'] or stats['updated']) else status.HTTP_200_OK
+        return Response({**stats, 'errors': errors}, status=code)
+
+    @action(detail=False, methods=['get'], url_path='search')
+    def search(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'detail': 'The q query parameter is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(int(request.query_params.get('limit', SEARCH_LIMIT)), MAX_SEARCH_LIMIT)
+        except ValueError:
+            return Response({'detail': 'limit must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+        ids = search_products(query, max(limit, 1))
+        products = {product.pk: product for product in self.get_queryset().filter(pk__in=ids)}
+        results = [products[pk] for pk in ids if pk in products]
+        return Response({'query': query, 'results': self.get_serializer(results, many=True).data})
+
+    @action(detail=False, methods=['get'], url_path=r'by-code/(?P<code>[^/]+)')
+    def by_code(self, request, code=None):
+        payload = resolve_code(code)
+        if payload is None:
+            return Response({'detail': 'No product with this barcode or SKU.'}, status=status.HTTP_404_NOT_FOUND)
+        # Already encoded: skip the renderer
+        return HttpResponse(payload, content_type='application/json')
+
+    @action(detail=False, methods=['get'], url_path='code-cache')
+    def code_cache_stats(self, request):
+        return Response(code_cache.stats())
+
+class ProductVariantViewSet(SparseFieldsetViewMixin, IdempotentCreateMixin, viewsets.ModelViewSet):
     queryset = ProductVariant.objects.all().order_by('id')
     serializer_class = ProductVariantSerializer
 
@@ -1,8 +1,9 @@
 from rest_framework import serializers
+from inventory_api.fieldsets import SparseFieldsetMixin
 from .models import Supplier, SupplierProduct
 from products.models import Product
 
-class SupplierSerializer(serializers.ModelSerializer):
+class SupplierSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Supplier
         fields = '__all__'
@@ -17,7 +18,11 @@ class SupplierSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('Supplier name is required.')
         return value
 
-class SupplierProductSerializer(serializers.ModelSerializer):
+class SupplierProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = SupplierProduct
         fields = '__all__'
+        expandable_fields = {
+            'supplier': 'suppliers.serializers.SupplierSerializer',
+            'product': 'products.serializers.ProductSerializer',
+        }
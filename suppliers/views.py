@@ -4,6 +4,8 @@ from rest_framework import viewsets, status
 from rest_framework.response import Response
 from .models import Supplier, SupplierProduct
 from .serializers import SupplierSerializer, SupplierProductSerializer
+from inventory_api.fieldsets import SparseFieldsetViewMixin
+from inventory_api.idempotency import IdempotentCreateMixin
 from inventory_api.permissions import RolePermission
 from inventory_api.exceptions import InventoryError
 
@@ -11,7 +13,7 @@ logger = logging.getLogger('inventory')
 
 # Create your views here.
 
-class SupplierViewSet(viewsets.ModelViewSet):
+class SupplierViewSet(SparseFieldsetViewMixin, IdempotentCreateMixin, viewsets.ModelViewSet):
     queryset = Supplier.objects.all().order_by('id')
     serializer_class = SupplierSerializer
     permission_classes = [RolePermission]
@@ -22,7 +24,7 @@ class SupplierViewSet(viewsets.ModelViewSet):
         logger.info('Supplier create requested by user: %s', request.user)
         return super().create(request, *args, **kwargs)
 
-class SupplierProductViewSet(viewsets.ModelViewSet):
+class SupplierProductViewSet(SparseFieldsetViewMixin, IdempotentCreateMixin, viewsets.ModelViewSet):
     queryset = SupplierProduct.objects.all().order_by('id')
     serializer_class = SupplierProductSerializer
     permission_classes = [RolePermission]
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from inventory_api.idempotency import IDEMPOTENCY_KEY_TTL, purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete Idempotency-Key records older than IDEMPOTENCY_KEY_TTL; run it from cron.'
+
+    def handle(self, *args, **options):
+        deleted = purge_expired()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} idempotency keys older than {IDEMPOTENCY_KEY_TTL}s.'))
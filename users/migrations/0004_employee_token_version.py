@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_alter_customer_address_alter_customer_contact_email_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employee',
+            name='token_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -1,5 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
 
 # Create your models here.
 
@@ -12,6 +14,8 @@ class Employee(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, null=True, blank=True)
     name = models.CharField(max_length=255, null=True, blank=True)
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default="employee", null=True, blank=True)
+    # Signed into access tokens; bumped to revoke them when the role changes
+    token_version = models.PositiveIntegerField(default=0)
 
 class Customer(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, null=True, blank=True)
@@ -19,3 +23,21 @@ class Customer(models.Model):
     contact_email = models.EmailField(null=True, blank=True)
     contact_phone = models.CharField(max_length=50, null=True, blank=True)
     address = models.TextField(null=True, blank=True)
+
+class IdempotencyKey(models.Model):
+    """A create request's Idempotency-Key and, once it finished, its response.
+
+    ``status_code`` is null while the first request with the key is still
+    being processed. See ``inventory_api.idempotency``.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    key = models.CharField(max_length=255)
+    # sha256 of method, path and body; a key may not be reused for another request
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    location = models.CharField(max_length=500, blank=True, default='')
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        unique_together = ('user', 'key')
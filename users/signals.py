@@ -0,0 +1,56 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from inventory_api.authentication import TOKEN_VERSION_TIMEOUT, token_version_key
+from .models import Employee
+
+
+@receiver(pre_save, sender=Employee)
+def bump_token_version(sender, instance, raw=False, **kwargs):
+    instance._previous_user_id = None
+    if raw or instance.pk is None:
+        return
+    previous = Employee.objects.filter(pk=instance.pk).values_list('user_id', 'role', 'token_version').first()
+    if previous is None:
+        return
+    user_id, role, version = previous
+    instance._previous_user_id = user_id
+    if (user_id, role) != (instance.user_id, instance.role):
+        instance.token_version = version + 1
+
+
+@receiver(post_save, sender=Employee)
+def cache_token_version(sender, instance, raw=False, **kwargs):
+    previous_user_id = getattr(instance, '_previous_user_id', None)
+    if previous_user_id and previous_user_id != instance.user_id:
+        cache.delete(token_version_key(previous_user_id))
+    if instance.user_id:
+        cache.set(token_version_key(instance.user_id), instance.token_version, TOKEN_VERSION_TIMEOUT)
+
+
+@receiver(post_delete, sender=Employee)
+def forget_token_version(sender, instance, **kwargs):
+    if instance.user_id:
+        cache.delete(token_version_key(instance.user_id))
+
+
+@receiver(pre_save, sender=User)
+def capture_user_flags(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._previous_flags = None
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and not {'is_active', 'is_superuser'} & set(update_fields):
+        return
+    instance._previous_flags = User.objects.filter(pk=instance.pk).values_list('is_active', 'is_superuser').first()
+
+
+@receiver(post_save, sender=User)
+def revoke_tokens_on_flag_change(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, '_previous_flags', None)
+    if previous is None or previous == (instance.is_active, instance.is_superuser):
+        return
+    Employee.objects.filter(user_id=instance.pk).update(token_version=F('token_version') + 1)
+    cache.delete(token_version_key(instance.pk))
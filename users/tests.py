@@ -4,6 +4,7 @@ from django.urls import reverse
 from .models import Employee, Customer
 from django.contrib.auth.models import User
 from .serializers import EmployeeSerializer
+from inventory_api.testing import QueryBudgetMixin
 
 class UsersModelTest(TestCase):
     def test_create_employee(self):
@@ -60,3 +61,87 @@ class UsersAPITest(APITestCase):
         response = self.client.get(self.cust_url)
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.data['results']), 1)
+
+
+class UsersQueryBudgetTest(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        Employee.objects.create(user=self.user, name='Test Admin', role='admin')
+        self.client.force_authenticate(user=self.user)
+        for i in range(25):
+            Employee.objects.create(user=User.objects.create(username=f'emp{i}'), name=f'Emp{i}', role='employee')
+            self.customer = Customer.objects.create(user=User.objects.create(username=f'cust{i}'), name=f'Cust{i}')
+
+    def test_list_employees(self):
+        self.assertListQueryBudget(reverse('employee-list'), 2)
+
+    def test_list_customers(self):
+        self.assertListQueryBudget(reverse('customer-list'), 2)
+
+    def test_retrieve_customer(self):
+        self.assertRetrieveQueryBudget(reverse('customer-detail', args=[self.customer.id]), 1)
+
+
+class RoleTokenTest(APITestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.user = User.objects.create_user(username='manager1', password='testpass')
+        self.emp = Employee.objects.create(user=self.user, name='Manager', role='manager')
+        self.url = reverse('customer-list')
+
+    def get_access_token(self, username='manager1'):
+        response = self.client.post(reverse('token_obtain_pair'), {'username': username, 'password': 'testpass'}, format='json')
+        return response.data['access']
+
+    def authenticate(self, token):
+        from rest_framework.test import APIRequestFactory
+        from inventory_api.authentication import RoleJWTAuthentication
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        return RoleJWTAuthentication().authenticate(request)
+
+    def test_token_carries_role_claims(self):
+        from rest_framework_simplejwt.tokens import AccessToken
+        token = AccessToken(self.get_access_token())
+        self.assertEqual(token['role'], 'manager')
+        self.assertEqual(token['employee_id'], self.emp.id)
+        self.assertEqual(token['token_version'], 0)
+
+    def test_role_check_costs_no_queries(self):
+        from types import SimpleNamespace
+        from inventory_api.permissions import RolePermission
+        token = self.get_access_token()
+        self.authenticate(token)
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate(token)
+            request = SimpleNamespace(user=user)
+            self.assertTrue(RolePermission(['admin', 'manager']).has_permission(request, None))
+            self.assertFalse(RolePermission(['admin']).has_permission(request, None))
+
+    def test_role_change_revokes_token(self):
+        token = self.get_access_token()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.emp.role = 'employee'
+        self.emp.save()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.get_access_token()}')
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_deactivation_revokes_token(self):
+        token = self.get_access_token()
+        self.user.is_active = False
+        self.user.save()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_removing_employee_revokes_token(self):
+        token = self.get_access_token()
+        self.emp.delete()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_superuser_without_employee_is_loaded_per_request(self):
+        User.objects.create_superuser(username='root', password='testpass')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.get_access_token("root")}')
+        self.assertEqual(self.client.get(self.url).status_code, 200)
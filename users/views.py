@@ -5,6 +5,9 @@ from inventory_api.exceptions import PermissionDeniedError, InventoryError
 from rest_framework import viewsets, permissions
 from .models import Employee, Customer, User
 from .serializers import EmployeeSerializer, CustomerSerializer, UserSerializer
+from inventory_api.fieldsets import SparseFieldsetViewMixin
+from inventory_api.idempotency import IdempotentCreateMixin
+from inventory_api.export import ExportMixin
 from inventory_api.permissions import RolePermission
 
 logger = logging.getLogger('inventory')
@@ -19,14 +22,14 @@ def example_view(request):
     # ...existing code...
     return render(request, 'users/example.html')
 
-class EmployeeViewSet(viewsets.ModelViewSet):
-    queryset = Employee.objects.all().order_by('id')
+class EmployeeViewSet(SparseFieldsetViewMixin, IdempotentCreateMixin, viewsets.ModelViewSet):
+    queryset = Employee.objects.select_related('user').order_by('id')
     serializer_class = EmployeeSerializer
     permission_classes = [RolePermission]
     def get_permissions(self):
         return [RolePermission(allowed_roles=['admin'])]
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(SparseFieldsetViewMixin, IdempotentCreateMixin, viewsets.ModelViewSet):
     queryset = User.objects.all().order_by('id')
     serializer_class = UserSerializer
     permission_classes = [RolePermission]
@@ -37,8 +40,8 @@ class UserViewSet(viewsets.ModelViewSet):
         logger.info('User create requested by user: %s', request.user)
         return super().create(request, *args, **kwargs)
 
-class CustomerViewSet(viewsets.ModelViewSet):
-    queryset = Customer.objects.all().order_by('id')
+class CustomerViewSet(SparseFieldsetViewMixin, IdempotentCreateMixin, ExportMixin, viewsets.ModelViewSet):
+    queryset = Customer.objects.select_related('user').order_by('id')
     serializer_class = CustomerSerializer
     permission_classes = [RolePermission]
     def get_permissions(self):
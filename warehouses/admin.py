@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Warehouse, Location
+from .models import Warehouse, Location, PutawayRule
 
 @admin.register(Warehouse)
 class WarehouseAdmin(admin.ModelAdmin):
@@ -8,5 +8,11 @@ class WarehouseAdmin(admin.ModelAdmin):
 
 @admin.register(Location)
 class LocationAdmin(admin.ModelAdmin):
-    list_display = ("id", "warehouse", "name", "type")
+    list_display = ("id", "warehouse", "name", "type", "zone", "capacity")
     search_fields = ("name", "warehouse__name")
+    list_filter = ("zone",)
+
+@admin.register(PutawayRule)
+class PutawayRuleAdmin(admin.ModelAdmin):
+    list_display = ("id", "warehouse", "category", "zone", "priority")
+    list_filter = ("warehouse", "zone")
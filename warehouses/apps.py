@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class WarehousesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'warehouses'
+
+    def ready(self):
+        from . import signals  # noqa: F401
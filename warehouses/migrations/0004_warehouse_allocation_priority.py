@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warehouses', '0003_putaway'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='warehouse',
+            name='allocation_priority',
+            field=models.IntegerField(default=0),
+        ),
+    ]
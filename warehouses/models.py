@@ -6,8 +6,24 @@ class Warehouse(models.Model):
     name = models.CharField(max_length=255, null=True, blank=True)
     address = models.TextField(null=True, blank=True)
     capacity = models.IntegerField(null=True, blank=True)
+    # Order allocation prefers lower values when warehouses tie on splits
+    allocation_priority = models.IntegerField(default=0)
 
 class Location(models.Model):
     warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, related_name='locations', null=True, blank=True)
     name = models.CharField(max_length=100, null=True, blank=True)
     type = models.CharField(max_length=50, null=True, blank=True)
+    zone = models.CharField(max_length=50, null=True, blank=True)
+    # Units the location holds; empty means unlimited
+    capacity = models.IntegerField(null=True, blank=True)
+
+class PutawayRule(models.Model):
+    """Send received goods of ``category`` (any category if empty) to ``zone``.
+
+    A product uses the rules of its nearest category that has any, else the
+    warehouse's catch-all rules; lower ``priority`` is tried first.
+    """
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, related_name='putaway_rules')
+    category = models.ForeignKey('products.Category', on_delete=models.CASCADE, related_name='putaway_rules', null=True, blank=True)
+    zone = models.CharField(max_length=50)
+    priority = models.IntegerField(default=0)
@@ -0,0 +1,191 @@
+"""
+Putaway: choosing the locations received goods are stored in.
+
+The static part of a warehouse's layout (its locations with their zones and
+capacities, its putaway rules and the category tree) is compiled once into
+``PutawayRules`` and cached until a location, rule or category changes.
+Slotting a receipt then costs three queries whatever its size: product
+categories, the current fill of capacity-limited locations, and where the
+received products are already stocked.
+
+For each line the candidate locations are the zones its category's rules
+name, in priority order (every location if no rule applies).
+The quantity goes, in order of preference, to candidates already holding
+the product, then to other candidates, in each case as far as their
+remaining capacity allows. Whatever does not fit anywhere overflows into
+the first candidate, so a receipt is never refused for lack of space.
+"""
+from collections import OrderedDict, defaultdict
+
+from django.core.cache import cache
+from django.db.models import Sum
+
+from inventory.models import Stock
+from inventory_api.exceptions import BusinessRuleError
+from products.models import Category, Product
+from .models import Location, PutawayRule, Warehouse
+
+PUTAWAY_CACHE_TIMEOUT = 3600
+PUTAWAY_VERSION_KEY = 'putaway:version'
+
+
+def _cache_key(warehouse_id):
+    return 'putaway:%s:%s' % (cache.get_or_set(PUTAWAY_VERSION_KEY, 1, None), warehouse_id)
+
+
+def invalidate():
+    """Drop every compiled rule set, e.g. after a location or rule changes."""
+    try:
+        cache.incr(PUTAWAY_VERSION_KEY)
+    except ValueError:
+        cache.set(PUTAWAY_VERSION_KEY, 1, None)
+
+
+class PutawayRules:
+    """A warehouse's locations, rules and category tree as plain lookups."""
+
+    def __init__(self, warehouse_id, locations, rules, parents):
+        self.warehouse_id = warehouse_id
+        # [(location_id, zone, capacity)] in id order
+        self.locations = locations
+        # {category_id or None: [zone, ...]} in priority order
+        self.rules = rules
+        # {category_id: parent_id}
+        self.parents = parents
+        self.by_zone = defaultdict(list)
+        for location_id, zone, _ in locations:
+            self.by_zone[zone].append(location_id)
+        self.capacity = {location_id: capacity for location_id, _, capacity in locations}
+        self._candidates = {}
+
+    @classmethod
+    def compile(cls, warehouse_id):
+        locations = list(
+            Location.objects.filter(warehouse_id=warehouse_id).order_by('pk').values_list('pk', 'zone', 'capacity')
+        )
+        rules = defaultdict(list)
+        for category_id, zone in (
+            PutawayRule.objects.filter(warehouse_id=warehouse_id)
+            .order_by('priority', 'pk')
+            .values_list('category_id', 'zone')
+        ):
+            if zone not in rules[category_id]:
+                rules[category_id].append(zone)
+        parents = dict(Category.objects.exclude(parent=None).values_list('pk', 'parent_id'))
+        return cls(warehouse_id, locations, dict(rules), parents)
+
+    @classmethod
+    def load(cls, warehouse_id):
+        key = _cache_key(warehouse_id)
+        compiled = cache.get(key)
+        if compiled is None:
+            compiled = cls.compile(warehouse_id)
+            cache.set(key, compiled, PUTAWAY_CACHE_TIMEOUT)
+        return compiled
+
+    def zones_for(self, category_id):
+        seen = set()
+        while category_id is not None and category_id not in seen:
+            if category_id in self.rules:
+                return self.rules[category_id]
+            seen.add(category_id)
+            category_id = self.parents.get(category_id)
+        return self.rules.get(None)
+
+    def candidates(self, category_id):
+        """Location ids eligible for ``category_id``, in preference order."""
+        if category_id not in self._candidates:
+            zones = self.zones_for(category_id) or []
+            found = [location_id for zone in zones for location_id in self.by_zone.get(zone, [])]
+            # No rule, or rules naming only empty zones: any location will do
+            self._candidates[category_id] = found or [location_id for location_id, _, _ in self.locations]
+        return self._candidates[category_id]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_candidates'] = {}
+        return state
+
+
+class PutawayPlan:
+    """Slots lines into one warehouse, tracking space it has already used."""
+
+    def __init__(self, rules, product_ids):
+        self.rules = rules
+        product_ids = set(product_ids)
+        self.categories = dict(Product.objects.filter(pk__in=product_ids).values_list('pk', 'category_id'))
+        limited = [pk for pk, capacity in rules.capacity.items() if capacity is not None]
+        used = dict(
+            Location.objects.filter(pk__in=limited)
+            .annotate(used=Sum('stock__quantity'))
+            .values_list('pk', 'used')
+        ) if limited else {}
+        self.free = {
+            pk: None if capacity is None else max(capacity - (used.get(pk) or 0), 0)
+            for pk, capacity in rules.capacity.items()
+        }
+        self.holding = defaultdict(set)
+        for product_id, location_id in Stock.objects.filter(
+            location__warehouse_id=rules.warehouse_id, product_id__in=product_ids, quantity__gt=0,
+        ).values_list('product_id', 'location_id'):
+            self.holding[product_id].add(location_id)
+
+    def _take(self, location_id, wanted):
+        free = self.free[location_id]
+        if free is None:
+            return wanted
+        taken = min(free, wanted)
+        self.free[location_id] = free - taken
+        return taken
+
+    def slot(self, product_id, quantity):
+        """Return ``[(location_id, quantity)]`` for ``quantity`` units of the product."""
+        candidates = self.rules.candidates(self.categories.get(product_id))
+        if not candidates:
+            raise BusinessRuleError(f'No putaway location for product {product_id}')
+        held = self.holding[product_id]
+        ordered = [pk for pk in candidates if pk in held] + [pk for pk in candidates if pk not in held]
+        placed = OrderedDict()
+        remaining = quantity
+        for location_id in ordered:
+            if remaining <= 0:
+                break
+            taken = self._take(location_id, remaining)
+            if taken:
+                placed[location_id] = placed.get(location_id, 0) + taken
+                remaining -= taken
+        if remaining > 0:
+            placed[ordered[0]] = placed.get(ordered[0], 0) + remaining
+            if self.free[ordered[0]] is not None:
+                self.free[ordered[0]] = 0
+        held.update(placed)
+        return list(placed.items())
+
+
+def receiving_warehouse(warehouse_id=None):
+    """The warehouse to receive into: ``warehouse_id``, else the first one."""
+    queryset = Warehouse.objects.order_by('pk')
+    warehouse = queryset.filter(pk=warehouse_id).first() if warehouse_id is not None else queryset.first()
+    if warehouse is None:
+        raise BusinessRuleError('No warehouse to receive into')
+    return warehouse
+
+
+def plan_putaway(lines, warehouse_id=None, create_default=False):
+    """Slot ``{key: (product_id, quantity)}``; returns ``{key: [(location_id, quantity)]}``.
+
+    A warehouse without locations has nowhere to slot to. Receiving passes
+    ``create_default`` to give it a ``Default`` bin first; otherwise (a
+    preview) each line is reported whole against location ``None``, the bin
+    a receipt would create.
+    """
+    warehouse = receiving_warehouse(warehouse_id)
+    rules = PutawayRules.load(warehouse.pk)
+    if not rules.locations:
+        if not create_default:
+            return OrderedDict((key, [(None, quantity)]) for key, (_, quantity) in lines.items())
+        Location.objects.create(warehouse=warehouse, name='Default', type='Bin')
+        # Not cached: the new location is not committed yet
+        rules = PutawayRules.compile(warehouse.pk)
+    plan = PutawayPlan(rules, {product_id for product_id, _ in lines.values()})
+    return OrderedDict((key, plan.slot(product_id, quantity)) for key, (product_id, quantity) in lines.items())
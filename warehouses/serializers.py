@@ -1,7 +1,8 @@
 from rest_framework import serializers
-from .models import Warehouse, Location
+from inventory_api.fieldsets import SparseFieldsetMixin
+from .models import Warehouse, Location, PutawayRule
 
-class WarehouseSerializer(serializers.ModelSerializer):
+class WarehouseSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Warehouse
         fields = '__all__'
@@ -11,7 +12,24 @@ class WarehouseSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('Capacity must be positive.')
         return value
 
-class LocationSerializer(serializers.ModelSerializer):
+class LocationSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Location
         fields = '__all__'
+        expandable_fields = {
+            'warehouse': 'warehouses.serializers.WarehouseSerializer',
+        }
+
+class PutawayRuleSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    class Meta:
+        model = PutawayRule
+        fields = '__all__'
+        expandable_fields = {
+            'warehouse': 'warehouses.serializers.WarehouseSerializer',
+            'category': 'products.serializers.CategorySerializer',
+        }
+
+    def validate_zone(self, value):
+        if not value or not value.strip():
+            raise serializers.ValidationError('Zone is required.')
+        return value.strip()
@@ -0,0 +1,25 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from inventory_api import response_cache
+from products.models import Category
+from .models import Location, PutawayRule, Warehouse
+from .putaway import invalidate
+
+response_cache.track(Warehouse, Location)
+
+
+@receiver(post_save, sender=Warehouse)
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+@receiver(post_save, sender=PutawayRule)
+@receiver(post_delete, sender=PutawayRule)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_putaway_rules(sender, raw=False, **kwargs):
+    if raw:
+        return
+    invalidate()
+    # Rules compiled before the change commits must not outlive it
+    transaction.on_commit(invalidate)
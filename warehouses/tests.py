@@ -1,7 +1,7 @@
 from django.test import TestCase
 from rest_framework.test import APITestCase
 from django.urls import reverse
-from .models import Warehouse, Location
+from .models import Warehouse, Location, PutawayRule
 from .serializers import WarehouseSerializer
 from django.contrib.auth.models import User
 
@@ -45,3 +45,79 @@ class WarehouseAPITest(APITestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.data['name'], "Main")
+
+
+class PutawayTest(APITestCase):
+    def setUp(self):
+        from products.models import Category, Product
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        from users.models import Employee
+        Employee.objects.create(user=self.user, name='Test Admin', role='admin')
+        self.client.force_authenticate(user=self.user)
+        self.wh = Warehouse.objects.create(name="Main", capacity=1000)
+        self.bulk1 = Location.objects.create(warehouse=self.wh, name="B1", zone="bulk", capacity=10)
+        self.bulk2 = Location.objects.create(warehouse=self.wh, name="B2", zone="bulk", capacity=10)
+        self.cold = Location.objects.create(warehouse=self.wh, name="C1", zone="cold")
+        self.food = Category.objects.create(name="Food")
+        self.dairy = Category.objects.create(name="Dairy", parent=self.food)
+        PutawayRule.objects.create(warehouse=self.wh, category=self.food, zone="cold")
+        PutawayRule.objects.create(warehouse=self.wh, zone="bulk")
+        self.milk = Product.objects.create(name="Milk", sku="SKU1", barcode="BAR1", category=self.dairy)
+        self.bolt = Product.objects.create(name="Bolt", sku="SKU2", barcode="BAR2")
+        self.nut = Product.objects.create(name="Nut", sku="SKU3", barcode="BAR3")
+
+    def plan(self, lines):
+        from .putaway import plan_putaway
+        return plan_putaway(dict(enumerate(lines)), self.wh.id)
+
+    def test_category_rules_are_inherited(self):
+        self.assertEqual(self.plan([(self.milk.id, 50)])[0], [(self.cold.id, 50)])
+
+    def test_capacity_splits_and_overflows(self):
+        from inventory.models import Stock
+        Stock.objects.create(product=self.nut, location=self.bulk1, quantity=6)
+        slots = self.plan([(self.bolt.id, 8), (self.bolt.id, 10)])
+        self.assertEqual(slots[0], [(self.bulk1.id, 4), (self.bulk2.id, 4)])
+        # The bolt's bins come first, and what fits nowhere overflows into the first one
+        self.assertEqual(slots[1], [(self.bulk2.id, 6), (self.bulk1.id, 4)])
+
+    def test_consolidates_onto_existing_stock(self):
+        from inventory.models import Stock
+        Stock.objects.create(product=self.bolt, location=self.bulk2, quantity=1)
+        self.assertEqual(self.plan([(self.bolt.id, 3)])[0], [(self.bulk2.id, 3)])
+
+    def test_rule_changes_invalidate_compiled_rules(self):
+        self.assertEqual(self.plan([(self.bolt.id, 1)])[0], [(self.bulk1.id, 1)])
+        PutawayRule.objects.filter(category=None).update(zone="cold")
+        self.assertEqual(self.plan([(self.bolt.id, 1)])[0], [(self.bulk1.id, 1)])
+        PutawayRule.objects.get(category=None).save()
+        self.assertEqual(self.plan([(self.bolt.id, 1)])[0], [(self.cold.id, 1)])
+
+    def test_slotting_is_constant_queries_once_compiled(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        self.plan([(self.bolt.id, 1)])
+        with CaptureQueriesContext(connection) as small:
+            self.plan([(self.bolt.id, 1)])
+        with CaptureQueriesContext(connection) as large:
+            self.plan([(self.bolt.id, 1), (self.milk.id, 2), (self.nut.id, 3)] * 100)
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    def test_putaway_preview_endpoint(self):
+        url = reverse('warehouse-putaway', args=[self.wh.id])
+        response = self.client.post(url, {"lines": [{"product": self.milk.id, "quantity": 5}]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['slots'], [{'location': self.cold.id, 'quantity': 5}])
+        response = self.client.post(url, {"lines": [{"product": self.milk.id}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(url, {"lines": [{"product": self.milk.id, "quantity": 1}, {"product": 999999, "quantity": 1}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['product'] for error in response.data['errors']], [999999])
+
+    def test_preview_does_not_create_default_location(self):
+        empty = Warehouse.objects.create(name="Empty", capacity=10)
+        url = reverse('warehouse-putaway', args=[empty.id])
+        response = self.client.post(url, {"lines": [{"product": self.bolt.id, "quantity": 5}]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['slots'], [{'location': None, 'quantity': 5}])
+        self.assertFalse(Location.objects.filter(warehouse=empty).exists())
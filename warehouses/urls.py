@@ -1,8 +1,9 @@
 from rest_framework.routers import DefaultRouter
-from .views import WarehouseViewSet, LocationViewSet
+from .views import WarehouseViewSet, LocationViewSet, PutawayRuleViewSet
 
 router = DefaultRouter()
 router.register(r'warehouses', WarehouseViewSet)
 router.register(r'locations', LocationViewSet)
+router.register(r'putaway-rules', PutawayRuleViewSet)
 
 urlpatterns = router.urls
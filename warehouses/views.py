@@ -1,18 +1,26 @@
 
 import logging
-from rest_framework import viewsets
-from .models import Warehouse, Location
-from .serializers import WarehouseSerializer, LocationSerializer
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from .models import Warehouse, Location, PutawayRule
+from .putaway import plan_putaway
+from .serializers import WarehouseSerializer, LocationSerializer, PutawayRuleSerializer
+from inventory_api.fieldsets import SparseFieldsetViewMixin
+from inventory_api.idempotency import IdempotentCreateMixin
 from inventory_api.permissions import RolePermission
-from inventory_api.exceptions import InventoryError
+from inventory_api.response_cache import CachedResponseMixin
+from inventory_api.exceptions import InventoryError, BusinessRuleError
+from products.models import Product
 
 logger = logging.getLogger('inventory')
 
 # Create your views here.
 
-class WarehouseViewSet(viewsets.ModelViewSet):
+class WarehouseViewSet(SparseFieldsetViewMixin, IdempotentCreateMixin, CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Warehouse.objects.all().order_by('id')
     serializer_class = WarehouseSerializer
+    cache_models = (Warehouse,)
     permission_classes = [RolePermission]
     def get_permissions(self):
         return [RolePermission(allowed_roles=['admin', 'manager'])]
@@ -21,9 +29,44 @@ class WarehouseViewSet(viewsets.ModelViewSet):
         logger.info('Warehouse create requested by user: %s', request.user)
         return super().create(request, *args, **kwargs)
 
-class LocationViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=['post'], url_path='putaway')
+    def putaway(self, request, pk=None):
+        """Preview where a list of ``{product, quantity}`` lines would be put away."""
+        warehouse = self.get_object()
+        lines = request.data.get('lines') if hasattr(request.data, 'get') else request.data
+        if not isinstance(lines, list):
+            return Response({'detail': 'Expected a list of {"product", "quantity"} lines.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            parsed = {index: (int(line['product']), int(line['quantity'])) for index, line in enumerate(lines)}
+        except (KeyError, TypeError, ValueError):
+            return Response({'detail': 'Each line needs an integer product and quantity.'}, status=status.HTTP_400_BAD_REQUEST)
+        if any(quantity <= 0 for _, quantity in parsed.values()):
+            return Response({'detail': 'Quantities must be positive.'}, status=status.HTTP_400_BAD_REQUEST)
+        product_ids = {product_id for product_id, _ in parsed.values()}
+        unknown = sorted(product_ids - set(Product.objects.filter(pk__in=product_ids).values_list('pk', flat=True)))
+        if unknown:
+            return Response({
+                'detail': 'Unknown products.',
+                'errors': [{'product': product_id, 'errors': ['Product does not exist.']} for product_id in unknown],
+            }, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            slots = plan_putaway(parsed, warehouse.pk)
+        except BusinessRuleError as e:
+            return Response({'detail': e.message}, status=status.HTTP_400_BAD_REQUEST)
+        return Response([
+            {
+                'product': product_id,
+                'quantity': quantity,
+                'slots': [{'location': location_id, 'quantity': placed} for location_id, placed in slots[index]],
+            }
+            for index, (product_id, quantity) in parsed.items()
+        ])
+
+class LocationViewSet(SparseFieldsetViewMixin, IdempotentCreateMixin, CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Location.objects.all().order_by('id')
     serializer_class = LocationSerializer
+    # Warehouse for ?expand=warehouse
+    cache_models = (Location, Warehouse)
     permission_classes = [RolePermission]
     def get_permissions(self):
         return [RolePermission(allowed_roles=['admin', 'manager'])]
@@ -31,3 +74,10 @@ class LocationViewSet(viewsets.ModelViewSet):
     def create(self, request, *args, **kwargs):
         logger.info('Location create requested by user: %s', request.user)
         return super().create(request, *args, **kwargs)
+
+class PutawayRuleViewSet(SparseFieldsetViewMixin, IdempotentCreateMixin, viewsets.ModelViewSet):
+    queryset = PutawayRule.objects.all().order_by('warehouse_id', 'priority', 'id')
+    serializer_class = PutawayRuleSerializer
+    permission_classes = [RolePermission]
+    def get_permissions(self):
+        return [RolePermission(allowed_roles=['admin', 'manager'])]